@@ -6,24 +6,31 @@ from dotenv import load_dotenv
 load_dotenv()
 import os
 
+from core import metrics
 from core.pipeline import summarize
+from core.sse import coalesce
+import base64
 import json
-from core.providers.models import ChatSession, ChatTurn
+from datetime import datetime
+from sqlalchemy import tuple_
+from core.providers.models import ChatSession, ChatTurn, LLMOutput
 from db import db
 from auth import auth_required
 
 app = Flask(__name__)
 
+CORS_ORIGINS = [
+    "http://localhost:5173",
+    "https://sum-lime.vercel.app",  # production
+    "https://sum-lime-3f6839ak1-henry-lis-projects-6da959dc.vercel.app", # staging
+    "https://sum-lime-git-staging-fixes-henry-lis-projects-6da959dc.vercel.app", # alt for above
+]
+
 CORS(
     app,
     resources={
         r"/api/*": {
-            "origins": [
-                "http://localhost:5173",
-                "https://sum-lime.vercel.app",  # production
-                "https://sum-lime-3f6839ak1-henry-lis-projects-6da959dc.vercel.app", # staging
-                "https://sum-lime-git-staging-fixes-henry-lis-projects-6da959dc.vercel.app", # alt for above
-            ]
+            "origins": CORS_ORIGINS
         },
     },
     allow_headers=["Authorization", "Content-Type"],
@@ -41,11 +48,35 @@ app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 db.init_app(app)
 
 
+@app.before_request
+def begin_db_timing():
+    metrics.begin_request()
+
+
+@app.teardown_request
+def end_db_timing(exc):
+    # Teardown also runs when a streaming view returns, before its stream;
+    # streams record their DB time themselves once they end
+    if not g.get("streaming"):
+        metrics.end_request(request.endpoint)
+
+
 @app.get("/healthz")
 def healthz():
     return "ok", 200
 
 
+@app.get("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape endpoint; see core.metrics."""
+    if not metrics.METRICS_ENABLED:
+        abort(404)
+    if not metrics.authorized(request.headers.get("Authorization", "")):
+        abort(401)
+    body, content_type = metrics.exposition()
+    return Response(body, content_type=content_type)
+
+
 @app.errorhandler(Exception)
 def handle_exception(e):
     # HTTPException already has .code/.name/.description
@@ -62,6 +93,21 @@ def handle_exception(e):
     return jsonify(payload), status
 
 
+def optional_int(value) -> int | None:
+    """An integer request field, or ``None`` if absent.
+
+    Raises ``ValueError`` for anything that is not a whole number.
+    """
+    if value is None:
+        return None
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(value)
+    try:
+        return int(value)
+    except TypeError:
+        raise ValueError(value)
+
+
 @app.route("/api/summarize", methods=["POST"])
 @auth_required
 def summarize_prompts():
@@ -76,69 +122,163 @@ def summarize_prompts():
     chat_session = data.get("chatSession", None)
     summary_model = data.get("summary_model", "gemini")
     llm_anonymous = data.get("llm_anonymous", True)
+    try:
+        summary_after = optional_int(data.get("summary_after", None))
+    except ValueError:
+        return jsonify({"error": "'summary_after' must be an integer"}), 400
 
     if not prompt:
         return jsonify({"error": "Missing 'prompt' in request"}), 400
 
     def event_stream():
-        gen = summarize(
-            prompt,
-            models,
-            chat_session=chat_session,
-            summary_model=summary_model,
-            title_model="gemini",  # avoid changing this default
-            llm_anonymous=llm_anonymous,
+        gen = coalesce(
+            summarize(
+                prompt,
+                models,
+                chat_session=chat_session,
+                summary_model=summary_model,
+                title_model="gemini",  # avoid changing this default
+                llm_anonymous=llm_anonymous,
+                summary_after=summary_after,
+            )
         )
-        while True:
-            try:
-                chunk = next(gen)
-            except StopIteration as e:
-                final = e.value
-                yield f"data: {json.dumps({'final': final})}\n\n"
-                break
-            else:
-                yield f"data: {json.dumps(chunk)}\n\n"
+        try:
+            while True:
+                try:
+                    chunk = next(gen)
+                except StopIteration as e:
+                    final = e.value
+                    yield f"data: {json.dumps({'final': final})}\n\n"
+                    break
+                else:
+                    yield f"data: {json.dumps(chunk)}\n\n"
+        finally:
+            metrics.end_request("summarize_prompts")
 
+    g.streaming = True
     return Response(stream_with_context(event_stream()), mimetype="text/event-stream")
 
 
+SESSIONS_PAGE_SIZE = 50
+SESSIONS_MAX_PAGE_SIZE = 200
+
+
+def _encode_cursor(last_used: datetime, session_id: int) -> str:
+    raw = json.dumps([last_used.isoformat(), session_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        last_used, session_id = json.loads(raw)
+        return datetime.fromisoformat(last_used), int(session_id)
+    except (ValueError, TypeError):
+        abort(400, "Invalid cursor")
+
+
 @app.route("/api/sessions", methods=["GET"])
 @auth_required
 def list_sessions():
-    sessions = (
-        db.session.execute(
-            db.select(ChatSession)
-            .filter_by(user_id=g.user_id)
-            .order_by(ChatSession.last_used.desc())
-        )
-        .scalars()
-        .all()
+    """Most recently used sessions first, one page at a time.
+
+    Pages are keyed on ``(last_used, id)``: pass the previous response's
+    ``next_cursor`` as ``?cursor=`` to continue; it is ``null`` on the last
+    page.
+    """
+    limit = request.args.get("limit", SESSIONS_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, SESSIONS_MAX_PAGE_SIZE))
+
+    query = (
+        db.select(ChatSession.id, ChatSession.title, ChatSession.last_used)
+        .filter(ChatSession.user_id == g.user_id)
+        .order_by(ChatSession.last_used.desc(), ChatSession.id.desc())
+        .limit(limit + 1)
     )
+    cursor = request.args.get("cursor")
+    if cursor:
+        query = query.filter(
+            tuple_(ChatSession.last_used, ChatSession.id) < _decode_cursor(cursor)
+        )
+    rows = db.session.execute(query).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].last_used, rows[-1].id)
     return jsonify(
-        [
-            {"id": s.id, "title": s.title, "last_used": s.last_used.isoformat()}
-            for s in sessions
-        ]
+        {
+            "sessions": [
+                {"id": r.id, "title": r.title, "last_used": r.last_used.isoformat()}
+                for r in rows
+            ],
+            "next_cursor": next_cursor,
+        }
     )
 
 
+TURNS_PAGE_SIZE = 50
+TURNS_MAX_PAGE_SIZE = 200
+
+
 @app.route("/api/sessions/<int:session_id>", methods=["GET"])
 @auth_required
 def get_session_messages(session_id: int):
-    session_obj = db.session.get(ChatSession, session_id)
-    if session_obj is None:
+    """The latest ``limit`` turns of a session, oldest first.
+
+    Pass ``?before=<turn_id>`` (the previous response's ``next_before``) to
+    page further back; ``next_before`` is ``null`` once the first turn is
+    included.  Only the page's outputs are read, in one query.
+    """
+    limit = request.args.get("limit", TURNS_PAGE_SIZE, type=int)
+    limit = max(1, min(limit, TURNS_MAX_PAGE_SIZE))
+    before = request.args.get("before", type=int)
+
+    exists = db.session.execute(
+        db.select(ChatSession.id).filter(ChatSession.id == session_id)
+    ).scalar()
+    if exists is None:
         abort(404)
-    turns = session_obj.turns
 
-    def pack_turn(t: ChatTurn):
-        outs = t.outputs or []
+    query = (
+        db.select(ChatTurn.id, ChatTurn.created_at, ChatTurn.prompt)
+        .filter(ChatTurn.session_id == session_id)
+        .order_by(ChatTurn.created_at.desc(), ChatTurn.id.desc())
+        .limit(limit + 1)
+    )
+    if before is not None:
+        anchor = (
+            db.select(ChatTurn.created_at)
+            .filter(ChatTurn.id == before, ChatTurn.session_id == session_id)
+            .scalar_subquery()
+        )
+        query = query.filter(tuple_(ChatTurn.created_at, ChatTurn.id) < tuple_(anchor, before))
+    turns = db.session.execute(query).all()
+    next_before = None
+    if len(turns) > limit:
+        turns = turns[:limit]
+        next_before = turns[-1].id
+    turns.reverse()
+
+    outputs = db.session.execute(
+        db.select(
+            LLMOutput.turn_id,
+            LLMOutput.provider,
+            LLMOutput.summarizer_prompt.is_not(None).label("is_summary"),
+            LLMOutput.content,
+        )
+        .filter(LLMOutput.turn_id.in_([t.id for t in turns]))
+        .order_by(LLMOutput.created_at.asc(), LLMOutput.id.asc())
+    ).all()
+    by_turn: dict[int, list] = {}
+    for o in outputs:
+        by_turn.setdefault(o.turn_id, []).append(o)
+
+    def pack_turn(t):
+        outs = by_turn.get(t.id, [])
 
-        summarizer = next(
-            (o for o in outs if o.summarizer_prompt is not None), None  # type: ignore
-        )  # pyright: ignore
-        base = [
-            o for o in outs if o.summarizer_prompt is None  # type: ignore
-        ]  # pyright: ignore
+        summarizer = next((o for o in outs if o.is_summary), None)
+        base = [o for o in outs if not o.is_summary]
 
         responses = []
         if summarizer:
@@ -152,7 +292,7 @@ def get_session_messages(session_id: int):
             "responses": responses,
         }
 
-    return jsonify([pack_turn(t) for t in turns])  # type: ignore
+    return jsonify({"turns": [pack_turn(t) for t in turns], "next_before": next_before})
 
 
 if __name__ == "__main__":
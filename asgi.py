@@ -0,0 +1,133 @@
+"""ASGI entry point.
+
+Serves ``POST /api/summarize`` natively on the event loop, so an open SSE
+stream costs a coroutine instead of a worker thread.  Every other route is
+handed to the Flask app unchanged.
+
+    uvicorn asgi:app --port 5050
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+"""
+
+import asyncio
+import contextlib
+import json
+
+from a2wsgi import WSGIMiddleware
+from flask import g
+from starlette.applications import Starlette
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Mount, Route
+from werkzeug.exceptions import HTTPException
+
+from app import app as flask_app, CORS_ORIGINS, optional_int
+from core import metrics
+from auth import (
+    authenticate_token,
+    bearer_token,
+    ensure_profile_exists,
+    set_rls_claims,
+    start_jwks_refresh,
+)
+from core.pipeline import asummarize, awarm_up
+from core.providers.transport import HTTP_WARMUP
+from core.providers.base import run_in_session
+from core.sse import acoalesce
+
+
+def _error(status: int, message: str) -> JSONResponse:
+    # Same shape as app.handle_exception
+    return JSONResponse({"message": message}, status_code=status)
+
+
+async def summarize_prompts(request: Request):
+    metrics.begin_request()
+    token = bearer_token(request.headers.get("Authorization", ""))
+    if token is None:
+        return _error(401, "Unauthorized")
+    user_id = await asyncio.to_thread(authenticate_token, token)
+    if user_id is None:
+        return _error(401, "Unauthorized")
+    try:
+        with flask_app.app_context():
+            await run_in_session(ensure_profile_exists, user_id)
+    except HTTPException as e:
+        return _error(e.code or 500, (e.description or "").strip() or e.name)
+
+    try:
+        data = await request.json()
+    except ValueError:
+        return _error(400, "Invalid JSON body")
+    if not isinstance(data, dict):
+        return _error(400, "Invalid JSON body")
+    prompt = data.get("prompt", "")
+    models = data.get(
+        "models",
+        [
+            "gemini",
+        ],
+    )
+    chat_session = data.get("chatSession", None)
+    summary_model = data.get("summary_model", "gemini")
+    llm_anonymous = data.get("llm_anonymous", True)
+    try:
+        summary_after = optional_int(data.get("summary_after", None))
+    except ValueError:
+        return JSONResponse(
+            {"error": "'summary_after' must be an integer"}, status_code=400
+        )
+
+    if not prompt:
+        return JSONResponse({"error": "Missing 'prompt' in request"}, status_code=400)
+
+    async def event_stream():
+        try:
+            with flask_app.app_context():
+                g.user_id = user_id
+                # As auth_required does: the claims hold for the open
+                # transaction of this context's session, which then opens
+                # the turn
+                await asyncio.to_thread(set_rls_claims, user_id)
+                events = asummarize(
+                    prompt,
+                    models,
+                    chat_session=chat_session,
+                    summary_model=summary_model,
+                    title_model="gemini",  # avoid changing this default
+                    llm_anonymous=llm_anonymous,
+                    summary_after=summary_after,
+                )
+                async for event in acoalesce(events):
+                    yield f"data: {json.dumps(event)}\n\n"
+        finally:
+            metrics.end_request("summarize_prompts")
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    start_jwks_refresh()
+    if HTTP_WARMUP:
+        await awarm_up()
+    yield
+
+
+app = Starlette(
+    lifespan=lifespan,
+    routes=[
+        Route("/api/summarize", summarize_prompts, methods=["POST"]),
+        Mount("/", app=WSGIMiddleware(flask_app)),  # type: ignore[arg-type]
+    ],
+    middleware=[
+        Middleware(
+            CORSMiddleware,
+            allow_origins=CORS_ORIGINS,
+            allow_headers=["Authorization", "Content-Type"],
+            allow_methods=["GET", "POST", "OPTIONS"],
+            max_age=600,
+        )
+    ],
+)
@@ -2,11 +2,22 @@
 import os
 import uuid
 import functools
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable
+
 import jwt
 from flask import request, g, abort
 from jwt import PyJWKClient, InvalidTokenError
 from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
+from core import metrics
+from core.config import env_int
 from db import db
 from core.providers.models import (
     Profile,
@@ -16,11 +27,154 @@ SUPABASE_URL = os.environ["SUPABASE_URL"].rstrip("/")
 JWKS_URL = f"{SUPABASE_URL}/auth/v1/.well-known/jwks.json"
 ANON_KEY = os.environ["SUPABASE_ANON_KEY"]
 
-_jwk_client = PyJWKClient(JWKS_URL)
+# Verified claims kept per worker, each until its token's exp
+JWT_CACHE_SIZE = env_int("SUMLIME_JWT_CACHE_SIZE", 4096)
+# Routine JWKS refresh interval
+JWKS_REFRESH_SECONDS = env_int("SUMLIME_JWKS_REFRESH_SECONDS", 600)
+# An unknown kid refetches the keys at most this often
+JWKS_MISS_REFRESH_SECONDS = env_int("SUMLIME_JWKS_MISS_REFRESH_SECONDS", 30)
+# How long requests wait for a JWKS fetch (a cold worker's first, or a miss's)
+JWKS_STARTUP_WAIT = 5
+
+logger = logging.getLogger(__name__)
+
+
+def _fetch_jwks() -> dict:
+    client = PyJWKClient(JWKS_URL, cache_jwk_set=False, timeout=JWKS_STARTUP_WAIT)
+    keys = client.get_signing_keys()
+    return {k.key_id: k.key for k in keys}
+
+
+class JWKSCache:
+    """Signing keys by ``kid``, kept fresh by a background thread.
+
+    Requests normally only read the in-memory key set.  A token with an
+    unknown ``kid`` (e.g. signed by a rotated key) makes the request fetch
+    the keys itself, unless a fetch already started since it arrived or
+    happened within ``JWKS_MISS_REFRESH_SECONDS``; concurrent misses share
+    one fetch.  The token is rejected only if the kid is still unknown, so
+    tokens with made-up kids cannot force more fetches than that.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], dict] = _fetch_jwks,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.fetch = fetch
+        self.clock = clock
+        self.keys: dict = {}
+        self.loaded = threading.Event()
+        self._fetched_at: float | None = None
+        self._fetching = threading.Lock()
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        """Prefetch the keys and keep refreshing them (idempotent)."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(
+                target=self._run, name="jwks-refresh", daemon=True
+            )
+            self._thread.start()
+
+    def refresh(self) -> None:
+        with self._fetching:
+            self._fetch()
+
+    def _fetch(self) -> None:
+        # Called with _fetching held
+        self._fetched_at = self.clock()
+        keys = self.fetch()
+        if keys:
+            self.keys = keys
+            self.loaded.set()
+
+    def _run(self) -> None:
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning("JWKS refresh failed: %s", e)
+            # Retry sooner while we have no keys at all
+            time.sleep(JWKS_REFRESH_SECONDS if self.loaded.is_set() else 5)
+
+    def signing_key(self, token: str):
+        kid = jwt.get_unverified_header(token).get("kid")
+        if not self.loaded.is_set():
+            self.start()
+            self.loaded.wait(JWKS_STARTUP_WAIT)
+        key = self.keys.get(kid) or self._refetch_for(kid)
+        if key is None:
+            raise InvalidTokenError(f"Unknown signing key {kid!r}")
+        return key
+
+    def _refetch_for(self, kid):
+        """Fetch the keys for an unknown ``kid`` if no fetch is recent enough."""
+        asked = self.clock()
+        if not self._fetching.acquire(timeout=JWKS_STARTUP_WAIT):
+            return self.keys.get(kid)
+        try:
+            fetched = self._fetched_at
+            if fetched is None or (
+                fetched < asked and asked - fetched >= JWKS_MISS_REFRESH_SECONDS
+            ):
+                try:
+                    self._fetch()
+                except Exception as e:
+                    logger.warning("JWKS refresh failed: %s", e)
+        finally:
+            self._fetching.release()
+        return self.keys.get(kid)
+
+
+class VerifiedTokenCache:
+    """Bounded LRU of verified claims keyed by token digest, valid until ``exp``."""
+
+    def __init__(self, maxsize: int = JWT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[bytes, dict] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str, verify: Callable[[str], dict]) -> dict:
+        digest = hashlib.sha256(token.encode()).digest()
+        with self._lock:
+            payload = self._entries.get(digest)
+            if payload is not None:
+                if payload["exp"] > time.time():
+                    self._entries.move_to_end(digest)
+                    return payload
+                del self._entries[digest]
+
+        payload = verify(token)
+        with self._lock:
+            self._entries[digest] = payload
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return payload
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_jwks = JWKSCache()
+_verified = VerifiedTokenCache()
+
+
+def start_jwks_refresh() -> None:
+    """Prefetch JWKS keys at worker start; see :class:`JWKSCache`."""
+    _jwks.start()
+
+
+# Threads do not survive fork: restart the refresher in forked workers
+os.register_at_fork(after_in_child=lambda: _jwks.start() if _jwks._thread else None)
 
 
 def _verify_supabase_jwt(token: str) -> dict:
-    signing_key = _jwk_client.get_signing_key_from_jwt(token).key
+    signing_key = _jwks.signing_key(token)
     payload = jwt.decode(
         token,
         signing_key,
@@ -36,20 +190,37 @@ def _verify_supabase_jwt(token: str) -> dict:
     return payload
 
 
+def bearer_token(auth: str) -> str | None:
+    """Extract the token from an ``Authorization: Bearer ...`` header value."""
+    if not auth.startswith("Bearer "):
+        return None
+    return auth.split(" ", 1)[1].strip()
+
+
+def authenticate_token(token: str) -> str | None:
+    """Return the user id of a valid Supabase JWT, or ``None``."""
+    started = time.perf_counter()
+    try:
+        payload = _verified.get(token, _verify_supabase_jwt)
+    except Exception as e:
+        metrics.AUTH.labels("invalid").observe(time.perf_counter() - started)
+        print(str(e))
+        return None
+    metrics.AUTH.labels("valid").observe(time.perf_counter() - started)
+    return payload["sub"]  # UUID string from Supabase Auth
+
+
 def auth_required(fn):
     @functools.wraps(fn)
     def wrapper(*args, **kwargs):
-        auth = request.headers.get("Authorization", "")
-        if not auth.startswith("Bearer "):
+        token = bearer_token(request.headers.get("Authorization", ""))
+        if token is None:
             abort(401)
-        token = auth.split(" ", 1)[1].strip()
-        try:
-            payload = _verify_supabase_jwt(token)
-        except Exception as e:
-            print(str(e))
+        user_id = authenticate_token(token)
+        if user_id is None:
             abort(401)
 
-        g.user_id = payload["sub"]  # UUID string from Supabase Auth
+        g.user_id = user_id
         ensure_profile_exists(g.user_id)
 
         set_rls_claims(g.user_id) # For RLS use
@@ -60,6 +231,18 @@ def auth_required(fn):
     return wrapper
 
 
+# Profiles this worker has seen, so known users skip the lookup entirely
+KNOWN_PROFILES_SIZE = env_int("SUMLIME_KNOWN_PROFILES_SIZE", 100_000)
+_known_profiles: set[uuid.UUID] = set()
+
+
+def _insert_ignore(table):
+    """``INSERT ... ON CONFLICT DO NOTHING`` for the session's dialect."""
+    if db.session.get_bind().dialect.name == "sqlite":
+        return sqlite_insert(table).on_conflict_do_nothing()
+    return pg_insert(table).on_conflict_do_nothing()
+
+
 def ensure_profile_exists(user_id_str: str) -> None:
     # Convert to UUID for the ORM model if you used UUID(as_uuid=True)
     try:
@@ -67,25 +250,24 @@ def ensure_profile_exists(user_id_str: str) -> None:
     except ValueError:
         abort(400)  # malformed sub
 
-    # Fast path: GET by PK; SQLAlchemy 2.x: db.session.get
-    exists = db.session.get(Profile, user_uuid)
-    if exists:
+    if user_uuid in _known_profiles:
         return
-    # When user signs up, they exist in auth.users, and not yet in Profile
-    db.session.add(Profile(id=user_uuid)) # type: ignore
-    try:
-        db.session.commit()
-    except Exception:
-        db.session.rollback()
-        # If another request raced and created it, ignore
+    # When user signs up, they exist in auth.users, and not yet in Profile.
+    # One idempotent statement covers both cases, and concurrent first requests.
+    db.session.execute(_insert_ignore(Profile.__table__).values(id=user_uuid))
+    db.session.commit()
+
+    if len(_known_profiles) >= KNOWN_PROFILES_SIZE:
+        _known_profiles.clear()
+    _known_profiles.add(user_uuid)
 
 # Allow db operations with RLS on
 def set_rls_claims(user_id: str):
-    # Minimal claims for auth.uid() and auth.role()
+    # Minimal claims for auth.uid() and auth.role(), in one round trip
     db.session.execute(
-        text("select set_config('request.jwt.claim.sub', :sub, true)"),
+        text(
+            "select set_config('request.jwt.claim.sub', :sub, true),"
+            " set_config('request.jwt.claim.role', 'authenticated', true)"
+        ),
         {"sub": user_id},
     )
-    db.session.execute(
-        text("select set_config('request.jwt.claim.role', 'authenticated', true)")
-    )
@@ -0,0 +1,102 @@
+"""Database round trips spent on auth per request, before and after.
+
+Runs the profile check and RLS setup that ``auth_required`` performs for a
+mix of new and returning users against SQLite (with a stand-in
+``set_config``) and counts the statements sent to the database, including
+commits.
+
+    python -m bench.auth_round_trips [--requests N] [--users N]
+"""
+
+import argparse
+import os
+import time
+import uuid
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+
+from flask import Flask
+from sqlalchemy import event, text
+
+import auth
+from core.providers.models import Profile
+from db import db
+
+
+def legacy_auth(user_id: str) -> None:
+    """``ensure_profile_exists`` + ``set_rls_claims`` as they used to be."""
+    user_uuid = uuid.UUID(user_id)
+    if db.session.get(Profile, user_uuid) is None:
+        db.session.add(Profile(id=user_uuid))  # type: ignore
+        try:
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+    db.session.execute(
+        text("select set_config('request.jwt.claim.sub', :sub, true)"), {"sub": user_id}
+    )
+    db.session.execute(
+        text("select set_config('request.jwt.claim.role', 'authenticated', true)")
+    )
+
+
+def current_auth(user_id: str) -> None:
+    auth.ensure_profile_exists(user_id)
+    auth.set_rls_claims(user_id)
+
+
+def run(name, fn, users: list[str], requests: int) -> dict:
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    auth._known_profiles.clear()
+    with app.app_context():
+        engine = db.engine
+        trips = 0
+
+        def count(*args, **kwargs):
+            nonlocal trips
+            trips += 1
+
+        @event.listens_for(engine, "connect")
+        def add_set_config(dbapi_conn, _):
+            dbapi_conn.create_function("set_config", 3, lambda k, v, local: v)
+
+        engine.dispose()  # reconnect so the listener runs
+        db.create_all()
+        event.listen(engine, "before_cursor_execute", count)
+        event.listen(engine, "commit", count)
+
+        start = time.perf_counter()
+        for i in range(requests):
+            fn(users[i % len(users)])
+            db.session.commit()  # end of request
+            trips -= 1  # ...which is not auth's doing
+        elapsed = time.perf_counter() - start
+        event.remove(engine, "before_cursor_execute", count)
+        event.remove(engine, "commit", count)
+        db.drop_all()
+    return {
+        "variant": name,
+        "round_trips_per_request": trips / requests,
+        "us_per_request": 1e6 * elapsed / requests,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--users", type=int, default=20)
+    args = parser.parse_args()
+    users = [str(uuid.uuid4()) for _ in range(args.users)]
+    for name, fn in (("before", legacy_auth), ("after", current_auth)):
+        r = run(name, fn, users, args.requests)
+        print(
+            f"{r['variant']:>6}: {r['round_trips_per_request']:.2f} round trips/request,"
+            f" {r['us_per_request']:.0f} us/request"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Fake providers with scriptable upstream timing, for the benchmarks.
+
+``FakeProvider`` goes through the same stack as a real provider (shared
+history snapshot, context window, response cache, retries, resilience
+guard, normalization, ``persist_output``) but its upstream is a generator
+that sleeps: ``ttft`` seconds before the first delta, ``token_delay``
+between deltas, ``tokens`` deltas of ``chunk_chars`` characters each.
+With probability ``failure_rate`` opening the stream raises a retryable
+``requests.ConnectionError``, so retries and breakers are exercised too.
+
+The near-duplicate cache is left out on purpose: benchmark prompts are
+similar to each other by construction and would be answered from it.
+"""
+
+import random
+import threading
+import time
+
+import requests
+
+from core.providers.base import LLMProvider, persist_output
+from core.providers.context import fit_history
+from core.providers.history import HISTORY_CACHE, ChatHistory
+from core.providers.normalize import normalize_stream
+from core.providers.resilience import guarded_retry, guarded_stream
+from core.providers.response_cache import cached_stream, response_key
+
+WORDS = (
+    "the model compares each answer and notes where they agree \\(x^2\\) "
+    "differ or leave out a detail that matters for the question\r\n"
+).split(" ")
+
+
+def parse_range(spec: str) -> tuple[int, int]:
+    """``"8"`` → ``(8, 8)``; ``"1-12"`` → ``(1, 12)``."""
+    lo, _, hi = spec.partition("-")
+    lo_n, hi_n = int(lo), int(hi or lo)
+    if not 0 < lo_n <= hi_n:
+        raise ValueError(f"Invalid range {spec!r}")
+    return lo_n, hi_n
+
+
+def _format_turn(user_text: str, content: str | None) -> list[dict]:
+    messages = [{"role": "user", "content": user_text}]
+    if content:
+        messages.append({"role": "assistant", "content": content})
+    return messages
+
+
+class FakeProvider(LLMProvider):
+    """Provider whose upstream is a timed generator instead of an API."""
+
+    def __init__(
+        self,
+        name: str,
+        ttft: float = 0.2,
+        token_delay: float = 0.02,
+        tokens: int = 100,
+        chunk_chars: tuple[int, int] = (1, 12),
+        failure_rate: float = 0.0,
+        context_tokens: int = 32000,
+        seed: int | None = None,
+    ):
+        self.name = name
+        self.ttft = ttft
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.chunk_chars = chunk_chars
+        self.failure_rate = failure_rate
+        self.context_tokens = context_tokens
+        self.upstream_calls = 0
+        self.upstream_failures = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._open = guarded_retry(name)(self._open_stream)
+
+    def _text(self, n: int) -> str:
+        out = ""
+        while len(out) < n:
+            out += self._rng.choice(WORDS) + " "
+        return out[:n]
+
+    def _open_stream(self) -> list[str]:
+        """The "request": decide on failure and script the response."""
+        with self._lock:
+            self.upstream_calls += 1
+            if self._rng.random() < self.failure_rate:
+                self.upstream_failures += 1
+                raise requests.ConnectionError(f"{self.name}: injected failure")
+            lo, hi = self.chunk_chars
+            return [self._text(self._rng.randint(lo, hi)) for _ in range(self.tokens)]
+
+    def _stream_text(self, messages: list[dict]):
+        deltas = self._open()
+        time.sleep(self.ttft)
+        for i, delta in enumerate(deltas):
+            if i and self.token_delay:
+                time.sleep(self.token_delay)
+            yield delta
+
+    def query(
+        self,
+        prompt: str,
+        chat_turn: int,
+        chat_session: int,
+        is_summarizing: bool = False,
+        system_message="",
+        history: ChatHistory | None = None,
+    ):
+        if history is None:
+            history = HISTORY_CACHE.load(chat_session, chat_turn)
+        messages = [{"role": "system", "content": system_message}] if system_message else []
+        messages.extend(
+            fit_history(history, self.name, is_summarizing, _format_turn, self.context_tokens)
+        )
+        messages.append({"role": "user", "content": prompt})
+
+        def produce():
+            return normalize_stream(
+                guarded_stream(self.name, lambda: self._stream_text(messages))
+            )
+
+        key = response_key(self.name, "fake", is_summarizing, messages)
+        text_parts: list[str] = []
+        for chunk_text in cached_stream(key, produce):
+            text_parts.append(chunk_text)
+            yield chunk_text
+
+        text = "".join(text_parts).strip()
+        persist_output(self.name, chat_turn, prompt, is_summarizing, text)
+
+    def create_chat_title(self, prompt: str) -> str:
+        time.sleep(self.ttft)
+        return prompt[:35]
+
+    def summarize_history(self, transcript: str) -> str:
+        time.sleep(self.ttft + self.tokens * self.token_delay)
+        return self._text(400)
@@ -0,0 +1,103 @@
+"""Worker startup cost: how long ``import app`` (or another module) takes.
+
+Each run imports the module in a fresh interpreter, so nothing is cached
+in-process; the median wall time is reported, together with the slowest
+top-level imports from ``python -X importtime`` and whether any provider
+SDK was loaded.
+
+    python -m bench.import_time [--module app] [--runs N] [--top N] [--json]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SDKS = ("openai", "google.genai", "anthropic")
+
+ENV = {
+    "DATABASE_URL": "sqlite://",
+    "SUPABASE_URL": "https://example.supabase.co",
+    "SUPABASE_ANON_KEY": "anon",
+    "DEEPSEEK_API_KEY": "bench",
+    "GEMINI_API_KEY": "bench",
+}
+
+
+def _env() -> dict:
+    return {**ENV, **os.environ}
+
+
+def wall_times(module: str, runs: int) -> list[float]:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", f"import {module}"], env=_env(), check=True)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def loaded_sdks(module: str) -> list[str]:
+    code = f"import sys, {module}; print(','.join(m for m in {SDKS!r} if m in sys.modules))"
+    out = subprocess.run(
+        [sys.executable, "-c", code], env=_env(), capture_output=True, text=True, check=True
+    )
+    return [m for m in out.stdout.strip().split(",") if m]
+
+
+def slowest_imports(module: str, top: int) -> list[tuple[str, float]]:
+    """Cumulative import time (ms) of the packages imported at the top level."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=_env(),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue  # header
+        # Nesting is shown by indentation; keep direct children of the root
+        if len(name) - len(name.lstrip()) <= 3:
+            rows.append((name.strip(), int(cumulative) / 1000))
+    return sorted(rows, key=lambda r: r[1], reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args()
+
+    times = wall_times(args.module, args.runs)
+    report = {
+        "module": args.module,
+        "runs": args.runs,
+        "median_ms": round(statistics.median(times) * 1000, 1),
+        "min_ms": round(min(times) * 1000, 1),
+        "sdks_loaded": loaded_sdks(args.module),
+        "slowest_imports_ms": dict(slowest_imports(args.module, args.top)),
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(
+        f"import {report['module']}: median {report['median_ms']} ms, "
+        f"min {report['min_ms']} ms over {args.runs} runs"
+    )
+    print(f"provider SDKs loaded: {', '.join(report['sdks_loaded']) or 'none'}")
+    for name, ms in report["slowest_imports_ms"].items():
+        print(f"  {ms:8.1f} ms  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+"""Concurrent ``/api/summarize`` streams against a running server.
+
+Meant for gunicorn (or uvicorn) started against ``bench.mock_upstream``,
+which also stands in for Supabase: the driver asks it to sign one access
+token per simulated user, so requests go through real JWT verification.
+Each conversation sends ``--turns`` prompts, continuing the session the
+first one created; ``--concurrency`` conversations run at once until
+``--requests`` have been sent.
+
+Per request it records time to first byte and to the final event, the
+number of SSE events, and how the stream ended (``ok``, an HTTP status,
+no final event, or a connection error).  The report includes throughput,
+latency percentiles and what the mock upstream served meanwhile; ``--out``
+writes it as JSON.
+
+    python -m bench.load [--target http://127.0.0.1:5050]
+        [--upstream http://127.0.0.1:8081] [--concurrency N] [--requests N]
+        [--turns N] [--users N] [--models deepseek,gemini] [--out load.json]
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+WORDS = (
+    "how why when compare explain the difference between rust go python "
+    "threads processes caching databases indexes latency streaming"
+).split()
+
+
+def _prompt(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(5, 15))) + "?"
+
+
+def percentiles(values: list[float]) -> dict | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+    return {
+        "mean": round(statistics.fmean(values), 1),
+        "p50": round(rank(0.5), 1),
+        "p90": round(rank(0.9), 1),
+        "p99": round(rank(0.99), 1),
+        "max": round(ordered[-1], 1),
+    }
+
+
+async def tokens(client: httpx.AsyncClient, upstream: str, users: int) -> list[str]:
+    out = []
+    for _ in range(users):
+        res = await client.post(f"{upstream}/mock/token", json={"sub": str(uuid.uuid4())})
+        res.raise_for_status()
+        out.append(res.json()["access_token"])
+    return out
+
+
+async def upstream_counts(client: httpx.AsyncClient, upstream: str) -> Counter:
+    try:
+        res = await client.get(f"{upstream}/mock/stats")
+        return Counter(res.json()["counts"])
+    except (httpx.HTTPError, ValueError, KeyError):
+        return Counter()
+
+
+async def one_request(client: httpx.AsyncClient, url: str, token: str, body: dict) -> dict:
+    """Stream one summarize request; returns its timings and outcome."""
+    start = time.perf_counter()
+    result = {"outcome": "no_final", "ttfb_ms": None, "ttlb_ms": None, "events": 0}
+    try:
+        async with client.stream(
+            "POST", url, json=body, headers={"Authorization": f"Bearer {token}"}
+        ) as res:
+            if res.status_code != 200:
+                await res.aread()
+                result["outcome"] = f"http_{res.status_code}"
+                return result
+            async for line in res.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                if result["ttfb_ms"] is None:
+                    result["ttfb_ms"] = (time.perf_counter() - start) * 1000
+                result["events"] += 1
+                event = json.loads(line[6:])
+                if "final" in event:
+                    result["outcome"] = "ok"
+                    result["session_id"] = event["final"].get("session_id")
+                    result["ttlb_ms"] = (time.perf_counter() - start) * 1000
+    except httpx.HTTPError as e:
+        result["outcome"] = type(e).__name__
+    return result
+
+
+async def run(args) -> dict:
+    limits = httpx.Limits(max_connections=args.concurrency + 10)
+    timeout = httpx.Timeout(args.timeout, connect=10)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        user_tokens = await tokens(client, args.upstream, args.users)
+        before = await upstream_counts(client, args.upstream)
+        url = f"{args.target}/api/summarize"
+        rng = random.Random(args.seed)
+        results: list[dict] = []
+        remaining = args.requests
+
+        async def conversation(n: int):
+            nonlocal remaining
+            token = user_tokens[n % len(user_tokens)]
+            session = None
+            for _ in range(args.turns):
+                if remaining <= 0:
+                    return
+                remaining -= 1
+                body = {
+                    "prompt": _prompt(rng),
+                    "models": args.models,
+                    "chatSession": session,
+                    "summary_model": args.summary_model,
+                }
+                result = await one_request(client, url, token, body)
+                results.append(result)
+                session = result.get("session_id") or session
+
+        async def worker(w: int):
+            n = w
+            while remaining > 0:
+                await conversation(n)
+                n += args.concurrency
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(w) for w in range(args.concurrency)))
+        elapsed = time.perf_counter() - start
+        after = await upstream_counts(client, args.upstream)
+
+    ok = [r for r in results if r["outcome"] == "ok"]
+    return {
+        "benchmark": "load",
+        "target": args.target,
+        "settings": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "turns": args.turns,
+            "users": args.users,
+            "models": args.models,
+            "summary_model": args.summary_model,
+        },
+        "elapsed_s": round(elapsed, 2),
+        "requests_per_s": round(len(results) / elapsed, 2),
+        "outcomes": dict(Counter(r["outcome"] for r in results)),
+        "ttfb_ms": percentiles([r["ttfb_ms"] for r in results if r["ttfb_ms"] is not None]),
+        "ttlb_ms": percentiles([r["ttlb_ms"] for r in ok]),
+        "events_per_request": percentiles([r["events"] for r in ok]),
+        "upstream": dict(sorted((after - before).items())),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--target", default="http://127.0.0.1:5050")
+    parser.add_argument("--upstream", default="http://127.0.0.1:8081")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=1, help="prompts per conversation")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--models", default="deepseek,gemini")
+    parser.add_argument("--summary-model", default="gemini")
+    parser.add_argument("--timeout", type=float, default=120, help="read timeout (s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here")
+    args = parser.parse_args()
+    args.models = [m.strip() for m in args.models.split(",") if m.strip()]
+
+    report = asyncio.run(run(args))
+    print(
+        f"{sum(report['outcomes'].values())} requests in {report['elapsed_s']} s "
+        f"({report['requests_per_s']} req/s) at concurrency {args.concurrency}"
+    )
+    print("  outcomes: " + ", ".join(f"{k} {v}" for k, v in report["outcomes"].items()))
+    for metric in ("ttfb_ms", "ttlb_ms"):
+        s = report[metric]
+        if s:
+            print(f"  {metric:8s} p50 {s['p50']:9.1f}  p90 {s['p90']:9.1f}  p99 {s['p99']:9.1f}  max {s['max']:9.1f}")
+    if report["upstream"]:
+        print("  upstream: " + ", ".join(f"{k} {v}" for k, v in report["upstream"].items()))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""Local stand-in for the LLM upstreams and Supabase Auth, for load tests.
+
+Speaks just enough of each protocol for the real provider clients:
+
+- OpenAI-compatible chat completions (``POST /chat/completions``, also
+  under ``/v1``), streamed as SSE chunks ending in a usage chunk and
+  ``[DONE]`` — what ``DeepSeekProvider`` talks to;
+- Gemini ``models/{model}:streamGenerateContent?alt=sse`` and
+  ``:generateContent`` (titles, history summaries) — ``GeminiProvider``;
+- Supabase's JWKS (``/auth/v1/.well-known/jwks.json``) for an ES256 key
+  generated at startup, plus ``POST /mock/token`` to sign access tokens
+  with it (JSON ``{"sub": ...}``; the issuer is taken from the request URL,
+  so use the same origin for ``SUPABASE_URL`` and the load driver).
+
+Responses are scripted: time to first token, token rate, tokens and
+characters per delta, injected error statuses (returned before streaming,
+in each API's error format) and mid-stream disconnects (the connection is
+dropped without finishing the response; uvicorn logs each one).  The script
+can be changed while running with ``POST /mock/script`` (JSON with any of
+the fields below) and ``GET /mock/stats`` reports what was served.
+
+    python -m bench.mock_upstream [--port 8081] [--ttft S] [--tokens-per-s N]
+        [--tokens 1-200] [--chunk-chars 1-12] [--errors 429:0.05,503:0.01]
+        [--disconnect-rate P]
+
+Then start the app against it, e.g.::
+
+    DEEPSEEK_BASE_URL=http://127.0.0.1:8081 GEMINI_BASE_URL=http://127.0.0.1:8081 \\
+    SUPABASE_URL=http://127.0.0.1:8081 DEEPSEEK_API_KEY=x GEMINI_API_KEY=x \\
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+
+and drive it with ``bench.load``.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+import uuid
+from collections import Counter
+from dataclasses import asdict, dataclass, field
+
+import jwt
+import uvicorn
+from cryptography.hazmat.primitives.asymmetric import ec
+from jwt.algorithms import ECAlgorithm
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+WORDS = (
+    "each model answers in its own words and the summary points out where "
+    "they agree where they differ and which details only one of them noticed"
+).split()
+
+# Gemini reports errors with the canonical status name
+_GOOGLE_STATUS = {
+    429: "RESOURCE_EXHAUSTED",
+    500: "INTERNAL",
+    502: "UNAVAILABLE",
+    503: "UNAVAILABLE",
+    504: "DEADLINE_EXCEEDED",
+}
+
+
+def _range(spec: str) -> tuple[int, int]:
+    lo, _, hi = str(spec).partition("-")
+    return int(lo), int(hi or lo)
+
+
+def _errors(spec: str) -> dict[int, float]:
+    """``"429:0.05,503:0.01"`` → ``{429: 0.05, 503: 0.01}``."""
+    out = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        status, _, rate = part.partition(":")
+        out[int(status)] = float(rate)
+    return out
+
+
+@dataclass
+class Script:
+    ttft: float = 0.3  # seconds before the first delta
+    jitter: float = 0.2  # +/- fraction applied to ttft
+    tokens_per_s: float = 50.0  # deltas per second once streaming
+    tokens: str = "50-200"  # deltas per response, N or MIN-MAX
+    chunk_chars: str = "1-12"  # characters per delta, N or MIN-MAX
+    errors: dict[int, float] = field(default_factory=dict)  # status -> probability
+    disconnect_rate: float = 0.0  # probability of dropping a stream midway
+
+    def update(self, changes: dict) -> None:
+        for key, value in changes.items():
+            if not hasattr(self, key):
+                raise ValueError(f"Unknown script field {key!r}")
+            if key == "errors" and isinstance(value, str):
+                value = _errors(value)
+            elif key == "errors":
+                value = {int(k): float(v) for k, v in value.items()}
+            setattr(self, key, value)
+
+    def first_token_delay(self, rng: random.Random) -> float:
+        return max(0.0, self.ttft * (1 + rng.uniform(-self.jitter, self.jitter)))
+
+    def error(self, rng: random.Random) -> int | None:
+        roll = rng.random()
+        for status, rate in self.errors.items():
+            if roll < rate:
+                return status
+            roll -= rate
+        return None
+
+    def deltas(self, rng: random.Random) -> list[str]:
+        lo, hi = _range(self.tokens)
+        c_lo, c_hi = _range(self.chunk_chars)
+        out = []
+        for _ in range(rng.randint(lo, hi)):
+            text = ""
+            n = rng.randint(c_lo, c_hi)
+            while len(text) < n:
+                text += rng.choice(WORDS) + " "
+            out.append(text[:n])
+        return out
+
+
+class Upstream:
+    """Scripted responses and counters shared by all routes."""
+
+    def __init__(self, script: Script, seed: int | None = None):
+        self.script = script
+        self.rng = random.Random(seed)
+        self.stats: Counter = Counter()
+        self.inflight = 0
+        self.peak_inflight = 0
+        self.key = ec.generate_private_key(ec.SECP256R1())
+        self.kid = uuid.uuid4().hex[:16]
+
+    def jwks(self) -> dict:
+        jwk = ECAlgorithm.to_jwk(self.key.public_key(), as_dict=True)
+        return {"keys": [{**jwk, "kid": self.kid, "alg": "ES256", "use": "sig"}]}
+
+    def sign(self, sub: str, issuer: str, ttl: int = 3600) -> str:
+        now = int(time.time())
+        claims = {
+            "sub": sub,
+            "aud": "authenticated",
+            "role": "authenticated",
+            "iss": issuer,
+            "iat": now,
+            "exp": now + ttl,
+        }
+        return jwt.encode(claims, self.key, algorithm="ES256", headers={"kid": self.kid})
+
+    async def stream(self, api: str, frame, done: bytes = b""):
+        """SSE body: scripted deltas, possibly cut off midway.
+
+        ``frame(delta, last)`` renders one event's JSON.  A dropped stream
+        ends the generator with ``_Disconnect``.
+        """
+        script = self.script
+        deltas = script.deltas(self.rng)
+        cut = len(deltas) + 1
+        if self.rng.random() < script.disconnect_rate:
+            cut = self.rng.randrange(len(deltas) or 1)
+        self.inflight += 1
+        self.peak_inflight = max(self.peak_inflight, self.inflight)
+        try:
+            await asyncio.sleep(script.first_token_delay(self.rng))
+            interval = 1 / script.tokens_per_s if script.tokens_per_s > 0 else 0
+            for i, delta in enumerate(deltas):
+                if i == cut:
+                    self.stats[f"{api}.disconnects"] += 1
+                    raise _Disconnect
+                if i and interval:
+                    await asyncio.sleep(interval)
+                self.stats[f"{api}.deltas"] += 1
+                yield b"data: " + json.dumps(frame(delta, False)).encode() + b"\n\n"
+            yield b"data: " + json.dumps(frame("", True)).encode() + b"\n\n"
+            if done:
+                yield done
+            self.stats[f"{api}.completed"] += 1
+        finally:
+            self.inflight -= 1
+
+
+class _Disconnect(Exception):
+    pass
+
+
+class SSEResponse(StreamingResponse):
+    """Streamed ``text/event-stream`` body that can drop the connection.
+
+    On ``_Disconnect`` the app returns without finishing the response, so
+    the server closes the connection and the client sees a truncated body,
+    as when an upstream dies mid-stream.
+    """
+
+    def __init__(self, body):
+        super().__init__(body, media_type="text/event-stream")
+
+    async def __call__(self, scope, receive, send):
+        await send(
+            {"type": "http.response.start", "status": 200, "headers": self.raw_headers}
+        )
+        try:
+            async for chunk in self.body_iterator:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        except _Disconnect:
+            return
+        await send({"type": "http.response.body", "body": b"", "more_body": False})
+
+
+def _openai_error(status: int) -> JSONResponse:
+    return JSONResponse(
+        {"error": {"message": f"Injected {status}", "type": "mock_error", "code": status}},
+        status_code=status,
+    )
+
+
+def _google_error(status: int) -> JSONResponse:
+    return JSONResponse(
+        {
+            "error": {
+                "code": status,
+                "message": f"Injected {status}",
+                "status": _GOOGLE_STATUS.get(status, "UNKNOWN"),
+            }
+        },
+        status_code=status,
+    )
+
+
+def build_app(upstream: Upstream) -> Starlette:
+    async def chat_completions(request: Request):
+        body = await request.json()
+        upstream.stats["openai.requests"] += 1
+        status = upstream.script.error(upstream.rng)
+        if status is not None:
+            upstream.stats[f"openai.{status}"] += 1
+            return _openai_error(status)
+        model = body.get("model", "mock")
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        created = int(time.time())
+        prompt_tokens = len(json.dumps(body.get("messages", []))) // 4
+        sent = []
+
+        def frame(delta: str, last: bool) -> dict:
+            base = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+            }
+            if last:
+                completion_tokens = len("".join(sent)) // 4
+                return {
+                    **base,
+                    "choices": [],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                        "prompt_cache_hit_tokens": 0,
+                    },
+                }
+            sent.append(delta)
+            return {
+                **base,
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"role": "assistant", "content": delta},
+                        "finish_reason": None,
+                    }
+                ],
+            }
+
+        if not body.get("stream"):
+            await asyncio.sleep(upstream.script.first_token_delay(upstream.rng))
+            text = "".join(upstream.script.deltas(upstream.rng))
+            upstream.stats["openai.completed"] += 1
+            return JSONResponse(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": created,
+                    "model": model,
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": text},
+                            "finish_reason": "stop",
+                        }
+                    ],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": len(text) // 4,
+                        "total_tokens": prompt_tokens + len(text) // 4,
+                    },
+                }
+            )
+        return SSEResponse(upstream.stream("openai", frame, b"data: [DONE]\n\n"))
+
+    async def gemini(request: Request):
+        model, _, method = request.path_params["target"].partition(":")
+        body = await request.json()
+        upstream.stats["gemini.requests"] += 1
+        status = upstream.script.error(upstream.rng)
+        if status is not None:
+            upstream.stats[f"gemini.{status}"] += 1
+            return _google_error(status)
+        prompt_tokens = len(json.dumps(body.get("contents", []))) // 4
+
+        def candidate(text: str, finished: bool) -> dict:
+            out = {
+                "candidates": [
+                    {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+                ],
+                "usageMetadata": {
+                    "promptTokenCount": prompt_tokens,
+                    "candidatesTokenCount": len(text) // 4,
+                    "totalTokenCount": prompt_tokens + len(text) // 4,
+                },
+                "modelVersion": model,
+            }
+            if finished:
+                out["candidates"][0]["finishReason"] = "STOP"
+            return out
+
+        if method == "generateContent":
+            await asyncio.sleep(upstream.script.first_token_delay(upstream.rng))
+            upstream.stats["gemini.completed"] += 1
+            return JSONResponse(candidate("".join(upstream.script.deltas(upstream.rng)), True))
+        if method != "streamGenerateContent":
+            return _google_error(404)
+        return SSEResponse(upstream.stream("gemini", candidate))
+
+    async def jwks(request: Request):
+        return JSONResponse(upstream.jwks())
+
+    async def token(request: Request):
+        body = await request.json()
+        sub = body.get("sub") or str(uuid.uuid4())
+        issuer = f"{request.url.scheme}://{request.url.netloc}/auth/v1"
+        return JSONResponse({"access_token": upstream.sign(sub, issuer), "sub": sub})
+
+    async def script(request: Request):
+        try:
+            upstream.script.update(await request.json())
+        except (ValueError, TypeError) as e:
+            return JSONResponse({"message": str(e)}, status_code=400)
+        return JSONResponse(asdict(upstream.script))
+
+    async def stats(request: Request):
+        return JSONResponse(
+            {
+                "script": asdict(upstream.script),
+                "inflight": upstream.inflight,
+                "peak_inflight": upstream.peak_inflight,
+                "counts": dict(sorted(upstream.stats.items())),
+            }
+        )
+
+    return Starlette(
+        routes=[
+            Route("/chat/completions", chat_completions, methods=["POST"]),
+            Route("/v1/chat/completions", chat_completions, methods=["POST"]),
+            Route("/{version}/models/{target}", gemini, methods=["POST"]),
+            Route("/auth/v1/.well-known/jwks.json", jwks),
+            Route("/mock/token", token, methods=["POST"]),
+            Route("/mock/script", script, methods=["POST"]),
+            Route("/mock/stats", stats),
+        ]
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--ttft", type=float, default=Script.ttft)
+    parser.add_argument("--jitter", type=float, default=Script.jitter)
+    parser.add_argument("--tokens-per-s", type=float, default=Script.tokens_per_s)
+    parser.add_argument("--tokens", default=Script.tokens)
+    parser.add_argument("--chunk-chars", default=Script.chunk_chars)
+    parser.add_argument("--errors", default="", help="e.g. 429:0.05,503:0.01")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    script = Script(
+        ttft=args.ttft,
+        jitter=args.jitter,
+        tokens_per_s=args.tokens_per_s,
+        tokens=args.tokens,
+        chunk_chars=args.chunk_chars,
+        errors=_errors(args.errors),
+        disconnect_rate=args.disconnect_rate,
+    )
+    app = build_app(Upstream(script, seed=args.seed))
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
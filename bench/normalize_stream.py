@@ -0,0 +1,116 @@
+"""Cost of streaming text normalization per chunk, before and after.
+
+Replays chunk streams through the old DeepSeek LaTeX rewriter (hold back a
+trailing backslash, then four ``str.replace`` passes per emitted piece) and
+through ``core.providers.normalize`` chains, and reports the time per chunk.
+
+Streams come from ``--file``, a JSON list of recorded streams (each a list
+of delta strings, e.g. dumped from a provider's ``_stream_text``), or are
+synthesized: math-heavy markdown cut into 1-12 character deltas, the size
+upstreams typically send.
+
+    python -m bench.normalize_stream [--file chunks.json] [--streams N] [--repeat N]
+"""
+
+import argparse
+import json
+import random
+import time
+
+from core.providers.normalize import normalize_stream
+
+SAMPLE = (
+    "The roots of \\(ax^2 + bx + c = 0\\) are\r\n"
+    "\\[x = \\frac{-b \\pm \\sqrt{b^2 - 4ac}}{2a}\\]\r\n"
+    "so for **a = 1**, *b = -3*, `c = 2` we get \\(x \\in \\{1, 2\\}\\).\r\n\r\n"
+    "- Plain prose without any markup tends to dominate real answers, "
+    "so most deltas contain no backslash at all.\r\n"
+)
+
+
+def legacy_stream(chunks):
+    """``DeepSeekProvider``'s former ``_LatexStream`` + ``sanitize_latex``."""
+
+    def sanitize(text):
+        text = text.replace("\\(", "$")
+        text = text.replace("\\)", "$")
+        text = text.replace("\\[", "$$")
+        text = text.replace("\\]", "$$")
+        return text
+
+    buffer = ""
+    for delta in chunks:
+        buffer += delta
+        if buffer.endswith("\\"):
+            emit, buffer = buffer[:-1], buffer[-1:]
+        else:
+            emit, buffer = buffer, ""
+        if emit:
+            yield sanitize(emit)
+    if buffer:
+        yield sanitize(buffer)
+
+
+def synthesize(streams: int, seed: int = 0) -> list[list[str]]:
+    rng = random.Random(seed)
+    out = []
+    for _ in range(streams):
+        text = SAMPLE * rng.randint(2, 6)
+        chunks, i = [], 0
+        while i < len(text):
+            n = rng.randint(1, 12)
+            chunks.append(text[i : i + n])
+            i += n
+        out.append(chunks)
+    return out
+
+
+def measure(fn, streams: list[list[str]], repeat: int) -> tuple[float, str]:
+    best = float("inf")
+    result = ""
+    for _ in range(repeat):
+        start = time.perf_counter()
+        outputs = ["".join(fn(chunks)) for chunks in streams]
+        best = min(best, time.perf_counter() - start)
+        result = "".join(outputs)
+    return best, result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--file", help="JSON list of recorded chunk streams")
+    parser.add_argument("--streams", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print a JSON report")
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as f:
+            streams = json.load(f)
+    else:
+        streams = synthesize(args.streams)
+    n_chunks = sum(len(s) for s in streams)
+
+    variants = {
+        "legacy latex (4 replaces)": legacy_stream,
+        "latex": lambda chunks: normalize_stream(chunks, "latex"),
+        "latex,newlines": lambda chunks: normalize_stream(chunks, "latex,newlines"),
+    }
+    report = {"streams": len(streams), "chunks": n_chunks, "ns_per_chunk": {}}
+    outputs = {}
+    for name, fn in variants.items():
+        seconds, outputs[name] = measure(fn, streams, args.repeat)
+        report["ns_per_chunk"][name] = round(seconds / n_chunks * 1e9, 1)
+    report["latex_matches_legacy"] = outputs["latex"] == outputs["legacy latex (4 replaces)"]
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"{report['streams']} streams, {n_chunks} chunks (best of {args.repeat})")
+    for name, ns in report["ns_per_chunk"].items():
+        print(f"  {name:28s} {ns:8.1f} ns/chunk")
+    print(f"  latex output identical to legacy: {report['latex_matches_legacy']}")
+
+
+if __name__ == "__main__":
+    main()
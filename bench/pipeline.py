@@ -0,0 +1,373 @@
+"""End-to-end latency, throughput, DB and memory cost of a summarize turn.
+
+Every model is replaced by a ``bench.fakes.FakeProvider`` with scripted
+upstream timing, and each turn runs both through ``summarize()`` directly
+and through ``POST /api/summarize`` (Flask test client, streamed, real
+``auth_required`` apart from token verification).  Per turn it records:
+
+- ``ttfb_ms``: time to the first event / response bytes
+- ``ttlb_ms``: time to the end of the stream
+- ``chunks_per_s``: chunk events per second after the first byte (for HTTP,
+  SSE events after ``core.sse`` coalescing)
+- ``db_round_trips``: statements plus commits, background title included
+- ``peak_kb``: peak traced allocation during the turn (separate runs under
+  ``tracemalloc``, so the timings are not skewed by it)
+
+With ``--history N`` each turn continues a fresh session seeded with N prior
+turns; with 0 it starts a new chat (and generates a title).  The database is
+a throwaway SQLite file; ``DATABASE_URL`` is ignored.
+
+Results go to ``--out`` as JSON together with the commit and settings, and
+``--compare`` prints the change against an earlier results file:
+
+    python -m bench.pipeline [--turns N] [--ttft S] [--token-delay S]
+        [--tokens N] [--chunk-chars 1-12] [--failure-rate P] [--history N]
+        [--out results.json] [--compare baseline.json]
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+
+_db_file = tempfile.NamedTemporaryFile(prefix="sumlime-bench-", suffix=".db", delete=False)
+_db_file.close()
+os.environ["DATABASE_URL"] = f"sqlite:///{_db_file.name}"
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+
+from flask import g
+from sqlalchemy import event
+
+import auth
+from app import app
+from bench.fakes import FakeProvider, parse_range
+from core import pipeline
+from core.pipeline import MODEL_PROVIDERS, summarize
+from core.providers.history import HISTORY_CACHE
+from core.providers.models import ChatSession, ChatTurn, LLMOutput
+from db import db
+
+
+class _UserId(str):
+    """``sub`` as Supabase gives it; SQLite binds UUID columns via ``.hex``."""
+
+    @property
+    def hex(self) -> str:
+        return uuid.UUID(self).hex
+
+
+USER = _UserId(uuid.uuid4())
+# Background work a turn starts (see core.pipeline._in_background)
+BACKGROUND = {"_generate_title", "maybe_compact"}
+METRICS = ("ttfb_ms", "ttlb_ms", "chunks_per_s", "db_round_trips", "peak_kb")
+
+
+class RoundTrips:
+    """Statements and commits sent to ``engine``, from any thread."""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def _hit(self, *args, **kwargs):
+        with self._lock:
+            self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, "before_cursor_execute", self._hit)
+        event.listen(self.engine, "commit", self._hit)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, "before_cursor_execute", self._hit)
+        event.remove(self.engine, "commit", self._hit)
+
+
+def _wait_for_background() -> None:
+    for thread in threading.enumerate():
+        if thread.name in BACKGROUND:
+            thread.join()
+
+
+def seed_session(turns: int, models: list[str], summary_model: str, chars: int) -> int | None:
+    """A session with ``turns`` finished turns, or ``None`` for a new chat."""
+    if not turns:
+        return None
+    session = ChatSession(title="bench", user_id=uuid.UUID(USER))  # type: ignore[arg-type]
+    db.session.add(session)
+    db.session.flush()
+    filler = ("lorem ipsum dolor sit amet " * (chars // 27 + 1))[:chars]
+    for i in range(turns):
+        turn = ChatTurn(session_id=session.id, prompt=f"earlier question {i}")  # type: ignore[arg-type]
+        db.session.add(turn)
+        db.session.flush()
+        for model in models:
+            db.session.add(LLMOutput(turn_id=turn.id, provider=model, content=filler))  # type: ignore[arg-type]
+        db.session.add(
+            LLMOutput(
+                turn_id=turn.id,  # type: ignore[arg-type]
+                provider=summary_model,  # type: ignore[arg-type]
+                summarizer_prompt=f"summarize {i}",  # type: ignore[arg-type]
+                content=filler,  # type: ignore[arg-type]
+            )
+        )
+    db.session.commit()
+    return session.id
+
+
+def turn_summarize(prompt: str, session: int | None, args) -> tuple[float, float, int]:
+    """``(ttfb, ttlb, chunks)`` of one ``summarize()`` turn."""
+    g.user_id = uuid.UUID(USER)
+    start = time.perf_counter()
+    ttfb = None
+    chunks = 0
+    gen = summarize(prompt, args.models, chat_session=session, summary_model=args.summary_model)
+    try:
+        while True:
+            event_ = next(gen)
+            if ttfb is None:
+                ttfb = time.perf_counter() - start
+            if "chunk" in event_:
+                chunks += 1
+    except StopIteration:
+        pass
+    return ttfb or 0.0, time.perf_counter() - start, chunks
+
+
+def turn_http(prompt: str, session: int | None, args, client) -> tuple[float, float, int]:
+    """``(ttfb, ttlb, chunks)`` of one streamed ``/api/summarize`` request."""
+    body = {
+        "prompt": prompt,
+        "models": args.models,
+        "chatSession": session,
+        "summary_model": args.summary_model,
+    }
+    start = time.perf_counter()
+    res = client.post(
+        "/api/summarize",
+        json=body,
+        headers={"Authorization": "Bearer bench"},
+        buffered=False,
+    )
+    ttfb = None
+    chunks = 0
+    for data in res.iter_encoded():
+        if not data:
+            continue
+        if ttfb is None:
+            ttfb = time.perf_counter() - start
+        chunks += data.count(b'"chunk"')
+    res.close()
+    if res.status_code != 200:
+        raise RuntimeError(f"/api/summarize returned {res.status_code}")
+    return ttfb or 0.0, time.perf_counter() - start, chunks
+
+
+def run_target(target: str, args, client, engine) -> dict:
+    samples: dict[str, list[float]] = {m: [] for m in METRICS}
+    failures = 0
+
+    def one_turn(i: int, trace: bool) -> dict | None:
+        with app.app_context():
+            session = seed_session(args.history, args.models, args.summary_model, args.history_chars)
+            HISTORY_CACHE.clear()  # every turn starts cold, like a fresh worker
+        prompt = f"{target} question {i} {uuid.uuid4().hex}"
+        if trace:
+            tracemalloc.start()
+            base = tracemalloc.get_traced_memory()[0]
+        try:
+            with RoundTrips(engine) as trips:
+                if target == "summarize":
+                    with app.app_context():
+                        ttfb, ttlb, chunks = turn_summarize(prompt, session, args)
+                else:
+                    ttfb, ttlb, chunks = turn_http(prompt, session, args, client)
+                _wait_for_background()
+        except Exception as exc:  # injected failures that outlast the retries
+            print(f"  {target} turn {i} failed: {exc!r}", file=sys.stderr)
+            return None
+        finally:
+            if trace:
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+        if trace:
+            return {"peak_kb": (peak - base) / 1024}
+        return {
+            "ttfb_ms": ttfb * 1000,
+            "ttlb_ms": ttlb * 1000,
+            "chunks_per_s": chunks / (ttlb - ttfb) if ttlb > ttfb else 0.0,
+            "db_round_trips": trips.count,
+        }
+
+    for i in range(args.warmup):
+        one_turn(-1 - i, trace=False)
+    for i in range(args.turns):
+        result = one_turn(i, trace=False)
+        if result is None:
+            failures += 1
+            continue
+        for k, v in result.items():
+            samples[k].append(v)
+    for i in range(args.memory_turns):
+        result = one_turn(args.turns + i, trace=True)
+        if result is not None:
+            samples["peak_kb"].append(result["peak_kb"])
+
+    report: dict = {"turns": args.turns, "failed_turns": failures}
+    for metric, values in samples.items():
+        report[metric] = summarize_samples(values)
+    return report
+
+
+def summarize_samples(values: list[float]) -> dict | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+    return {
+        "mean": round(statistics.fmean(values), 2),
+        "p50": round(statistics.median(values), 2),
+        "p95": round(p95, 2),
+        "min": round(ordered[0], 2),
+        "max": round(ordered[-1], 2),
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def compare(report: dict, baseline: dict) -> None:
+    print(f"change vs {baseline.get('commit') or 'baseline'} (p50):")
+    if baseline.get("settings") != report["settings"]:
+        print("  note: the baseline ran with different settings")
+    for target, results in report["results"].items():
+        before = baseline.get("results", {}).get(target)
+        if not before:
+            continue
+        for metric in METRICS:
+            new, old = results.get(metric), before.get(metric)
+            if not new or not old or not old["p50"]:
+                continue
+            delta = (new["p50"] - old["p50"]) / old["p50"] * 100
+            print(f"  {target:10s} {metric:15s} {old['p50']:10.2f} -> {new['p50']:10.2f}  {delta:+6.1f}%")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--targets", default="summarize,http", help="summarize, http or both")
+    parser.add_argument("--models", default="deepseek,gemini")
+    parser.add_argument("--summary-model", default="gemini")
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--memory-turns", type=int, default=3)
+    parser.add_argument("--ttft", type=float, default=0.2, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.005, help="seconds between tokens")
+    parser.add_argument("--tokens", type=int, default=100, help="deltas per response")
+    parser.add_argument("--chunk-chars", default="1-12", help="delta size, N or MIN-MAX chars")
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--history", type=int, default=0, help="prior turns per session")
+    parser.add_argument("--history-chars", type=int, default=1500, help="chars per prior output")
+    parser.add_argument("--concurrent", action="store_true", help="fan out to providers in parallel")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here")
+    parser.add_argument("--compare", help="earlier JSON report to compare against")
+    args = parser.parse_args()
+    args.models = [m.strip() for m in args.models.split(",") if m.strip()]
+    targets = [t.strip() for t in args.targets.split(",") if t.strip()]
+
+    settings = {
+        "models": args.models,
+        "summary_model": args.summary_model,
+        "ttft": args.ttft,
+        "token_delay": args.token_delay,
+        "tokens": args.tokens,
+        "chunk_chars": args.chunk_chars,
+        "failure_rate": args.failure_rate,
+        "history": args.history,
+        "history_chars": args.history_chars,
+        "concurrent": args.concurrent or pipeline.CONCURRENT_PROVIDERS,
+        "seed": args.seed,
+    }
+    if args.concurrent:
+        pipeline.CONCURRENT_PROVIDERS = True
+    chunk_chars = parse_range(args.chunk_chars)
+    fakes = {
+        name: FakeProvider(
+            name,
+            ttft=args.ttft,
+            token_delay=args.token_delay,
+            tokens=args.tokens,
+            chunk_chars=chunk_chars,
+            failure_rate=args.failure_rate,
+            seed=args.seed + i,
+        )
+        for i, name in enumerate(dict.fromkeys([*args.models, args.summary_model, "gemini"]))
+    }
+    MODEL_PROVIDERS.clear()
+    MODEL_PROVIDERS.update(fakes)
+
+    auth.authenticate_token = lambda token: USER
+    report = {
+        "benchmark": "pipeline",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "settings": settings,
+        "env": {k: v for k, v in sorted(os.environ.items()) if k.startswith("SUMLIME_")},
+        "results": {},
+    }
+    try:
+        with app.app_context():
+            engine = db.engine
+
+            @event.listens_for(engine, "connect")
+            def add_set_config(dbapi_conn, _):
+                # Stand-in for Postgres' set_config so set_rls_claims runs as is
+                dbapi_conn.create_function("set_config", 3, lambda k, v, local: v)
+
+            engine.dispose()  # reconnect so the listener runs
+            db.create_all()
+        client = app.test_client()
+        for target in targets:
+            report["results"][target] = run_target(target, args, client, engine)
+    finally:
+        os.unlink(_db_file.name)
+    report["upstream"] = {
+        name: {"calls": p.upstream_calls, "failures": p.upstream_failures}
+        for name, p in fakes.items()
+    }
+
+    for target, results in report["results"].items():
+        print(f"{target}: {results['turns']} turns, {results['failed_turns']} failed")
+        for metric in METRICS:
+            s = results[metric]
+            if s:
+                print(f"  {metric:15s} p50 {s['p50']:10.2f}  p95 {s['p95']:10.2f}  max {s['max']:10.2f}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""Prometheus metrics for the streaming pipeline.
+
+Instrumented points observe once per stream, title, token check or
+request, never per chunk: streams only count their chunks in a local
+variable on the hot path.  ``GET /metrics`` (enabled with
+``SUMLIME_METRICS``; ``SUMLIME_METRICS_TOKEN`` additionally requires
+``Authorization: Bearer <token>``) serves them in the Prometheus text
+format.
+
+With several worker processes each writes its samples to files under
+``PROMETHEUS_MULTIPROC_DIR`` and a scrape of any worker sums them all;
+``gunicorn.conf.py`` sets that directory up.  Without it (dev server,
+single uvicorn process) the in-process registry is served.
+"""
+
+import contextvars
+import os
+import time
+from typing import AsyncIterator, Iterable, Iterator
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from core.config import env_bool
+
+METRICS_ENABLED = env_bool("SUMLIME_METRICS", False)
+METRICS_TOKEN = os.environ.get("SUMLIME_METRICS_TOKEN") or None
+
+_STREAM_BUCKETS = (0.5, 1, 2, 4, 8, 15, 30, 60, 120, 300)
+
+PROVIDER_TTFT = Histogram(
+    "sumlime_provider_ttft_seconds",
+    "Time from calling a provider's upstream to its first chunk.",
+    ["provider"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 3, 5, 8, 13, 20, 30),
+)
+PROVIDER_STREAM = Histogram(
+    "sumlime_provider_stream_seconds",
+    "Duration of a completed upstream stream, first request to last chunk.",
+    ["provider"],
+    buckets=_STREAM_BUCKETS,
+)
+PROVIDER_CHUNK_RATE = Histogram(
+    "sumlime_provider_chunks_per_second",
+    "Chunks per second of a completed stream after its first chunk.",
+    ["provider"],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000),
+)
+PROVIDER_CHUNKS = Counter(
+    "sumlime_provider_chunks", "Chunks streamed from upstreams.", ["provider"]
+)
+PROVIDER_RETRIES = Counter(
+    "sumlime_provider_retries",
+    "Upstream attempts that failed and were retried.",
+    ["provider", "exception"],
+)
+PROVIDER_FAILURES = Counter(
+    "sumlime_provider_failures",
+    "Upstream calls that failed after retries, by exception class.",
+    ["provider", "exception", "retryable"],
+)
+PROVIDER_HEDGES = Counter(
+    "sumlime_provider_hedges",
+    "Duplicate requests started because the first chunk was slow.",
+    ["provider"],
+)
+PROVIDER_HEDGE_WINS = Counter(
+    "sumlime_provider_hedge_wins",
+    "Hedged calls whose duplicate request streamed first.",
+    ["provider"],
+)
+BREAKER_STATE = Gauge(
+    "sumlime_provider_breaker_state",
+    "Workers whose circuit breaker for the provider is in each state.",
+    ["provider", "state"],
+    multiprocess_mode="livesum",
+)
+BREAKER_TRIPS = Counter(
+    "sumlime_provider_breaker_trips", "Times a provider's circuit opened.", ["provider"]
+)
+BREAKER_REJECTED = Counter(
+    "sumlime_provider_breaker_rejected",
+    "Calls failed fast because the provider's circuit was open.",
+    ["provider"],
+)
+SIMILARITY_LOOKUP = Histogram(
+    "sumlime_similarity_lookup_seconds",
+    "Near-duplicate cache lookups, by namespace and hit or miss.",
+    ["namespace", "outcome"],
+    buckets=(0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025),
+)
+SIMILARITY_SCORE = Histogram(
+    "sumlime_similarity_best_score",
+    "Jaccard similarity of a lookup's closest candidate, hit or not.",
+    ["namespace"],
+    buckets=(0.5, 0.6, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95, 1),
+)
+PROMPT_CACHE_REQUESTS = Counter(
+    "sumlime_prompt_cache_requests",
+    "Upstream calls that reported their prompt token usage.",
+    ["provider"],
+)
+PROMPT_TOKENS = Counter(
+    "sumlime_prompt_tokens", "Prompt tokens sent upstream.", ["provider"]
+)
+PROMPT_CACHED_TOKENS = Counter(
+    "sumlime_prompt_cached_tokens",
+    "Prompt tokens the upstream served from its prefix cache.",
+    ["provider"],
+)
+SUMMARIZER = Histogram(
+    "sumlime_summarizer_seconds",
+    "Summarizer stream duration (summary, progressive draft or addendum).",
+    ["kind"],
+    buckets=_STREAM_BUCKETS,
+)
+TITLE = Histogram(
+    "sumlime_title_seconds",
+    "Generating and storing a new chat's title.",
+    buckets=(0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30),
+)
+AUTH = Histogram(
+    "sumlime_auth_verify_seconds",
+    "Bearer token verification (including cache hits).",
+    ["outcome"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+REQUEST_DB = Histogram(
+    "sumlime_request_db_seconds",
+    "Time spent in database statements per request, across its threads.",
+    ["endpoint"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5),
+)
+
+
+# --- timing helpers ---
+
+
+def timed(stream: Iterable[str], histogram) -> Iterator[str]:
+    """Yield from ``stream`` and observe how long it took once it ends."""
+    start = time.perf_counter()
+    yield from stream
+    histogram.observe(time.perf_counter() - start)
+
+
+async def atimed(stream: AsyncIterator[str], histogram) -> AsyncIterator[str]:
+    """Async variant of :func:`timed`."""
+    start = time.perf_counter()
+    async for chunk in stream:
+        yield chunk
+    histogram.observe(time.perf_counter() - start)
+
+
+# --- DB time per request ---
+
+# Statement durations of the current request; shared (not copied) with the
+# threads and tasks that inherit the request's context, e.g. provider fan-out
+_db_times: contextvars.ContextVar[list[float] | None] = contextvars.ContextVar(
+    "sumlime_db_times", default=None
+)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if _db_times.get() is not None:
+        conn.info["sumlime_started"] = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("sumlime_started", None)
+    times = _db_times.get()
+    if times is not None and started is not None:
+        times.append(time.perf_counter() - started)
+
+
+def begin_request() -> None:
+    """Start collecting DB time for the current request."""
+    _db_times.set([])
+
+
+def end_request(endpoint: str | None) -> None:
+    """Observe the request's DB time and stop collecting."""
+    times = _db_times.get()
+    if times is None:
+        return
+    _db_times.set(None)
+    REQUEST_DB.labels(endpoint or "unknown").observe(sum(times))
+
+
+# --- exposition ---
+
+
+def authorized(authorization: str) -> bool:
+    return METRICS_TOKEN is None or authorization == f"Bearer {METRICS_TOKEN}"
+
+
+def exposition() -> tuple[bytes, str]:
+    """The current metrics of all workers, and their content type."""
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -7,46 +7,291 @@ The final return value (via ``StopIteration.value``) still contains the same
 metadata that callers previously received.
 """
 
-from core.providers.deepseek import DeepSeekProvider
-
-# from core.providers.chatgpt import ChatGPTProvider
-# from core.providers.claude import ClaudeProvider
-from core.providers.gemini import GeminiProvider
+import asyncio
+from concurrent.futures import Future
+import contextlib
+import contextvars
+import logging
+import queue
+import threading
+from typing import AsyncIterator, Callable, Iterator
 
 from db import db
-from core.providers.models import ChatSession, ChatTurn
+from core import metrics
+from core.providers import transport
+from core.providers.base import run_in_session
+from core.providers.registry import ProviderRegistry, configured_factories
+from core.providers.context import COMPACTION_ENABLED, COMPACTION_MODEL, maybe_compact
+from core.providers.history import (
+    HISTORY_CACHE,
+    ChatHistory,
+    HistoryOutput,
+    HistoryTurn,
+)
+from core.providers.write_behind import (
+    WRITE_BEHIND,
+    OutputBatch,
+    close_batch,
+    current_batch,
+    flush,
+    open_batch,
+    replay_spool,
+    spool_pending,
+)
+from core.config import env_bool, env_float, env_int
+from core.providers.models import ChatSession, ChatTurn, LLMOutput
 from datetime import datetime, timezone
-from flask import g, abort
+from flask import g, abort, current_app
 
-MODEL_PROVIDERS = {
-    "deepseek": DeepSeekProvider(),
-    # "chatgpt": ChatGPTProvider(),
-    # "claude": ClaudeProvider(),
-    "gemini": GeminiProvider(),
-}
+# Built on first use; enable more with SUMLIME_PROVIDERS (see registry)
+MODEL_PROVIDERS = ProviderRegistry(configured_factories())
 
+# Run the selected providers in parallel threads instead of one after another.
+CONCURRENT_PROVIDERS = env_bool("SUMLIME_CONCURRENT_PROVIDERS", False)
+# Start the summarizer once this many providers have finished (0 = all of them).
+SUMMARY_AFTER = env_int("SUMLIME_SUMMARY_AFTER", 0)
+# How long the final event waits for a new chat's title (it is saved anyway).
+TITLE_WAIT = env_float("SUMLIME_TITLE_WAIT", 5.0)
 
-def summarize(
+_DONE = object()
+
+logger = logging.getLogger(__name__)
+
+
+def _origins() -> list[str]:
+    return sorted({p.base_url for p in MODEL_PROVIDERS.values() if p.base_url})
+
+
+def warm_up() -> None:
+    """Open pooled connections to every provider's upstream (worker boot)."""
+    transport.warm_up(_origins())
+
+
+async def awarm_up() -> None:
+    """Async variant of :func:`warm_up`, for the ASGI event loop."""
+    await transport.awarm_up(_origins())
+
+
+def _in_background(fn, *args) -> Future:
+    """Run ``fn`` on a daemon thread inside a fresh app context.
+
+    The returned future resolves to ``fn``'s result, or ``None`` if it
+    raised (the error is logged).
+    """
+    app = current_app._get_current_object()  # type: ignore[attr-defined]
+    future: Future = Future()
+
+    def run():
+        with app.app_context():
+            try:
+                future.set_result(fn(*args))
+            except Exception:
+                logger.exception("Background %s failed", fn.__name__)
+                future.set_result(None)
+
+    threading.Thread(target=run, name=fn.__name__, daemon=True).start()
+    return future
+
+
+def _placeholder_title(prompt: str) -> str:
+    """Instant title for a new chat until the model-written one arrives."""
+    title = " ".join(prompt.split()) or "Chat session"
+    return title if len(title) <= 40 else title[:39].rstrip() + "…"
+
+
+def _generate_title(
+    title_model: str, prompt: str, chat_session: int, placeholder: str
+) -> str | None:
+    """Ask ``title_model`` for a title and store it over the placeholder."""
+    with metrics.TITLE.time():
+        title = MODEL_PROVIDERS[title_model].create_chat_title(prompt)
+        if not title:
+            return None
+        db.session.execute(
+            db.update(ChatSession)
+            .where(ChatSession.id == chat_session, ChatSession.title == placeholder)
+            .values(title=title)
+        )
+        db.session.commit()
+    return title
+
+
+def _title_events(title: Future | None, chat_session: int, wait: float = 0):
+    """The ``{"title": ...}`` event, once the background title is ready."""
+    if title is None:
+        return []
+    try:
+        result = title.result(timeout=wait)
+    except TimeoutError:
+        return []
+    return [{"title": result, "session_id": chat_session}] if result else []
+
+
+def _stream_sequentially(
+    models: list[str], prompt: str, turn_id: int, session_id: int, history: ChatHistory
+):
+    """Yield ``(model, chunk)`` pairs, draining each provider in turn.
+
+    A ``(model, None)`` pair marks the end of each provider's stream.
+    """
+    for model in models:
+        stream = MODEL_PROVIDERS[model].query(
+            prompt, turn_id, session_id, history=history
+        )
+        for chunk in stream:
+            yield model, chunk
+        yield model, None
+
+
+class _FanOut:
+    """Drain several provider streams at once and merge their chunks.
+
+    Each stream is consumed by its own thread inside a fresh app context, so
+    every worker gets its own scoped ``db.session`` for history reads and for
+    persisting its ``LLMOutput``.  Workers run in a copy of the submitting
+    context, so they share its write-behind batch.  Iterating yields ``(channel, chunk)`` pairs
+    as they arrive and ``(channel, None)`` when a channel finishes; the first
+    worker error is re-raised in the consumer.  Streams may be submitted while
+    iterating.
+    """
+
+    def __init__(self):
+        self.app = current_app._get_current_object()  # type: ignore[attr-defined]
+        self.user_id = g.get("user_id")
+        self.events: queue.Queue = queue.Queue()
+        self.stop = threading.Event()
+        self.pending = 0
+
+    def submit(self, channel: str, start: Callable[[], Iterator[str]]):
+        self.pending += 1
+        threading.Thread(
+            target=contextvars.copy_context().run,
+            args=(self._run, channel, start),
+            name=f"provider-{channel}",
+            daemon=True,
+        ).start()
+
+    def _run(self, channel: str, start: Callable[[], Iterator[str]]):
+        try:
+            with self.app.app_context():
+                g.user_id = self.user_id
+                stream = start()
+                try:
+                    for chunk in stream:
+                        if self.stop.is_set():
+                            break
+                        self.events.put((channel, chunk))
+                finally:
+                    stream.close()  # type: ignore[attr-defined]
+        except BaseException as exc:
+            self.events.put((channel, exc))
+        else:
+            self.events.put((channel, _DONE))
+
+    def __iter__(self):
+        try:
+            while self.pending:
+                channel, item = self.events.get()
+                if item is _DONE:
+                    self.pending -= 1
+                    yield channel, None
+                elif isinstance(item, BaseException):
+                    raise item
+                else:
+                    yield channel, item
+        finally:
+            # Client went away or a sibling failed: let the others wind down
+            self.stop.set()
+
+
+def _label(model: str, models: list[str], llm_anonymous: bool) -> str:
+    return f"LLM {models.index(model) + 1}" if llm_anonymous else model.upper()
+
+
+def _summary_prompt(
+    prompt: str, models: list[str], results: dict[str, str], llm_anonymous: bool
+) -> str:
+    summary_input = "\n\n".join(
+        [
+            f"{_label(model, models, llm_anonymous)}:\n{results[model]}"
+            for model in models
+            if model in results
+        ]
+    )
+
+    "Compare the following responses. First, give a combined answer. Then, list key differences and ambiguities. Keep it brief."
+    return f"""Give one concise answer to the original prompt, integrating the best LLM insights.
+
+Prompt:\n\n
+{prompt}\n\n
+LLM responses:\n\n
+{summary_input}
+"""
+
+
+def _addendum_prompt(
     prompt: str,
     models: list[str],
-    chat_session: int | None = None,
-    summary_model: str = "gemini",
-    title_model: str = "gemini",
-    llm_anonymous: bool = True,
-):
-    """Stream responses from multiple providers and yield chunks.
+    late: list[str],
+    results: dict[str, str],
+    draft: str,
+    llm_anonymous: bool,
+) -> str:
+    late_input = "\n\n".join(
+        f"{_label(model, models, llm_anonymous)}:\n{results[model]}" for model in late
+    )
+    return f"""You already answered the original prompt from some of the LLM responses. More responses have now arrived. Briefly add only what they correct or contribute; if they add nothing, say so in one sentence.
 
-    Yields dictionaries of the form ``{"provider": name, "chunk": text}`` for
-    each partial piece of text produced by the provider.  After all providers
-    and the summarizer complete, a final dictionary with the same structure as
-    the old return value is returned via ``StopIteration.value``.
+Prompt:\n\n
+{prompt}\n\n
+Your answer so far:\n\n
+{draft}\n\n
+Additional LLM responses:\n\n
+{late_input}
+"""
+
+
+def _merge_summarizer_outputs(turn_id: int, provider: str, content: str):
+    """Fold the draft and addendum rows of a progressive summary into one.
+
+    Keeps the invariant that a turn has a single summarizer ``LLMOutput``,
+    which transcript and history readers rely on.
     """
+    batch = current_batch()
+    if batch is not None:  # nothing committed yet
+        batch.merge_summarizer(turn_id, provider, content)
+        return
 
-    if chat_session is None:  # Create new chat if needed
-        chat_title = MODEL_PROVIDERS[title_model].create_chat_title(prompt)
+    rows = (
+        db.session.execute(
+            db.select(LLMOutput)
+            .filter(
+                LLMOutput.turn_id == turn_id,
+                LLMOutput.provider == provider,
+                LLMOutput.summarizer_prompt.is_not(None),
+            )
+            .order_by(LLMOutput.id.asc())
+        )
+        .scalars()
+        .all()
+    )
+    if len(rows) < 2:
+        return
+    rows[0].content = content
+    for extra in rows[1:]:
+        db.session.delete(extra)
+    db.session.commit()
+
+
+def _open_turn(prompt: str, chat_session: int | None, chat_title: str | None) -> ChatTurn:
+    """Create the session if needed, touch it and add a flushed ``ChatTurn``.
+
+    Nothing is committed here; the caller's next commit covers all three.
+    """
+    if chat_session is None:
         new_session = ChatSession(title=chat_title, user_id=g.user_id)  # type: ignore
         db.session.add(new_session)
-        db.session.commit()
+        db.session.flush()
         chat_session = new_session.id
 
     # Update last_used time for current chat_session
@@ -54,7 +299,6 @@ def summarize(
     if session is None:
         abort(404)
     session.last_used = datetime.now(timezone.utc)
-    db.session.commit()
 
     # Create new ChatTurn
     new_turn = ChatTurn(
@@ -63,44 +307,261 @@ def summarize(
     )
     db.session.add(new_turn)
     db.session.flush()  # ensure new_turn.id is populated before using it
+    return new_turn
 
-    results: dict[str, str] = {}
-    # Stream each provider sequentially, yielding chunks as they arrive
-    for model in models:
-        stream = MODEL_PROVIDERS[model].query(prompt, new_turn.id, chat_session)
-        parts: list[str] = []
-        for chunk in stream:
-            parts.append(chunk)
-            yield {"provider": model, "chunk": chunk}
-        results[model] = "".join(parts)
 
-    summary_input = "\n\n".join(
-        [
-            f"{('LLM ' + str(i)) if llm_anonymous else model.upper()}:\n{results[model]}"
-            for i, model in enumerate(models, start=1)
-            if model in results
-        ]
+def _history_turn(
+    turn_id: int,
+    prompt: str,
+    models: list[str],
+    results: dict[str, str],
+    summary_model: str,
+    summary_prompt: str,
+) -> HistoryTurn:
+    """The finished turn as providers persisted it, for ``HISTORY_CACHE``."""
+    outputs = [HistoryOutput(model, None, results[model].strip()) for model in models]
+    outputs.append(
+        HistoryOutput(summary_model, summary_prompt, results["summarizer"].strip())
     )
+    return HistoryTurn(turn_id, prompt, tuple(outputs), completed=True)
 
-    "Compare the following responses. First, give a combined answer. Then, list key differences and ambiguities. Keep it brief."
-    summary_prompt = f"""Give one concise answer to the original prompt, integrating the best LLM insights.
 
-Prompt:\n\n
-{prompt}\n\n
-LLM responses:\n\n
-{summary_input}
-"""
-    summary_stream = MODEL_PROVIDERS[summary_model].query(
-        summary_prompt, new_turn.id, chat_session, is_summarizing=True
+def _complete_turn(turn_id: int) -> None:
+    """Mark every output of the turn as stored (see ``HistoryTurn.settled``).
+
+    Inside a write-behind batch the mark is committed with the batch's rows.
+    """
+    batch = current_batch()
+    if batch is not None:
+        batch.complete(turn_id)
+        return
+    db.session.execute(
+        db.update(ChatTurn)
+        .where(ChatTurn.id == turn_id)
+        .values(completed_at=datetime.now(timezone.utc))
     )
-    summary_parts: list[str] = []
-    for chunk in summary_stream:
-        summary_parts.append(chunk)
-        # Expose summarizer output with a fixed provider name so callers can
-        # easily differentiate it from model outputs
-        yield {"provider": "summarizer", "chunk": chunk}
-    summary = "".join(summary_parts)
+    db.session.commit()
+
+
+def _flush_batch(batch: OutputBatch) -> None:
+    """Commit the turn's batch; replay an earlier turn's spool in the background."""
+    if flush(batch) and spool_pending():
+        _in_background(replay_spool)
+
+
+def _finish_turn(chat_session: int, history: ChatHistory, turn: HistoryTurn):
+    """Append the finished turn to the history cache and compact if due."""
+    HISTORY_CACHE.record(chat_session, turn)
+    if COMPACTION_ENABLED:
+        _in_background(
+            maybe_compact,
+            chat_session,
+            ChatHistory(history.turns + (turn,), history.summary, history.summary_turn_id),
+            MODEL_PROVIDERS[COMPACTION_MODEL].summarize_history,
+        )
+
+
+def summarize(
+    prompt: str,
+    models: list[str],
+    chat_session: int | None = None,
+    summary_model: str = "gemini",
+    title_model: str = "gemini",
+    llm_anonymous: bool = True,
+    concurrent: bool | None = None,
+    summary_after: int | None = None,
+    write_behind: bool | None = None,
+):
+    """Stream responses from multiple providers and yield chunks.
+
+    Yields dictionaries of the form ``{"provider": name, "chunk": text}`` for
+    each partial piece of text produced by the provider.  After all providers
+    and the summarizer complete, a final dictionary with the same structure as
+    the old return value is returned via ``StopIteration.value``.
+
+    With ``concurrent`` (default: ``CONCURRENT_PROVIDERS``) all providers are
+    queried at once and their chunks arrive interleaved.  With
+    ``summary_after`` (default: ``SUMMARY_AFTER``) set below ``len(models)``
+    the summarizer starts as soon as that many providers have finished, and
+    appends an addendum covering the stragglers once they land; this implies
+    concurrent fan-out.  With ``write_behind`` (default: ``WRITE_BEHIND``)
+    the turn's outputs are committed together right before returning, or
+    as the generator closes if the client goes away first.
+
+    A new chat starts with a placeholder title taken from the prompt while
+    ``title_model`` writes the real one in the background; it is saved and
+    yielded as ``{"title": ..., "session_id": ...}`` once ready.
+    """
+    if write_behind is None:
+        write_behind = WRITE_BEHIND
+    args = (
+        prompt,
+        models,
+        chat_session,
+        summary_model,
+        title_model,
+        llm_anonymous,
+        concurrent,
+        summary_after,
+    )
+    if not write_behind:
+        return (yield from _summarize(*args))
+    batch = open_batch()
+    try:
+        final = yield from _summarize(*args)
+    except BaseException:
+        # Client gone or turn failed: keep what finished providers wrote
+        flush(batch)
+        raise
+    else:
+        _flush_batch(batch)
+        return final
+    finally:
+        close_batch()
+
+
+def _summarize(
+    prompt: str,
+    models: list[str],
+    chat_session: int | None,
+    summary_model: str,
+    title_model: str,
+    llm_anonymous: bool,
+    concurrent: bool | None,
+    summary_after: int | None,
+):
+    if concurrent is None:
+        concurrent = CONCURRENT_PROVIDERS
+    if summary_after is None:
+        summary_after = SUMMARY_AFTER
+    progressive = 0 < summary_after < len(models)
+
+    chat_title = None
+    if chat_session is None:  # Create new chat if needed
+        chat_title = _placeholder_title(prompt)
+    new_turn = _open_turn(prompt, chat_session, chat_title)
+    chat_session = new_turn.session_id
+    title = None
+    if chat_title is not None:
+        # Write the real title while the providers stream; the background
+        # update needs the new session committed.
+        db.session.commit()
+        title = _in_background(
+            _generate_title, title_model, prompt, chat_session, chat_title
+        )
+    # One history read per turn, shared by every provider and the summarizer
+    history = HISTORY_CACHE.load(chat_session, new_turn.id)
+    if concurrent or progressive or current_batch() is not None:
+        # Workers use their own sessions, so the turn must be visible to them;
+        # batched outputs are committed later and need their turn to exist.
+        db.session.commit()
+    if concurrent or progressive:
+        fan_out = _FanOut()
+        for model in models:
+            fan_out.submit(
+                model,
+                lambda m=model: MODEL_PROVIDERS[m].query(
+                    prompt, new_turn.id, chat_session, history=history
+                ),
+            )
+        stream = iter(fan_out)
+    else:
+        stream = _stream_sequentially(
+            models, prompt, new_turn.id, chat_session, history
+        )
+
+    parts: dict[str, list[str]] = {model: [] for model in models}
+    parts["summarizer"] = []
+    finished: list[str] = []
+    draft_models: list[str] = []
+    for channel, chunk in stream:
+        if chunk is not None:
+            parts[channel].append(chunk)
+            # Expose summarizer output with a fixed provider name so callers
+            # can easily differentiate it from model outputs
+            yield {"provider": channel, "chunk": chunk}
+            if title is not None and title.done():
+                yield from _title_events(title, chat_session)
+                title = None
+            continue
+        if channel == "summarizer":
+            continue
+        finished.append(channel)
+        if progressive and not draft_models and len(finished) >= summary_after:
+            # Fold the responses we have so far into an early summary
+            draft_models = list(finished)
+            draft_prompt = _summary_prompt(
+                prompt,
+                models,
+                {m: "".join(parts[m]) for m in draft_models},
+                llm_anonymous,
+            )
+            fan_out.submit(
+                "summarizer",
+                lambda: metrics.timed(
+                    MODEL_PROVIDERS[summary_model].query(
+                        draft_prompt,
+                        new_turn.id,
+                        chat_session,
+                        is_summarizing=True,
+                        history=history,
+                    ),
+                    metrics.SUMMARIZER.labels("draft"),
+                ),
+            )
+    results: dict[str, str] = {model: "".join(parts[model]) for model in models}
+
+    if not draft_models:
+        summary_prompt = _summary_prompt(prompt, models, results, llm_anonymous)
+        summary_stream = metrics.timed(
+            MODEL_PROVIDERS[summary_model].query(
+                summary_prompt, new_turn.id, chat_session, is_summarizing=True, history=history
+            ),
+            metrics.SUMMARIZER.labels("summary"),
+        )
+        for chunk in summary_stream:
+            parts["summarizer"].append(chunk)
+            yield {"provider": "summarizer", "chunk": chunk}
+            if title is not None and title.done():
+                yield from _title_events(title, chat_session)
+                title = None
+    elif len(draft_models) < len(models):
+        # Stragglers landed after the draft started: append what they add
+        late = [m for m in models if m not in draft_models]
+        addendum_prompt = _addendum_prompt(
+            prompt, models, late, results, "".join(parts["summarizer"]), llm_anonymous
+        )
+        addendum_stream = metrics.timed(
+            MODEL_PROVIDERS[summary_model].query(
+                addendum_prompt, new_turn.id, chat_session, is_summarizing=True, history=history
+            ),
+            metrics.SUMMARIZER.labels("addendum"),
+        )
+        separator = "\n\n"
+        parts["summarizer"].append(separator)
+        yield {"provider": "summarizer", "chunk": separator}
+        for chunk in addendum_stream:
+            parts["summarizer"].append(chunk)
+            yield {"provider": "summarizer", "chunk": chunk}
+        _merge_summarizer_outputs(
+            new_turn.id, summary_model, "".join(parts["summarizer"]).strip()
+        )
+    summary = "".join(parts["summarizer"])
     results["summarizer"] = summary
+    _complete_turn(new_turn.id)
+    yield from _title_events(title, chat_session, wait=TITLE_WAIT)
+    _finish_turn(
+        chat_session,
+        history,
+        _history_turn(
+            new_turn.id,
+            prompt,
+            models,
+            results,
+            summary_model,
+            draft_prompt if draft_models else summary_prompt,
+        ),
+    )
 
     return {
         "prompt": prompt,
@@ -109,3 +570,241 @@ LLM responses:\n\n
         "turn_id": new_turn.id,
         "created_at": new_turn.created_at.isoformat(),
     }
+
+
+def _open_turn_committed(
+    prompt: str, chat_session: int | None, chat_title: str | None
+) -> tuple[int, int, str]:
+    new_turn = _open_turn(prompt, chat_session, chat_title)
+    db.session.commit()
+    return new_turn.session_id, new_turn.id, new_turn.created_at.isoformat()
+
+
+async def asummarize(
+    prompt: str,
+    models: list[str],
+    chat_session: int | None = None,
+    summary_model: str = "gemini",
+    title_model: str = "gemini",
+    llm_anonymous: bool = True,
+    summary_after: int | None = None,
+    write_behind: bool | None = None,
+):
+    """Async counterpart of :func:`summarize` for the ASGI entry point.
+
+    Providers are streamed concurrently on the event loop through
+    ``LLMProvider.aquery``, each in its own app context; blocking DB work runs
+    on worker threads.  Chunk dictionaries are yielded as in ``summarize``.
+    Async generators cannot return a value, so the final metadata is yielded
+    last, wrapped as ``{"final": {...}}``.
+    """
+    if write_behind is None:
+        write_behind = WRITE_BEHIND
+    args = (
+        prompt,
+        models,
+        chat_session,
+        summary_model,
+        title_model,
+        llm_anonymous,
+        summary_after,
+    )
+    # Each ASGI request runs in its own task context, so the batch cannot
+    # leak into other requests; provider tasks and threads inherit it.
+    batch = open_batch() if write_behind else None
+    try:
+        async with contextlib.aclosing(_asummarize(*args)) as events:
+            async for event in events:
+                yield event
+    except BaseException:
+        if batch is not None:
+            # Client gone or turn failed: keep what finished providers wrote
+            await run_in_session(flush, batch)
+        raise
+    finally:
+        if batch is not None:
+            close_batch()
+
+
+async def _asummarize(
+    prompt: str,
+    models: list[str],
+    chat_session: int | None,
+    summary_model: str,
+    title_model: str,
+    llm_anonymous: bool,
+    summary_after: int | None,
+):
+    if summary_after is None:
+        summary_after = SUMMARY_AFTER
+    progressive = 0 < summary_after < len(models)
+    app = current_app._get_current_object()  # type: ignore[attr-defined]
+    user_id = g.get("user_id")
+
+    chat_title = None
+    if chat_session is None:  # Create new chat if needed
+        chat_title = _placeholder_title(prompt)
+    chat_session, turn_id, created_at = await run_in_session(
+        _open_turn_committed, prompt, chat_session, chat_title
+    )
+    title: asyncio.Task | None = None
+    if chat_title is not None:
+
+        async def make_title():
+            try:
+                with app.app_context():
+                    return await run_in_session(
+                        _generate_title, title_model, prompt, chat_session, chat_title
+                    )
+            except Exception:
+                logger.exception("Background _generate_title failed")
+                return None
+
+        title = asyncio.create_task(make_title())
+
+    def title_events():
+        nonlocal title
+        if title is None or not title.done():
+            return []
+        result, title = title.result(), None
+        return [{"title": result, "session_id": chat_session}] if result else []
+
+    history = await run_in_session(HISTORY_CACHE.load, chat_session, turn_id)
+
+    events: asyncio.Queue = asyncio.Queue()
+    tasks: list[asyncio.Task] = []
+
+    async def drain(channel: str, start: Callable[[], AsyncIterator[str]]):
+        try:
+            with app.app_context():
+                g.user_id = user_id
+                async for chunk in start():
+                    await events.put((channel, chunk))
+        except Exception as exc:
+            await events.put((channel, exc))
+        else:
+            await events.put((channel, None))
+
+    def submit(channel: str, start: Callable[[], AsyncIterator[str]]):
+        tasks.append(asyncio.create_task(drain(channel, start)))
+
+    for model in models:
+        submit(
+            model,
+            lambda m=model: MODEL_PROVIDERS[m].aquery(
+                prompt, turn_id, chat_session, history=history
+            ),
+        )
+
+    parts: dict[str, list[str]] = {model: [] for model in models}
+    parts["summarizer"] = []
+    finished: list[str] = []
+    draft_models: list[str] = []
+    try:
+        pending = len(tasks)
+        while pending:
+            channel, chunk = await events.get()
+            if isinstance(chunk, BaseException):
+                raise chunk
+            if chunk is not None:
+                parts[channel].append(chunk)
+                yield {"provider": channel, "chunk": chunk}
+                for event in title_events():
+                    yield event
+                continue
+            pending -= 1
+            if channel == "summarizer":
+                continue
+            finished.append(channel)
+            if progressive and not draft_models and len(finished) >= summary_after:
+                draft_models = list(finished)
+                draft_prompt = _summary_prompt(
+                    prompt,
+                    models,
+                    {m: "".join(parts[m]) for m in draft_models},
+                    llm_anonymous,
+                )
+                submit(
+                    "summarizer",
+                    lambda: metrics.atimed(
+                        MODEL_PROVIDERS[summary_model].aquery(
+                            draft_prompt,
+                            turn_id,
+                            chat_session,
+                            is_summarizing=True,
+                            history=history,
+                        ),
+                        metrics.SUMMARIZER.labels("draft"),
+                    ),
+                )
+                pending += 1
+    finally:
+        for task in tasks:
+            task.cancel()
+    results: dict[str, str] = {model: "".join(parts[model]) for model in models}
+
+    if not draft_models:
+        summary_prompt = _summary_prompt(prompt, models, results, llm_anonymous)
+        async for chunk in metrics.atimed(
+            MODEL_PROVIDERS[summary_model].aquery(
+                summary_prompt, turn_id, chat_session, is_summarizing=True, history=history
+            ),
+            metrics.SUMMARIZER.labels("summary"),
+        ):
+            parts["summarizer"].append(chunk)
+            yield {"provider": "summarizer", "chunk": chunk}
+            for event in title_events():
+                yield event
+    elif len(draft_models) < len(models):
+        late = [m for m in models if m not in draft_models]
+        addendum_prompt = _addendum_prompt(
+            prompt, models, late, results, "".join(parts["summarizer"]), llm_anonymous
+        )
+        separator = "\n\n"
+        parts["summarizer"].append(separator)
+        yield {"provider": "summarizer", "chunk": separator}
+        async for chunk in metrics.atimed(
+            MODEL_PROVIDERS[summary_model].aquery(
+                addendum_prompt, turn_id, chat_session, is_summarizing=True, history=history
+            ),
+            metrics.SUMMARIZER.labels("addendum"),
+        ):
+            parts["summarizer"].append(chunk)
+            yield {"provider": "summarizer", "chunk": chunk}
+        await run_in_session(
+            _merge_summarizer_outputs,
+            turn_id,
+            summary_model,
+            "".join(parts["summarizer"]).strip(),
+        )
+    results["summarizer"] = "".join(parts["summarizer"])
+    await run_in_session(_complete_turn, turn_id)
+    if title is not None:
+        await asyncio.wait({title}, timeout=TITLE_WAIT)
+        for event in title_events():
+            yield event
+    batch = current_batch()
+    if batch is not None:
+        await run_in_session(_flush_batch, batch)
+    _finish_turn(
+        chat_session,
+        history,
+        _history_turn(
+            turn_id,
+            prompt,
+            models,
+            results,
+            summary_model,
+            draft_prompt if draft_models else summary_prompt,
+        ),
+    )
+
+    yield {
+        "final": {
+            "prompt": prompt,
+            "results": results,
+            "session_id": chat_session,
+            "turn_id": turn_id,
+            "created_at": created_at,
+        }
+    }
@@ -1,23 +1,33 @@
 from abc import ABC, abstractmethod
+import asyncio
 import logging
-from typing import Iterator
+import sys
+from typing import AsyncIterator, Callable, Iterator
 
 # --- Retry utility imports for LLM APIs ---
 from tenacity import (
     retry,
     stop_after_attempt,
     wait_exponential_jitter,
+    stop_any,
     retry_if_exception,
     before_sleep_log,
 )
-from openai import APIStatusError, APIConnectionError, RateLimitError, APITimeoutError
 import requests
 
+from db import db
+from core.providers.history import ChatHistory
+from core.providers.models import LLMOutput
+from core.providers.write_behind import current_batch
+
 logger = logging.getLogger(__name__)
 
 
 class LLMProvider(ABC):
 
+    # Upstream origin, contacted by the boot-time connection warm-up
+    base_url: str | None = None
+
     # SUMMARIZE_MESSAGE = "Compare and summarize the following outputs by different LLMs."
     # "You are a fact-checking assistant. Reply with 'Supported', 'Not Supported', or 'Uncertain', followed by a short explanation on a new line."
 
@@ -29,43 +39,146 @@ class LLMProvider(ABC):
         chat_session: int,
         is_summarizing: bool = False,
         system_message="",
+        history: ChatHistory | None = None,
     ) -> Iterator[str]:
         """Stream chunks of model output.
 
         Implementations should yield partial strings as they arrive from the
         upstream model.  The caller is responsible for consuming the generator
         and concatenating the chunks into the final response.
+
+        ``history`` is the session's prior turns as loaded once by the
+        pipeline; providers load it themselves when it is not given.
         """
         pass
 
+    async def aquery(
+        self,
+        prompt: str,
+        chat_turn: int,
+        chat_session: int,
+        is_summarizing: bool = False,
+        system_message="",
+        history: ChatHistory | None = None,
+    ) -> AsyncIterator[str]:
+        """Async counterpart of :meth:`query`.
+
+        The default drives the blocking ``query`` generator from worker
+        threads; providers with an async SDK client override this to stream
+        on the event loop instead.
+        """
+        stream = self.query(
+            prompt, chat_turn, chat_session, is_summarizing, system_message, history
+        )
+        done = object()
+        while True:
+            chunk = await asyncio.to_thread(next, stream, done)
+            if chunk is done:
+                break
+            yield chunk
+
+
+def persist_output(
+    provider: str, chat_turn: int, prompt: str, is_summarizing: bool, content: str
+) -> None:
+    """Store a provider's finished response for ``chat_turn``.
+
+    Inside a write-behind batch the row is only queued; the pipeline commits
+    the whole batch at the end of the turn.
+    """
+    batch = current_batch()
+    if batch is not None:
+        batch.add(provider, chat_turn, prompt, is_summarizing, content)
+        return
+    llm_output = LLMOutput(
+        turn_id=chat_turn,  # type: ignore
+        provider=provider,  # type: ignore
+        summarizer_prompt=prompt if is_summarizing else None,  # type: ignore
+        content=content,  # type: ignore
+    )
+    db.session.add(llm_output)
+    db.session.commit()
+
+
+async def run_in_session(fn, *args, **kwargs):
+    """Run blocking DB work on a worker thread, then release its connection.
+
+    The worker inherits the caller's app context (and thus its scoped
+    ``db.session``).  Closing the session afterwards hands the pooled
+    connection back while the caller awaits a long upstream stream.
+    """
+
+    def call():
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            db.session.close()
+
+    return await asyncio.to_thread(call)
+
 
 # --- Shared retry policy for LLM API clients ---
 
-_RETRYABLE_HTTP = {408, 429, 500, 502, 503, 504}
+# 529: Anthropic "overloaded"
+_RETRYABLE_HTTP = {408, 429, 500, 502, 503, 504, 529}
 
 
 def is_retryable_llm(exc: BaseException) -> bool:
-    """Classify transient errors for LLM providers (OpenAI-compatible or raw HTTP)."""
+    """Classify transient errors for LLM providers (OpenAI/Anthropic/Gemini SDKs or raw HTTP)."""
     # Raw HTTP clients
     if isinstance(exc, (requests.Timeout, requests.ConnectionError)):
         return True
-    # OpenAI-compatible SDK
-    if isinstance(exc, (APIConnectionError, APITimeoutError)):
-        return True
-    if isinstance(exc, RateLimitError):
+    httpx = sys.modules.get("httpx")
+    if httpx is not None and isinstance(exc, httpx.TransportError):
         return True
-    if isinstance(exc, APIStatusError):
-        status = getattr(exc, "status_code", None)
-        return status in _RETRYABLE_HTTP
+    # Gemini reports every HTTP error as an APIError carrying the status
+    genai_errors = sys.modules.get("google.genai.errors")
+    if genai_errors is not None and isinstance(exc, genai_errors.APIError):
+        return exc.code in _RETRYABLE_HTTP
+    # The SDKs share their error hierarchy.  They are not imported here: the
+    # registry loads each with the first provider that needs it, and until
+    # then no error can come from it.
+    for name in ("openai", "anthropic"):
+        sdk = sys.modules.get(name)
+        if sdk is None:
+            continue
+        if isinstance(exc, (sdk.APIConnectionError, sdk.APITimeoutError)):
+            return True
+        if isinstance(exc, sdk.RateLimitError):
+            return True
+        if isinstance(exc, sdk.APIStatusError):
+            status = getattr(exc, "status_code", None)
+            return status in _RETRYABLE_HTTP
     return False
 
 
-def llm_retry(max_attempts: int = 3, initial: float = 0.5, max_wait: float = 2.5):
-    """Decorator factory for a standard retry policy across LLM providers."""
+def llm_retry(
+    max_attempts: int = 3,
+    initial: float = 0.5,
+    max_wait: float = 2.5,
+    give_up: Callable[[], bool] | None = None,
+    on_retry: Callable[[BaseException], None] | None = None,
+):
+    """Decorator factory for a standard retry policy across LLM providers.
+
+    ``give_up`` is checked after each failed attempt; once it returns true
+    (e.g. the provider's circuit opened) the last error is raised at once.
+    ``on_retry`` sees the error of every attempt that is about to be retried.
+    """
+    stop = stop_after_attempt(max_attempts)
+    if give_up is not None:
+        stop = stop_any(stop, lambda retry_state: give_up())
+    log = before_sleep_log(logger, logging.WARNING)  # log every retry
+
+    def before_sleep(retry_state):
+        if on_retry is not None:
+            on_retry(retry_state.outcome.exception())
+        log(retry_state)
+
     return retry(
         retry=retry_if_exception(is_retryable_llm),
         wait=wait_exponential_jitter(initial=initial, max=max_wait),
-        stop=stop_after_attempt(max_attempts),
+        stop=stop,
         reraise=True,
-        before_sleep=before_sleep_log(logger, logging.WARNING),  # log every retry
+        before_sleep=before_sleep,
     )
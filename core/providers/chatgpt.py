@@ -1,15 +1,113 @@
-from openai import OpenAI
-from core.providers.base import LLMProvider
+from core.providers.base import LLMProvider, persist_output, run_in_session
+from openai import AsyncOpenAI, OpenAI
 import os
 
-# [ ] Not implemented
+from core.config import env_int
+from core.providers.context import estimate_tokens, fit_history
+from core.providers.history import HISTORY_CACHE, ChatHistory
+from core.providers.normalize import anormalize_stream, normalize_stream
+from core.providers.prompt_cache import PromptCacheStats
+from core.providers.resilience import aguarded_stream, guarded_retry, guarded_stream
+from core.providers.response_cache import acached_stream, cached_stream, response_key
+from core.providers.similarity_cache import asimilar_stream, similar_stream
+from core.providers.transport import async_http_client, http_client, timeout
+
+MODEL = "gpt-4o-mini"
+
+
+def _format_turn(user_text: str, content: str | None) -> list[dict]:
+    messages = [{"role": "user", "content": user_text}]
+    if content:
+        messages.append({"role": "assistant", "content": content})
+    return messages
+
+
 class ChatGPTProvider(LLMProvider):
+
+    base_url = "https://api.openai.com"
+
     def __init__(self):
         api_key = os.environ.get("CHATGPT_API_KEY")
         if not api_key:
             raise ValueError("CHATGPT_API_KEY value not set in environment variables")
+        self.client = OpenAI(api_key=api_key, http_client=http_client(), timeout=timeout())
+        self.aclient = AsyncOpenAI(
+            api_key=api_key, http_client=async_http_client(), timeout=timeout()
+        )
+        # History budget per request (current prompt excluded)
+        self.context_tokens = env_int("SUMLIME_CHATGPT_CONTEXT_TOKENS", 64000)
+        self.cache_stats = PromptCacheStats("chatgpt")
+
+    @guarded_retry("chatgpt")
+    def _create_response(self, *, messages: list[dict]):
+        """Return a streaming Responses API handle."""
+        return self.client.responses.create(model=MODEL, input=messages, stream=True)  # type: ignore
+
+    @guarded_retry("chatgpt")
+    async def _acreate_response(self, *, messages: list[dict]):
+        """Async variant of :meth:`_create_response`."""
+        return await self.aclient.responses.create(
+            model=MODEL, input=messages, stream=True  # type: ignore
+        )
+
+    def _build_messages(
+        self,
+        prompt: str,
+        chat_turn: int,
+        chat_session: int,
+        is_summarizing: bool,
+        system_message: str,
+        history: ChatHistory | None,
+    ) -> list[dict]:
+        """
+        Build provider-specific chat history, as for DeepSeek:
+          - If is_summarizing: each turn's summarizer_prompt as the 'user' text and
+            the ChatGPT output whose summarizer_prompt is NOT NULL as the 'assistant'.
+          - Else: turn.prompt as the 'user' text and the ChatGPT output with
+            summarizer_prompt IS NULL.
+        """
+        messages = []
+        if system_message:
+            messages.append({"role": "system", "content": system_message})
+
+        # Prior turns (oldest→newest) from the shared snapshot, within budget
+        if history is None:
+            history = HISTORY_CACHE.load(chat_session, chat_turn)
+        budget = self.context_tokens - estimate_tokens(system_message)
+        messages.extend(
+            fit_history(history, "chatgpt", is_summarizing, _format_turn, budget)
+        )
+
+        # Current user message
+        messages.append({"role": "user", "content": prompt})
+
+        return messages
 
-        self.client = OpenAI(api_key=api_key)
+    def _record_usage(self, event) -> None:
+        if event.type != "response.completed":
+            return
+        usage = getattr(event.response, "usage", None)
+        if usage is not None:
+            details = getattr(usage, "input_tokens_details", None)
+            self.cache_stats.record(
+                usage.input_tokens, getattr(details, "cached_tokens", None)
+            )
+
+    def _stream_text(self, messages: list[dict]):
+        """Stream text deltas from the Responses API."""
+        stream = self._create_response(messages=messages)
+        for event in stream:
+            self._record_usage(event)
+            if event.type == "response.output_text.delta" and event.delta:
+                yield event.delta
+
+    async def _astream_text(self, messages: list[dict]):
+        """Async variant of :meth:`_stream_text`."""
+        stream = await self._acreate_response(messages=messages)
+        async for event in stream:
+            self._record_usage(event)
+            if event.type == "response.output_text.delta" and event.delta:
+                yield event.delta
 
     def query(
         self,
@@ -18,17 +116,61 @@ class ChatGPTProvider(LLMProvider):
         chat_session: int,
         is_summarizing: bool = False,
         system_message="",
+        history: ChatHistory | None = None,
+    ):
+        messages = self._build_messages(
+            prompt, chat_turn, chat_session, is_summarizing, system_message, history
+        )
+
+        # Stream from OpenAI (or replay an identical request)
+        def produce():
+            stream = lambda: normalize_stream(
+                guarded_stream("chatgpt", lambda: self._stream_text(messages))
+            )
+            if is_summarizing or len(messages) > 1:
+                return stream()
+            # First turn without context: a near-duplicate's answer will do
+            return similar_stream(f"chatgpt:{MODEL}", prompt, stream)
+
+        key = response_key("chatgpt", MODEL, is_summarizing, messages)
+        text_parts: list[str] = []
+        for chunk_text in cached_stream(key, produce):
+            text_parts.append(chunk_text)
+            yield chunk_text
+
+        text = "".join(text_parts).strip()
+        persist_output("chatgpt", chat_turn, prompt, is_summarizing, text)
+
+    async def aquery(
+        self,
+        prompt: str,
+        chat_turn: int,
+        chat_session: int,
+        is_summarizing: bool = False,
+        system_message="",
+        history: ChatHistory | None = None,
     ):
-        messages = [
-            {"role": "system", "content": system_message},
-            {"role": "user", "content": prompt},
-        ]
-        with self.client.responses.stream(
-            model="gpt-4o-mini",
-            input=messages,
-        ) as stream:
-            for event in stream:
-                if event.type == "response.output_text.delta":
-                    if event.delta:
-                        yield event.delta
-            stream.get_final_response()
+        if history is None:
+            history = await run_in_session(HISTORY_CACHE.load, chat_session, chat_turn)
+        messages = self._build_messages(
+            prompt, chat_turn, chat_session, is_summarizing, system_message, history
+        )
+
+        def produce():
+            stream = lambda: anormalize_stream(
+                aguarded_stream("chatgpt", lambda: self._astream_text(messages))
+            )
+            if is_summarizing or len(messages) > 1:
+                return stream()
+            return asimilar_stream(f"chatgpt:{MODEL}", prompt, stream)
+
+        key = response_key("chatgpt", MODEL, is_summarizing, messages)
+        text_parts: list[str] = []
+        async for chunk_text in acached_stream(key, produce):
+            text_parts.append(chunk_text)
+            yield chunk_text
+
+        text = "".join(text_parts).strip()
+        await run_in_session(
+            persist_output, "chatgpt", chat_turn, prompt, is_summarizing, text
+        )
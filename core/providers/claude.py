@@ -1,15 +1,142 @@
-from anthropic import Anthropic
-from core.providers.base import LLMProvider
+from anthropic import Anthropic, AsyncAnthropic
+from core.providers.base import LLMProvider, persist_output, run_in_session
 import os
 
-# [ ] Not implemented
+from core.config import env_int
+from core.providers.context import estimate_tokens, fit_history
+from core.providers.history import HISTORY_CACHE, ChatHistory
+from core.providers.normalize import anormalize_stream, normalize_stream
+from core.providers.prompt_cache import PromptCacheStats
+from core.providers.resilience import aguarded_stream, guarded_retry, guarded_stream
+from core.providers.response_cache import acached_stream, cached_stream, response_key
+from core.providers.similarity_cache import asimilar_stream, similar_stream
+from core.providers.transport import async_http_client, http_client, timeout
+
+MODEL = "claude-3-haiku-20240307"
+
+
+def _format_turn(user_text: str, content: str | None) -> list[dict]:
+    messages = [{"role": "user", "content": user_text}]
+    if content:
+        messages.append({"role": "assistant", "content": content})
+    return messages
+
+
+def _alternate(messages: list[dict]) -> list[dict]:
+    """Merge consecutive same-role messages; Anthropic requires alternation.
+
+    They occur after unanswered turns and after the rolling summary.
+    """
+    merged: list[dict] = []
+    for message in messages:
+        if merged and merged[-1]["role"] == message["role"]:
+            merged[-1] = {
+                "role": message["role"],
+                "content": f"{merged[-1]['content']}\n\n{message['content']}",
+            }
+        else:
+            merged.append(message)
+    return merged
+
+
 class ClaudeProvider(LLMProvider):
+
+    base_url = "https://api.anthropic.com"
+
     def __init__(self):
         api_key = os.environ.get("CLAUDE_API_KEY")
         if not api_key:
             raise ValueError("CLAUDE_API_KEY value not set in environment variables")
+        self.client = Anthropic(api_key=api_key, http_client=http_client(), timeout=timeout())
+        self.aclient = AsyncAnthropic(
+            api_key=api_key, http_client=async_http_client(), timeout=timeout()
+        )
+        # History budget per request (current prompt excluded)
+        self.context_tokens = env_int("SUMLIME_CLAUDE_CONTEXT_TOKENS", 64000)
+        self.max_tokens = env_int("SUMLIME_CLAUDE_MAX_TOKENS", 1000)
+        self.cache_stats = PromptCacheStats("claude")
+
+    def _params(self, system_message: str, messages: list[dict]) -> dict:
+        params = {
+            "model": MODEL,
+            "max_tokens": self.max_tokens,
+            "temperature": 1,
+            "messages": messages,
+            "stream": True,
+        }
+        if system_message:
+            params["system"] = system_message
+        return params
+
+    @guarded_retry("claude")
+    def _create_message(self, *, system_message: str, messages: list[dict]):
+        """Return a streaming Messages API handle (raw server-sent events)."""
+        return self.client.messages.create(**self._params(system_message, messages))
+
+    @guarded_retry("claude")
+    async def _acreate_message(self, *, system_message: str, messages: list[dict]):
+        """Async variant of :meth:`_create_message`."""
+        return await self.aclient.messages.create(**self._params(system_message, messages))
+
+    def _build_messages(
+        self,
+        prompt: str,
+        chat_turn: int,
+        chat_session: int,
+        is_summarizing: bool,
+        history: ChatHistory | None,
+        system_message: str,
+    ) -> list[dict]:
+        """
+        Build provider-specific chat history, as for DeepSeek:
+          - If is_summarizing: each turn's summarizer_prompt as the 'user' text and
+            the Claude output whose summarizer_prompt is NOT NULL as the 'assistant'.
+          - Else: turn.prompt as the 'user' text and the Claude output with
+            summarizer_prompt IS NULL.
+        The system message travels separately (``system=``).
+        """
+        if history is None:
+            history = HISTORY_CACHE.load(chat_session, chat_turn)
+        budget = self.context_tokens - estimate_tokens(system_message)
+        messages = fit_history(history, "claude", is_summarizing, _format_turn, budget)
+
+        # Current user message
+        messages.append({"role": "user", "content": prompt})
+
+        return _alternate(messages)
 
-        self.client = Anthropic(api_key=api_key)
+    def _record_usage(self, event) -> None:
+        if event.type != "message_start":
+            return
+        usage = getattr(event.message, "usage", None)
+        if usage is not None:
+            # input_tokens excludes the tokens read from the prompt cache
+            cached = getattr(usage, "cache_read_input_tokens", None) or 0
+            self.cache_stats.record(usage.input_tokens + cached, cached)
+
+    @staticmethod
+    def _delta_text(event) -> str:
+        if event.type == "content_block_delta" and event.delta.type == "text_delta":
+            return event.delta.text
+        return ""
+
+    def _stream_text(self, system_message: str, messages: list[dict]):
+        """Stream text deltas from Claude."""
+        stream = self._create_message(system_message=system_message, messages=messages)
+        for event in stream:
+            self._record_usage(event)
+            text = self._delta_text(event)
+            if text:
+                yield text
+
+    async def _astream_text(self, system_message: str, messages: list[dict]):
+        """Async variant of :meth:`_stream_text`."""
+        stream = await self._acreate_message(system_message=system_message, messages=messages)
+        async for event in stream:
+            self._record_usage(event)
+            text = self._delta_text(event)
+            if text:
+                yield text
 
     def query(
         self,
@@ -18,19 +145,69 @@ class ClaudeProvider(LLMProvider):
         chat_session: int,
         is_summarizing: bool = False,
         system_message="",
+        history: ChatHistory | None = None,
     ):
-        message = [
-            {
-                "role": "user",
-                "content": [{"type": "text", "text": prompt}],
-            }
-        ]
-
-        response = self.client.messages.create(
-            model="claude-3-haiku-20240307",
-            max_tokens=1000,
-            temperature=1,
-            system=system_message,
-            messages=message,
+        messages = self._build_messages(
+            prompt, chat_turn, chat_session, is_summarizing, history, system_message
+        )
+
+        # Stream from Claude (or replay an identical request)
+        def produce():
+            stream = lambda: normalize_stream(
+                guarded_stream(
+                    "claude", lambda: self._stream_text(system_message, messages)
+                )
+            )
+            if is_summarizing or system_message or messages != [{"role": "user", "content": prompt}]:
+                return stream()
+            # First turn without context: a near-duplicate's answer will do
+            return similar_stream(f"claude:{MODEL}", prompt, stream)
+
+        key = response_key(
+            "claude", MODEL, is_summarizing, [{"system": system_message}, *messages]
+        )
+        text_parts: list[str] = []
+        for chunk_text in cached_stream(key, produce):
+            text_parts.append(chunk_text)
+            yield chunk_text
+
+        text = "".join(text_parts).strip()
+        persist_output("claude", chat_turn, prompt, is_summarizing, text)
+
+    async def aquery(
+        self,
+        prompt: str,
+        chat_turn: int,
+        chat_session: int,
+        is_summarizing: bool = False,
+        system_message="",
+        history: ChatHistory | None = None,
+    ):
+        if history is None:
+            history = await run_in_session(HISTORY_CACHE.load, chat_session, chat_turn)
+        messages = self._build_messages(
+            prompt, chat_turn, chat_session, is_summarizing, history, system_message
+        )
+
+        def produce():
+            stream = lambda: anormalize_stream(
+                aguarded_stream(
+                    "claude", lambda: self._astream_text(system_message, messages)
+                )
+            )
+            if is_summarizing or system_message or messages != [{"role": "user", "content": prompt}]:
+                return stream()
+            return asimilar_stream(f"claude:{MODEL}", prompt, stream)
+
+        key = response_key(
+            "claude", MODEL, is_summarizing, [{"system": system_message}, *messages]
+        )
+        text_parts: list[str] = []
+        async for chunk_text in acached_stream(key, produce):
+            text_parts.append(chunk_text)
+            yield chunk_text
+
+        text = "".join(text_parts).strip()
+        await run_in_session(
+            persist_output, "claude", chat_turn, prompt, is_summarizing, text
         )
-        yield getattr(response, "content", "")
@@ -0,0 +1,158 @@
+"""Token budgeting and rolling compaction of chat history.
+
+Providers send at most ``context_tokens`` worth of history: the newest turns
+that fit, preceded by the session's rolling summary when one exists.  The
+budget excludes the current prompt, so the window only moves when history
+itself overflows.  With compaction enabled the pipeline periodically folds
+older turns into that summary (stored on ``ChatSession``), so history size
+stays flat however long a chat runs.
+"""
+
+import logging
+import math
+import os
+from typing import Callable
+
+from db import db
+from core.config import env_bool, env_float, env_int
+from core.providers.history import HISTORY_CACHE, ChatHistory, FormatTurn, HistoryTurn
+from core.providers.models import ChatSession
+
+logger = logging.getLogger(__name__)
+
+COMPACTION_ENABLED = env_bool("SUMLIME_HISTORY_COMPACTION", False)
+# Compact once the un-summarized history grows past this many tokens...
+COMPACT_AFTER_TOKENS = env_int("SUMLIME_COMPACT_AFTER_TOKENS", 8000)
+# ...keeping this many of the newest turns verbatim.
+COMPACT_KEEP_TURNS = env_int("SUMLIME_COMPACT_KEEP_TURNS", 4)
+# Provider (MODEL_PROVIDERS key) that writes the summaries
+COMPACTION_MODEL = os.environ.get("SUMLIME_COMPACTION_MODEL", "gemini")
+
+# Once history overflows its budget, trim it to this fraction of the budget
+HISTORY_LOW_WATER = env_float("SUMLIME_HISTORY_LOW_WATER", 0.5)
+
+SUMMARY_PREFIX = "Summary of our earlier conversation:\n"
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local token estimate.
+
+    Roughly four ASCII characters per token; other characters (CJK, emoji,
+    accented text) are counted as a token each, which errs on the safe side.
+    """
+    if not text:
+        return 0
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    return math.ceil(ascii_chars / 4) + (len(text) - ascii_chars)
+
+
+def _turn_tokens(turn: HistoryTurn) -> int:
+    return estimate_tokens(turn.prompt) + sum(
+        estimate_tokens(o.content) for o in turn.outputs
+    )
+
+
+def _item_tokens(item: dict) -> int:
+    # OpenAI-style {"content": str} or Gemini-style {"parts": [{"text": str}]}
+    if "content" in item:
+        return estimate_tokens(item["content"])
+    return sum(estimate_tokens(p.get("text", "")) for p in item.get("parts", []))
+
+
+def window_turns(
+    history: ChatHistory,
+    provider: str,
+    is_summarizing: bool,
+    format_turn: FormatTurn,
+    budget: int,
+) -> tuple[list[dict], list[list[dict]]]:
+    """Project ``history`` for ``provider`` within ``budget`` tokens.
+
+    Returns the rolling-summary items (if any) and the kept turns' items,
+    oldest first.  Whole turns are dropped oldest-first, and whenever the
+    window overflows it is cut down to ``HISTORY_LOW_WATER`` of the budget.
+    The start of the window therefore stays put for many turns, which keeps
+    the request prefix byte-stable for upstream prompt caches.
+    """
+    head: list[dict] = []
+    if history.summary:
+        head = format_turn(SUMMARY_PREFIX + history.summary, None)
+        budget -= estimate_tokens(history.summary)
+
+    projected = [
+        ChatHistory((turn,)).project(provider, is_summarizing, format_turn)
+        for turn in history.turns
+    ]
+    costs = [sum(_item_tokens(item) for item in items) for items in projected]
+    start, used = 0, 0
+    for i, cost in enumerate(costs):
+        used += cost
+        if used > budget:
+            while start <= i and used > budget * HISTORY_LOW_WATER:
+                used -= costs[start]
+                start += 1
+    return head, projected[start:]
+
+
+def fit_history(
+    history: ChatHistory,
+    provider: str,
+    is_summarizing: bool,
+    format_turn: FormatTurn,
+    budget: int,
+) -> list[dict]:
+    """Flat wire-format history from :func:`window_turns`."""
+    head, turns = window_turns(history, provider, is_summarizing, format_turn, budget)
+    for items in turns:
+        head.extend(items)
+    return head
+
+
+def _transcript(history: ChatHistory, turns: list[HistoryTurn]) -> str:
+    lines: list[str] = []
+    if history.summary:
+        lines.append(f"Earlier summary:\n{history.summary}\n")
+    for turn in turns:
+        # The summarizer's answer is what the user actually read
+        answer = next(
+            (o.content for o in turn.outputs if o.summarizer_prompt is not None),
+            turn.outputs[0].content if turn.outputs else "",
+        )
+        lines.append(f"User: {turn.prompt}\nAssistant: {answer}\n")
+    return "\n".join(lines)
+
+
+def maybe_compact(
+    chat_session: int,
+    history: ChatHistory,
+    summarize_history: Callable[[str], str],
+) -> None:
+    """Fold older turns into the session's rolling summary if it has grown.
+
+    ``history`` should include the turn that just finished.  Turns beyond
+    the newest ``COMPACT_KEEP_TURNS`` are summarized together with the
+    previous summary; the result is stored on the session and in
+    ``HISTORY_CACHE``.
+    """
+    if sum(_turn_tokens(t) for t in history.turns) <= COMPACT_AFTER_TOKENS:
+        return
+    old = list(history.turns[: max(len(history.turns) - COMPACT_KEEP_TURNS, 0)])
+    if not old:
+        return
+
+    summary = summarize_history(_transcript(history, old)).strip()
+    if not summary:
+        return
+    upto = old[-1].id
+    updated = db.session.execute(
+        db.update(ChatSession)
+        .where(
+            ChatSession.id == chat_session,
+            db.func.coalesce(ChatSession.history_summary_turn_id, 0) < upto,
+        )
+        .values(history_summary=summary, history_summary_turn_id=upto)
+    )
+    db.session.commit()
+    if updated.rowcount:  # type: ignore[attr-defined]
+        HISTORY_CACHE.compact(chat_session, summary, upto)
+        logger.info("Compacted session %s up to turn %s", chat_session, upto)
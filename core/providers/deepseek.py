@@ -1,36 +1,81 @@
-from core.providers.base import LLMProvider, llm_retry
-from openai import OpenAI
+from core.providers.base import LLMProvider, persist_output, run_in_session
+from openai import AsyncOpenAI, OpenAI
 import os
 
-from db import db
-from core.providers.models import ChatTurn, LLMOutput
+from core.config import env_int
+from core.providers.context import estimate_tokens, fit_history
+from core.providers.history import HISTORY_CACHE, ChatHistory
+from core.providers.normalize import anormalize_stream, normalize_stream
+from core.providers.prompt_cache import PromptCacheStats
+from core.providers.resilience import aguarded_stream, guarded_retry, guarded_stream
+from core.providers.response_cache import acached_stream, cached_stream, response_key
+from core.providers.similarity_cache import asimilar_stream, similar_stream
+from core.providers.transport import async_http_client, http_client, timeout
+
+MODEL = "deepseek-chat"
+# Point at another OpenAI-compatible endpoint, e.g. bench/mock_upstream.py
+BASE_URL = os.environ.get("DEEPSEEK_BASE_URL", "https://api.deepseek.com")
+
+
+def _format_turn(user_text: str, content: str | None) -> list[dict]:
+    messages = [{"role": "user", "content": user_text}]
+    if content:
+        messages.append({"role": "assistant", "content": content})
+    return messages
 
 
 class DeepSeekProvider(LLMProvider):
 
+    base_url = BASE_URL
+
     def __init__(self):
         api_key = os.environ.get("DEEPSEEK_API_KEY")
         if not api_key:
             raise ValueError("DEEPSEEK_API_KEY not set in environment variables")
-        self.client = OpenAI(api_key=api_key, base_url="https://api.deepseek.com")
+        self.client = OpenAI(
+            api_key=api_key, base_url=BASE_URL, http_client=http_client(), timeout=timeout()
+        )
+        self.aclient = AsyncOpenAI(
+            api_key=api_key,
+            base_url=BASE_URL,
+            http_client=async_http_client(),
+            timeout=timeout(),
+        )
+        # History budget per request (current prompt excluded)
+        self.context_tokens = env_int("SUMLIME_DEEPSEEK_CONTEXT_TOKENS", 32000)
+        self.cache_stats = PromptCacheStats("deepseek")
 
-    @llm_retry()
+    @guarded_retry("deepseek")
     def _create_chat_completion(self, *, messages: list[dict]):
         """Return a streaming chat completion handle."""
         return self.client.chat.completions.create(
-            model="deepseek-chat",
+            model=MODEL,
             messages=messages,  # type: ignore
             stream=True,
+            # Final chunk carries usage, incl. prompt_cache_hit_tokens
+            stream_options={"include_usage": True},
         )
 
-    def query(
+    @guarded_retry("deepseek")
+    async def _acreate_chat_completion(self, *, messages: list[dict]):
+        """Async variant of :meth:`_create_chat_completion`."""
+        return await self.aclient.chat.completions.create(
+            model=MODEL,
+            messages=messages,  # type: ignore
+            stream=True,
+            # Final chunk carries usage, incl. prompt_cache_hit_tokens
+            stream_options={"include_usage": True},
+        )
+
+    def _build_messages(
         self,
         prompt: str,
         chat_turn: int,
         chat_session: int,
-        is_summarizing: bool = False,
-        system_message="",
-    ):
+        is_summarizing: bool,
+        system_message: str,
+        history: ChatHistory | None,
+    ) -> list[dict]:
         """
         Build provider-specific chat history:
           - If is_summarizing: use each turn's summarizer_prompt (if present) as the 'user' text,
@@ -42,103 +87,109 @@ class DeepSeekProvider(LLMProvider):
         if system_message:
             messages.append({"role": "system", "content": system_message})
 
-        # 1) Prior turns (oldest→newest), exclude current turn in SQL
-        prev_turns = (
-            db.session.execute(
-                db.select(ChatTurn)
-                .filter(ChatTurn.session_id == chat_session, ChatTurn.id != chat_turn)
-                .order_by(ChatTurn.created_at.asc(), ChatTurn.id.asc())
-            )
-            .scalars()
-            .all()
+        # Prior turns (oldest→newest) from the shared snapshot, within budget.
+        # The window only moves on overflow, so the prefix up to the current
+        # prompt stays byte-identical and DeepSeek's prefix cache keeps hitting.
+        if history is None:
+            history = HISTORY_CACHE.load(chat_session, chat_turn)
+        budget = self.context_tokens - estimate_tokens(system_message)
+        messages.extend(
+            fit_history(history, "deepseek", is_summarizing, _format_turn, budget)
         )
 
-        prev_turn_ids = [t.id for t in prev_turns]
-        if not prev_turn_ids:
-            prev_turn_ids = [-1]  # keep IN() valid but return 0 rows
-
-        # 2) Fetch the (single) DeepSeek output per turn (no ORDER BY needed)
-        outputs_by_turn = {
-            o.turn_id: o
-            for o in db.session.execute(
-                db.select(LLMOutput).filter(
-                    LLMOutput.turn_id.in_(prev_turn_ids),
-                    LLMOutput.provider == "deepseek",
-                )
-            )
-            .scalars()
-            .all()
-        }
-
-        # 3) Build chat history
-        for turn in prev_turns:
-            o = outputs_by_turn.get(turn.id)
-            if is_summarizing:
-                # Prefer summarizer_prompt if present;
-                # otherwise fall back to the original prompt
-                user_text = (
-                    o.summarizer_prompt if (o and o.summarizer_prompt) else turn.prompt
-                )
-            else:
-                user_text = turn.prompt
-
-            messages.append({"role": "user", "content": user_text})
-            if o and o.content:
-                messages.append({"role": "assistant", "content": o.content})
-
         # Current user message (caller passes the correct prompt for current mode)
         messages.append({"role": "user", "content": prompt})
 
-        # Sanitize latex
-        def sanitize_latex(text: str) -> str:
-            text = text.replace("\\(", "$")
-            text = text.replace("\\)", "$")
-            text = text.replace("\\[", "$$")
-            text = text.replace("\\]", "$$")
-            return text
+        return messages
+
+    def _record_usage(self, event) -> None:
+        usage = getattr(event, "usage", None)
+        if usage is not None:
+            # DeepSeek-specific fields, kept as extras by the OpenAI SDK
+            self.cache_stats.record(
+                usage.prompt_tokens, getattr(usage, "prompt_cache_hit_tokens", None)
+            )
 
-        # Call DeepSeek using SSE streaming
+    def _stream_text(self, messages: list[dict]):
+        """Stream text deltas from DeepSeek."""
         stream = self._create_chat_completion(messages=messages)
-        buffer = ""
-        sanitized_parts: list[str] = []
         for event in stream:
+            self._record_usage(event)
             # Incremental token
             if event.choices and event.choices[0].delta.content:
-                delta = event.choices[0].delta.content
-                buffer += delta
+                yield event.choices[0].delta.content
 
-                if buffer.endswith("\\"):
-                    emit = buffer[:-1]
-                    buffer = buffer[-1:]
-                else:
-                    emit = buffer
-                    buffer = ""
+    async def _astream_text(self, messages: list[dict]):
+        """Async variant of :meth:`_stream_text`."""
+        stream = await self._acreate_chat_completion(messages=messages)
+        async for event in stream:
+            self._record_usage(event)
+            if event.choices and event.choices[0].delta.content:
+                yield event.choices[0].delta.content
 
-                if emit:
-                    sanitized_emit = sanitize_latex(emit)
-                    sanitized_parts.append(sanitized_emit)
-                    yield sanitized_emit
+    def query(
+        self,
+        prompt: str,
+        chat_turn: int,
+        chat_session: int,
+        is_summarizing: bool = False,
+        system_message="",
+        history: ChatHistory | None = None,
+    ):
+        messages = self._build_messages(
+            prompt, chat_turn, chat_session, is_summarizing, system_message, history
+        )
 
-        if buffer:
-            sanitized_emit = sanitize_latex(buffer)
-            sanitized_parts.append(sanitized_emit)
-            yield sanitized_emit
+        # Call DeepSeek using SSE streaming (or replay an identical request)
+        def produce():
+            stream = lambda: normalize_stream(
+                guarded_stream("deepseek", lambda: self._stream_text(messages))
+            )
+            if is_summarizing or len(messages) > 1:
+                return stream()
+            # First turn without context: a near-duplicate's answer will do
+            return similar_stream(f"deepseek:{MODEL}", prompt, stream)
 
-        text = "".join(sanitized_parts).strip()
+        key = response_key("deepseek", MODEL, is_summarizing, messages)
+        text_parts: list[str] = []
+        for chunk_text in cached_stream(key, produce):
+            text_parts.append(chunk_text)
+            yield chunk_text
 
         # Commit new LLMOutput to db
-        llm_output = LLMOutput(
-            turn_id=chat_turn,  # type: ignore
-            provider="deepseek",  # type: ignore
-            summarizer_prompt=prompt if is_summarizing else None,  # type: ignore
-            content=text,  # type: ignore
+        text = "".join(text_parts).strip()
+        persist_output("deepseek", chat_turn, prompt, is_summarizing, text)
+
+    async def aquery(
+        self,
+        prompt: str,
+        chat_turn: int,
+        chat_session: int,
+        is_summarizing: bool = False,
+        system_message="",
+        history: ChatHistory | None = None,
+    ):
+        if history is None:
+            history = await run_in_session(HISTORY_CACHE.load, chat_session, chat_turn)
+        messages = self._build_messages(
+            prompt, chat_turn, chat_session, is_summarizing, system_message, history
         )
-        db.session.add(llm_output)
-        db.session.commit()
 
-        """
-        print("\n\n")
-        print("deepseek chat history")
-        print(messages)
-        print("\n\n")
-        """
+        def produce():
+            stream = lambda: anormalize_stream(
+                aguarded_stream("deepseek", lambda: self._astream_text(messages))
+            )
+            if is_summarizing or len(messages) > 1:
+                return stream()
+            return asimilar_stream(f"deepseek:{MODEL}", prompt, stream)
+
+        key = response_key("deepseek", MODEL, is_summarizing, messages)
+        text_parts: list[str] = []
+        async for chunk_text in acached_stream(key, produce):
+            text_parts.append(chunk_text)
+            yield chunk_text
+
+        text = "".join(text_parts).strip()
+        await run_in_session(
+            persist_output, "deepseek", chat_turn, prompt, is_summarizing, text
+        )
@@ -1,32 +1,97 @@
 from google import genai
-from core.providers.base import LLMProvider, llm_retry
+from google.genai import types
+from core.providers.base import LLMProvider, persist_output, run_in_session
+import asyncio
 import os
 
-from db import db
-from core.providers.models import ChatTurn, LLMOutput
+from core.config import env_int
+from core.providers.context import estimate_tokens, window_turns
+from core.providers.history import HISTORY_CACHE, ChatHistory
+from core.providers.normalize import anormalize_stream, normalize_stream
+from core.providers.prompt_cache import (
+    GEMINI_CONTEXT_CACHE,
+    GeminiContextCache,
+    PromptCacheStats,
+    stable_prefix_turns,
+)
+from core.providers.resilience import aguarded_stream, guarded_retry, guarded_stream
+from core.providers.response_cache import acached_stream, cached_stream, response_key
+from core.providers.similarity_cache import asimilar_stream, similar_stream
+from core.providers.transport import async_client_args, client_args
+
+MODEL = "gemini-2.0-flash-lite"
+BASE_URL = os.environ.get(
+    "GEMINI_BASE_URL", "https://generativelanguage.googleapis.com"
+)
+
+
+def _format_turn(user_text: str, content: str | None) -> list[dict]:
+    contents = [{"role": "user", "parts": [{"text": user_text}]}]
+    if content:
+        contents.append({"role": "model", "parts": [{"text": content}]})
+    return contents
+
+
+def _cache_config(cached_content: str | None) -> types.GenerateContentConfig | None:
+    if not cached_content:
+        return None
+    return types.GenerateContentConfig(cached_content=cached_content)
 
 
 class GeminiProvider(LLMProvider):
 
+    base_url = BASE_URL
+
     def __init__(self):
         api_key = os.environ.get("GEMINI_API_KEY")
         if not api_key:
             raise ValueError("GEMINI_API_KEY not set in environment variables")
-        self.client = genai.Client(api_key=api_key)
+        self.client = genai.Client(
+            api_key=api_key,
+            http_options=types.HttpOptions(
+                base_url=BASE_URL,
+                client_args=client_args(),
+                async_client_args=async_client_args(),
+            ),
+        )
+        # History budget per request (current prompt excluded)
+        self.context_tokens = env_int("SUMLIME_GEMINI_CONTEXT_TOKENS", 64000)
+        self.context_cache = (
+            GeminiContextCache(self.client, MODEL) if GEMINI_CONTEXT_CACHE else None
+        )
+        self.cache_stats = PromptCacheStats("gemini")
 
-    @llm_retry()
-    def _generate(self, *, contents: list[dict] | str, stream: bool = False):
+    @guarded_retry("gemini")
+    def _generate(
+        self,
+        *,
+        contents: list[dict] | str,
+        stream: bool = False,
+        cached_content: str | None = None,
+    ):
         """Wrapper around the Gemini client with optional SSE streaming."""
         if stream:
             return self.client.models.generate_content_stream(
-                model="gemini-2.0-flash-lite",
+                model=MODEL,
                 contents=contents,  # type: ignore
+                config=_cache_config(cached_content),
             )
         return self.client.models.generate_content(
-            model="gemini-2.0-flash-lite",
+            model=MODEL,
             contents=contents,  # type: ignore
         )
 
+    @guarded_retry("gemini")
+    async def _agenerate_stream(
+        self, *, contents: list[dict], cached_content: str | None = None
+    ):
+        """Async streaming variant of :meth:`_generate`."""
+        return await self.client.aio.models.generate_content_stream(
+            model=MODEL,
+            contents=contents,  # type: ignore
+            config=_cache_config(cached_content),
+        )
+
     def create_chat_title(self, prompt: str) -> str:
         response = self._generate(
             contents=f"Given prompt below, generate exactly one descriptive chat title, in a ready-to-use format without quotes, at max 35 chars\n{prompt}",
@@ -34,20 +99,30 @@ class GeminiProvider(LLMProvider):
         text = getattr(response, "text", "Chat Session")
         return text.strip()[:40]
 
-    def query(
+    def summarize_history(self, transcript: str) -> str:
+        response = self._generate(
+            contents=f"Summarize the conversation below for your own future reference. Keep facts, decisions, open questions and the user's preferences; drop small talk. At most 300 words.\n\n{transcript}",
+        )
+        return getattr(response, "text", "") or ""
+
+    def _build_contents(
         self,
         prompt: str,
         chat_turn: int,
         chat_session: int,
-        is_summarizing: bool = False,
-        system_message: str = "",
-    ):
+        is_summarizing: bool,
+        system_message: str,
+        history: ChatHistory | None,
+    ) -> tuple[list[dict], list[dict]]:
         """
         Build provider-specific chat history for Gemini:
           - If is_summarizing: use each turn's summarizer_prompt (if present) as the 'user' text,
             and the Gemini output whose summarizer_prompt is NOT NULL as the 'model'.
           - Else: use turn.prompt as the 'user' text, and the Gemini output with summarizer_prompt IS NULL.
         Falls back safely when rows are missing.
+
+        Returns ``(prefix, tail)``: the prefix only changes every
+        ``PREFIX_ALIGN_TURNS`` turns, so it can be served from a context cache.
         """
         # Gemini expects "contents" with roles ('user'/'model') and "parts":[{"text": "..."}]
         contents = []
@@ -59,76 +134,143 @@ class GeminiProvider(LLMProvider):
                 }
             )
 
-        # 1) Prior turns (oldest→newest), exclude current turn in SQL
-        prev_turns = (
-            db.session.execute(
-                db.select(ChatTurn)
-                .filter(ChatTurn.session_id == chat_session, ChatTurn.id != chat_turn)
-                .order_by(ChatTurn.created_at.asc(), ChatTurn.id.asc())
-            )
-            .scalars()
-            .all()
-        )
-        prev_turn_ids = [t.id for t in prev_turns]
-        if not prev_turn_ids:
-            prev_turn_ids = [-1]  # keep IN() valid but return 0 rows
-
-        # 2) Fetch the (single) gemini output per turn (no ORDER BY needed)
-        outputs_by_turn = {
-            o.turn_id: o
-            for o in db.session.execute(
-                db.select(LLMOutput).filter(
-                    LLMOutput.turn_id.in_(prev_turn_ids),
-                    LLMOutput.provider == "gemini",
-                )
-            )
-            .scalars()
-            .all()
-        }
-
-        # 3) Build chat history
-        for turn in prev_turns:
-            o = outputs_by_turn.get(turn.id)
-            if is_summarizing:
-                # Prefer summarizer_prompt if present;
-                # otherwise fall back to the original prompt
-                user_text = (
-                    o.summarizer_prompt if (o and o.summarizer_prompt) else turn.prompt
-                )
-            else:
-                user_text = turn.prompt
-
-            contents.append({"role": "user", "parts": [{"text": user_text}]})
-            if o and o.content:
-                contents.append({"role": "model", "parts": [{"text": o.content}]})
+        # Prior turns (oldest→newest) from the shared snapshot, within budget
+        if history is None:
+            history = HISTORY_CACHE.load(chat_session, chat_turn)
+        budget = self.context_tokens - estimate_tokens(system_message)
+        head, turns = window_turns(history, "gemini", is_summarizing, _format_turn, budget)
+        contents.extend(head)
+        stable = stable_prefix_turns(len(turns))
+        for items in turns[:stable]:
+            contents.extend(items)
 
+        tail = []
+        for items in turns[stable:]:
+            tail.extend(items)
         # Current user message
-        contents.append({"role": "user", "parts": [{"text": prompt}]})
+        tail.append({"role": "user", "parts": [{"text": prompt}]})
 
-        # Call Gemini using SSE streaming
-        stream = self._generate(contents=contents, stream=True)
-        text_parts: list[str] = []
+        return contents, tail
+
+    def _cached_prefix(
+        self, chat_session: int, is_summarizing: bool, prefix: list[dict], tail: list[dict]
+    ) -> tuple[str | None, list[dict]]:
+        """The context cache holding ``prefix`` (if any) and what still needs sending."""
+        if self.context_cache is None:
+            return None, prefix + tail
+        name = self.context_cache.lookup((chat_session, is_summarizing), prefix)
+        return name, (tail if name else prefix + tail)
+
+    def _record_usage(self, usage) -> None:
+        if usage is not None:
+            self.cache_stats.record(
+                getattr(usage, "prompt_token_count", None),
+                getattr(usage, "cached_content_token_count", None),
+            )
+
+    def _stream_text(
+        self, chat_session: int, is_summarizing: bool, prefix: list[dict], tail: list[dict]
+    ):
+        """Stream text chunks from Gemini, serving ``prefix`` from a context cache if possible."""
+        cached_content, contents = self._cached_prefix(
+            chat_session, is_summarizing, prefix, tail
+        )
+        stream = self._generate(
+            contents=contents, stream=True, cached_content=cached_content
+        )
+        usage = None
         for chunk in stream:
+            usage = getattr(chunk, "usage_metadata", None) or usage
             chunk_text = getattr(chunk, "text", "") or ""
             if chunk_text:
-                text_parts.append(chunk_text)
                 yield chunk_text
+        self._record_usage(usage)
 
-        text = "".join(text_parts).strip()
+    async def _astream_text(
+        self, chat_session: int, is_summarizing: bool, prefix: list[dict], tail: list[dict]
+    ):
+        """Async variant of :meth:`_stream_text`."""
+        cached_content, contents = await asyncio.to_thread(
+            self._cached_prefix, chat_session, is_summarizing, prefix, tail
+        )
+        stream = await self._agenerate_stream(
+            contents=contents, cached_content=cached_content
+        )
+        usage = None
+        async for chunk in stream:
+            usage = getattr(chunk, "usage_metadata", None) or usage
+            chunk_text = getattr(chunk, "text", "") or ""
+            if chunk_text:
+                yield chunk_text
+        self._record_usage(usage)
+
+    def query(
+        self,
+        prompt: str,
+        chat_turn: int,
+        chat_session: int,
+        is_summarizing: bool = False,
+        system_message: str = "",
+        history: ChatHistory | None = None,
+    ):
+        prefix, tail = self._build_contents(
+            prompt, chat_turn, chat_session, is_summarizing, system_message, history
+        )
+
+        # Call Gemini using SSE streaming (or replay an identical request)
+        def produce():
+            stream = lambda: normalize_stream(
+                guarded_stream(
+                    "gemini", lambda: self._stream_text(chat_session, is_summarizing, prefix, tail)
+                )
+            )
+            if is_summarizing or prefix or len(tail) > 1:
+                return stream()
+            # First turn without context: a near-duplicate's answer will do
+            return similar_stream(f"gemini:{MODEL}", prompt, stream)
+
+        key = response_key("gemini", MODEL, is_summarizing, prefix + tail)
+        text_parts: list[str] = []
+        for chunk_text in cached_stream(key, produce):
+            text_parts.append(chunk_text)
+            yield chunk_text
 
         # Persist output (provider='gemini'; summarizer_prompt only when summarizing)
-        llm_output = LLMOutput(
-            turn_id=chat_turn,  # type: ignore
-            provider="gemini",  # type: ignore
-            summarizer_prompt=prompt if is_summarizing else None,  # type: ignore
-            content=text,  # type: ignore
+        text = "".join(text_parts).strip()
+        persist_output("gemini", chat_turn, prompt, is_summarizing, text)
+
+    async def aquery(
+        self,
+        prompt: str,
+        chat_turn: int,
+        chat_session: int,
+        is_summarizing: bool = False,
+        system_message: str = "",
+        history: ChatHistory | None = None,
+    ):
+        if history is None:
+            history = await run_in_session(HISTORY_CACHE.load, chat_session, chat_turn)
+        prefix, tail = self._build_contents(
+            prompt, chat_turn, chat_session, is_summarizing, system_message, history
         )
-        db.session.add(llm_output)
-        db.session.commit()
 
-        """
-        print("\n\n")
-        print("gemini chat history")
-        print(contents)
-        print("\n\n")
-        """
+        def produce():
+            stream = lambda: anormalize_stream(
+                aguarded_stream(
+                    "gemini", lambda: self._astream_text(chat_session, is_summarizing, prefix, tail)
+                )
+            )
+            if is_summarizing or prefix or len(tail) > 1:
+                return stream()
+            return asimilar_stream(f"gemini:{MODEL}", prompt, stream)
+
+        key = response_key("gemini", MODEL, is_summarizing, prefix + tail)
+        text_parts: list[str] = []
+        async for chunk_text in acached_stream(key, produce):
+            text_parts.append(chunk_text)
+            yield chunk_text
+
+        text = "".join(text_parts).strip()
+        await run_in_session(
+            persist_output, "gemini", chat_turn, prompt, is_summarizing, text
+        )
@@ -0,0 +1,231 @@
+"""Chat history snapshots shared by all providers within a turn.
+
+The pipeline loads a session's prior turns and their outputs once per turn
+(``HISTORY_CACHE.load``) and hands the same immutable ``ChatHistory`` to
+every provider, which only projects it into its own wire format.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass, replace
+import threading
+from typing import Callable
+
+from sqlalchemy import and_, func
+
+from db import db
+from core.config import env_int
+from core.providers.models import ChatSession, ChatTurn, LLMOutput
+
+HISTORY_CACHE_SIZE = env_int("SUMLIME_HISTORY_CACHE_SIZE", 512)
+
+# (user_text, assistant_text or None) -> wire-format messages for one turn
+FormatTurn = Callable[[str, str | None], list[dict]]
+
+
+@dataclass(frozen=True)
+class HistoryOutput:
+    provider: str
+    summarizer_prompt: str | None
+    content: str
+
+
+@dataclass(frozen=True)
+class HistoryTurn:
+    id: int
+    prompt: str
+    outputs: tuple[HistoryOutput, ...] = ()
+    completed: bool = False
+
+    def output(self, provider: str, is_summarizing: bool) -> HistoryOutput | None:
+        """This turn's output from ``provider`` in the given mode, if any."""
+        for o in self.outputs:
+            if o.provider == provider and (o.summarizer_prompt is not None) == is_summarizing:
+                return o
+        return None
+
+    @property
+    def settled(self) -> bool:
+        # Not the summarizer row: a progressive draft is stored before the
+        # stragglers' outputs
+        return self.completed
+
+
+@dataclass(frozen=True)
+class ChatHistory:
+    turns: tuple[HistoryTurn, ...] = ()
+    # Rolling summary of the turns up to ``summary_turn_id`` (see core.providers.context)
+    summary: str | None = None
+    summary_turn_id: int = 0
+
+    def project(self, provider: str, is_summarizing: bool, format_turn: FormatTurn) -> list[dict]:
+        """Wire-format history for ``provider`` in the given mode.
+
+        When summarizing, each turn's summarizer prompt stands in for the
+        user text; missing outputs leave a bare user message.
+        """
+        items: list[dict] = []
+        for turn in self.turns:
+            o = turn.output(provider, is_summarizing)
+            if is_summarizing:
+                # Prefer summarizer_prompt if present;
+                # otherwise fall back to the original prompt
+                user_text = (
+                    o.summarizer_prompt if (o and o.summarizer_prompt) else turn.prompt
+                )
+            else:
+                user_text = turn.prompt
+            items.extend(format_turn(user_text, o.content if o else None))
+        return items
+
+
+def _read_turns(
+    chat_session: int, after: int, exclude_turn: int
+) -> tuple[str | None, int, list[HistoryTurn]]:
+    """The session's rolling summary plus its newer turns and all their
+    outputs, in one joined query.
+
+    Turns already covered by the summary or by ``after`` are skipped.
+    """
+    rows = db.session.execute(
+        db.select(
+            ChatSession.history_summary,
+            ChatSession.history_summary_turn_id,
+            ChatTurn.id,
+            ChatTurn.prompt,
+            ChatTurn.completed_at,
+            LLMOutput.provider,
+            LLMOutput.summarizer_prompt,
+            LLMOutput.content,
+        )
+        .select_from(ChatSession)
+        .outerjoin(
+            ChatTurn,
+            and_(
+                ChatTurn.session_id == ChatSession.id,
+                ChatTurn.id > after,
+                ChatTurn.id > func.coalesce(ChatSession.history_summary_turn_id, 0),
+                ChatTurn.id != exclude_turn,
+            ),
+        )
+        .outerjoin(LLMOutput, LLMOutput.turn_id == ChatTurn.id)
+        .filter(ChatSession.id == chat_session)
+        .order_by(ChatTurn.created_at.asc(), ChatTurn.id.asc(), LLMOutput.id.asc())
+    ).all()
+    if not rows:
+        return None, 0, []
+    summary, summary_turn_id = rows[0][0], rows[0][1] or 0
+
+    turns: list[HistoryTurn] = []
+    outputs: list[HistoryOutput] = []
+    for _, _, turn_id, prompt, completed_at, provider, summarizer_prompt, content in rows:
+        if turn_id is None:  # session without (new) turns
+            break
+        if not turns or turns[-1].id != turn_id:
+            if turns:
+                turns[-1] = replace(turns[-1], outputs=tuple(outputs))
+            turns.append(HistoryTurn(turn_id, prompt, completed=completed_at is not None))
+            outputs = []
+        if provider is not None:
+            outputs.append(HistoryOutput(provider, summarizer_prompt, content))
+    if turns:
+        turns[-1] = replace(turns[-1], outputs=tuple(outputs))
+    return summary, summary_turn_id, turns
+
+
+@dataclass
+class _Entry:
+    turns: tuple[HistoryTurn, ...]
+    last_turn_id: int  # newest turn included in ``turns``
+    seen_turn_id: int  # newest prior turn read, cached or not
+    summary: str | None = None
+    summary_turn_id: int = 0
+
+
+class HistoryCache:
+    """Bounded LRU of each session's settled history.
+
+    ``load`` only reads turns newer than the cached ones, and ``record``
+    appends a turn the pipeline has just finished, so a steady conversation
+    reads nothing from the database after the first turn.  Trailing turns
+    that have not settled yet may still be in flight (another tab, another
+    worker), so they are returned but not cached until a later turn lands.
+    """
+
+    def __init__(self, maxsize: int = HISTORY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, chat_session: int, chat_turn: int) -> ChatHistory:
+        """Return the history before ``chat_turn``, reading only new turns."""
+        with self._lock:
+            entry = self._entries.get(chat_session)
+            if entry is not None:
+                self._entries.move_to_end(chat_session)
+                cached, after = entry.turns, entry.last_turn_id
+            else:
+                cached, after = (), 0
+
+        summary, summary_turn_id, new_turns = _read_turns(chat_session, after, chat_turn)
+        # Another worker may have compacted the session since it was cached
+        cached = tuple(t for t in cached if t.id > summary_turn_id)
+        after = max(after, summary_turn_id)
+
+        settled = len(new_turns)
+        while settled and not new_turns[settled - 1].settled:
+            settled -= 1
+        last_turn_id = new_turns[settled - 1].id if settled else after
+        seen_turn_id = new_turns[-1].id if new_turns else after
+        self._store(
+            chat_session,
+            _Entry(
+                cached + tuple(new_turns[:settled]),
+                last_turn_id,
+                seen_turn_id,
+                summary,
+                summary_turn_id,
+            ),
+        )
+        return ChatHistory(cached + tuple(new_turns), summary, summary_turn_id)
+
+    def record(self, chat_session: int, turn: HistoryTurn) -> None:
+        """Append a just-finished turn to a cached entry that is up to date."""
+        with self._lock:
+            entry = self._entries.get(chat_session)
+            if (
+                entry is None
+                or entry.last_turn_id != entry.seen_turn_id
+                or entry.last_turn_id >= turn.id
+            ):
+                return
+            entry.turns = entry.turns + (turn,)
+            entry.last_turn_id = entry.seen_turn_id = turn.id
+
+    def compact(self, chat_session: int, summary: str, summary_turn_id: int) -> None:
+        """Replace cached turns up to ``summary_turn_id`` with ``summary``."""
+        with self._lock:
+            entry = self._entries.get(chat_session)
+            if entry is None or entry.summary_turn_id >= summary_turn_id:
+                return
+            entry.turns = tuple(t for t in entry.turns if t.id > summary_turn_id)
+            entry.summary, entry.summary_turn_id = summary, summary_turn_id
+            entry.last_turn_id = max(entry.last_turn_id, summary_turn_id)
+            entry.seen_turn_id = max(entry.seen_turn_id, summary_turn_id)
+
+    def discard(self, chat_session: int) -> None:
+        with self._lock:
+            self._entries.pop(chat_session, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _store(self, chat_session: int, entry: _Entry):
+        with self._lock:
+            self._entries[chat_session] = entry
+            self._entries.move_to_end(chat_session)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+
+HISTORY_CACHE = HistoryCache()
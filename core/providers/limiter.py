@@ -0,0 +1,171 @@
+"""Adaptive per-provider concurrency limits (AIMD).
+
+Each provider gets an ``AIMDLimiter`` shared by all threads (and tasks) of
+a worker.  A call holds one slot from the first request until its stream
+ends.  Every upstream 429, 503 or 529 — including the ones ``llm_retry``
+retries — halves the limit (``SUMLIME_LIMIT_DECREASE``), at most once per
+``SUMLIME_LIMIT_DECREASE_INTERVAL`` so a burst of rejections counts as one
+signal; every successful call raises it by ``1 / limit``, i.e. about one
+slot per window of successes.
+
+Calls beyond the limit wait in a queue of at most ``SUMLIME_LIMIT_QUEUE``
+for up to ``SUMLIME_LIMIT_TIMEOUT`` seconds, then fail with
+``LimiterRejected`` instead of piling onto an upstream that is already
+pushing back.  A hedge takes its own slot with ``try_acquire`` and is
+skipped when none is free.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Callable
+
+from core.config import env_float, env_int
+
+LIMIT_INITIAL = env_int("SUMLIME_LIMIT_INITIAL", 16)
+LIMIT_MIN = env_int("SUMLIME_LIMIT_MIN", 1)
+LIMIT_MAX = env_int("SUMLIME_LIMIT_MAX", 64)
+LIMIT_DECREASE = env_float("SUMLIME_LIMIT_DECREASE", 0.5)
+LIMIT_DECREASE_INTERVAL = env_float("SUMLIME_LIMIT_DECREASE_INTERVAL", 1.0)
+LIMIT_QUEUE = env_int("SUMLIME_LIMIT_QUEUE", 64)
+LIMIT_TIMEOUT = env_float("SUMLIME_LIMIT_TIMEOUT", 30.0)
+
+_OVERLOAD_STATUSES = {429, 503, 529}
+# Async waiters poll; a slot freed by a thread cannot wake the event loop
+_POLL_SECONDS = 0.01
+
+
+class LimiterRejected(RuntimeError):
+    """Raised when a call cannot get a slot (queue full or timed out)."""
+
+    def __init__(self, provider: str, reason: str):
+        super().__init__(f"{provider} is overloaded ({reason})")
+        self.provider = provider
+        self.reason = reason
+
+
+def is_overload(exc: BaseException) -> bool:
+    """Whether ``exc`` is the upstream asking us to slow down."""
+    status = getattr(exc, "status_code", None) or getattr(exc, "code", None)
+    return status in _OVERLOAD_STATUSES
+
+
+class AIMDLimiter:
+    """Concurrency limit that shrinks on overload and grows on success."""
+
+    def __init__(
+        self,
+        name: str,
+        initial: int = LIMIT_INITIAL,
+        min_limit: int = LIMIT_MIN,
+        max_limit: int = LIMIT_MAX,
+        decrease: float = LIMIT_DECREASE,
+        decrease_interval: float = LIMIT_DECREASE_INTERVAL,
+        max_queue: int = LIMIT_QUEUE,
+        timeout: float = LIMIT_TIMEOUT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.decrease = decrease
+        self.decrease_interval = decrease_interval
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.clock = clock
+        self.inflight = 0
+        self.waiting = 0
+        self.overloads = 0
+        self.rejected = 0
+        self._last_decrease = float("-inf")
+        self._cond = threading.Condition()
+
+    def _free(self) -> bool:
+        return self.inflight < int(self.limit)
+
+    def _enqueue(self) -> None:
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise LimiterRejected(self.name, "queue full")
+        self.waiting += 1
+
+    def _timed_out(self) -> LimiterRejected:
+        self.rejected += 1
+        return LimiterRejected(self.name, "timed out waiting for a slot")
+
+    def acquire(self, timeout: float | None = None) -> None:
+        """Take a slot, waiting up to ``timeout`` (default ``self.timeout``)."""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        with self._cond:
+            if not self._free():
+                self._enqueue()
+                try:
+                    while not self._free():
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise self._timed_out()
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+            self.inflight += 1
+
+    async def aacquire(self, timeout: float | None = None) -> None:
+        """Async variant of :meth:`acquire` that never blocks the loop."""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        with self._cond:
+            if self._free():
+                self.inflight += 1
+                return
+            self._enqueue()
+        try:
+            while True:
+                await asyncio.sleep(_POLL_SECONDS)
+                with self._cond:
+                    if self._free():
+                        self.inflight += 1
+                        return
+                    if time.monotonic() >= deadline:
+                        raise self._timed_out()
+        finally:
+            with self._cond:
+                self.waiting -= 1
+
+    def try_acquire(self) -> bool:
+        """Take a slot only if one is free now; never queues or waits."""
+        with self._cond:
+            if not self._free():
+                return False
+            self.inflight += 1
+            return True
+
+    def observe(self, exc: BaseException) -> None:
+        """Shrink the limit if ``exc`` is an overload signal."""
+        if not is_overload(exc):
+            return
+        with self._cond:
+            self.overloads += 1
+            now = self.clock()
+            if now - self._last_decrease >= self.decrease_interval:
+                self._last_decrease = now
+                self.limit = max(float(self.min_limit), self.limit * self.decrease)
+
+    def release(self, exc: BaseException | None = None) -> None:
+        """Return a slot; ``exc`` is how the call ended (``None``: success)."""
+        if exc is not None:
+            self.observe(exc)
+        with self._cond:
+            self.inflight -= 1
+            if exc is None:
+                self.limit = min(float(self.max_limit), self.limit + 1 / self.limit)
+            self._cond.notify_all()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "inflight": self.inflight,
+                "waiting": self.waiting,
+                "overloads": self.overloads,
+                "rejected": self.rejected,
+            }
@@ -27,10 +27,14 @@ class ChatSession(db.Model):
         onupdate=func.now(),
     )
     created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+    # Rolling summary of turns up to (and including) history_summary_turn_id
+    history_summary = db.Column(db.Text, nullable=True)
+    history_summary_turn_id = db.Column(db.Integer, nullable=True)
+    # Lazy: transcripts are read a page at a time (see app.get_session_messages)
     turns = db.relationship(
         "ChatTurn",
         back_populates="chat_session",
-        lazy="selectin",
+        lazy="select",
         cascade="all, delete-orphan",
         order_by="ChatTurn.created_at.asc()",
     )
@@ -50,6 +54,8 @@ class ChatTurn(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     prompt = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime(timezone=True), server_default=func.now())
+    # Set once every output of the turn, summary included, is stored
+    completed_at = db.Column(db.DateTime(timezone=True), nullable=True)
     session_id = db.Column(
         db.Integer, db.ForeignKey("chat_session.id", ondelete="CASCADE"), nullable=False
     )
@@ -57,7 +63,7 @@ class ChatTurn(db.Model):
     outputs = db.relationship(
         "LLMOutput",
         back_populates="turn",
-        lazy="selectin",  # efficient eager load
+        lazy="select",  # load explicitly (selectinload) when needed
         cascade="all, delete-orphan",
         order_by="LLMOutput.created_at.asc()",  # oldest→newest within a turn
     )
@@ -0,0 +1,158 @@
+"""Streaming normalization of provider output.
+
+Models disagree on markup: DeepSeek writes LaTeX as ``\\(...\\)`` and
+``\\[...\\]``, others use ``$``; some send ``\\r\\n``.  Every provider runs
+its upstream deltas through the same chain of transforms before they are
+cached, persisted or streamed, so the frontend sees one dialect and stored
+history matches what was shown.
+
+A transform is a small state machine: ``feed`` takes the next delta and
+returns what can be emitted now, holding back a suffix that might change
+meaning once the next delta arrives (a lone ``\\`` or ``\\r``); ``flush``
+returns whatever is still held at the end of the stream.  Each delta is
+rewritten in a single regex pass.
+
+``SUMLIME_NORMALIZE`` lists the transforms to apply, in order (default
+``latex,newlines``; empty disables normalization).
+"""
+
+from abc import ABC, abstractmethod
+import os
+import re
+from typing import AsyncIterator, Iterable, Iterator
+
+NORMALIZE = os.environ.get("SUMLIME_NORMALIZE", "latex,newlines")
+
+
+class Transform:
+    """Identity transform; subclasses rewrite text across chunk boundaries."""
+
+    def feed(self, text: str) -> str:
+        return text
+
+    def flush(self) -> str:
+        return ""
+
+
+class _Rewrite(Transform, ABC):
+    """Rewrite that holds back a trailing ``hold`` character."""
+
+    hold: str
+
+    def __init__(self):
+        self._held = ""
+
+    @abstractmethod
+    def _sub(self, text: str) -> str:
+        """Rewrite a piece of the stream that is safe to emit."""
+
+    def feed(self, text: str) -> str:
+        if self._held:
+            text, self._held = self._held + text, ""
+        elif self.hold not in text:
+            return text  # the common case: nothing to rewrite or hold
+        if text.endswith(self.hold):
+            text, self._held = text[:-1], self.hold
+        return self._sub(text) if text else ""
+
+    def flush(self) -> str:
+        text, self._held = self._held, ""
+        return self._sub(text) if text else ""
+
+
+class LatexDelimiters(_Rewrite):
+    """``\\(``/``\\)`` → ``$`` and ``\\[``/``\\]`` → ``$$``."""
+
+    pattern = re.compile(r"\\([()\[\]])")
+    hold = "\\"
+    _delimiters = {"(": "$", ")": "$", "[": "$$", "]": "$$"}
+
+    def _sub(self, text: str) -> str:
+        if "\\" not in text:
+            return text
+        return self.pattern.sub(lambda m: self._delimiters[m.group(1)], text)
+
+
+class Newlines(_Rewrite):
+    """``\\r\\n`` and lone ``\\r`` → ``\\n``."""
+
+    pattern = re.compile(r"\r\n?")
+    hold = "\r"
+
+    def _sub(self, text: str) -> str:
+        if "\r" not in text:
+            return text
+        return self.pattern.sub("\n", text)
+
+
+class Chain(Transform):
+    """Apply several transforms in order."""
+
+    def __init__(self, transforms: Iterable[Transform]):
+        self.transforms = list(transforms)
+        self._feeds = [t.feed for t in self.transforms]
+
+    def feed(self, text: str) -> str:
+        for feed in self._feeds:
+            text = feed(text)
+        return text
+
+    def flush(self) -> str:
+        # Each stage's leftovers still pass through the stages after it
+        text = ""
+        for transform in self.transforms:
+            text = (transform.feed(text) if text else "") + transform.flush()
+        return text
+
+
+TRANSFORMS: dict[str, type[Transform]] = {
+    "latex": LatexDelimiters,
+    "newlines": Newlines,
+}
+
+
+def build(names: str | None = None) -> Transform:
+    """A fresh chain for one stream, from comma-separated transform names."""
+    names = NORMALIZE if names is None else names
+    transforms = []
+    for name in filter(None, (n.strip() for n in names.split(","))):
+        if name not in TRANSFORMS:
+            raise ValueError(f"Unknown transform {name!r} in SUMLIME_NORMALIZE")
+        transforms.append(TRANSFORMS[name]())
+    if len(transforms) == 1:
+        return transforms[0]
+    return Chain(transforms)
+
+
+build()  # fail fast on a misconfigured SUMLIME_NORMALIZE
+
+
+def normalize(text: str, names: str | None = None) -> str:
+    """Normalize a complete text."""
+    chain = build(names)
+    return chain.feed(text) + chain.flush()
+
+
+def normalize_stream(chunks: Iterable[str], names: str | None = None) -> Iterator[str]:
+    chain = build(names)
+    feed = chain.feed
+    for chunk in chunks:
+        out = feed(chunk)
+        if out:
+            yield out
+    out = chain.flush()
+    if out:
+        yield out
+
+
+async def anormalize_stream(
+    chunks: AsyncIterator[str], names: str | None = None
+) -> AsyncIterator[str]:
+    chain = build(names)
+    async for chunk in chunks:
+        out = chain.feed(chunk)
+        if out:
+            yield out
+    out = chain.flush()
+    if out:
+        yield out
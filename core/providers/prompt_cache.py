@@ -0,0 +1,158 @@
+"""Upstream prompt-prefix caching.
+
+Every turn resends the session's history, so the request prefix is mostly
+tokens the provider has already processed.  DeepSeek caches prefixes
+automatically and only needs them to stay byte-identical (see
+``core.providers.context.window_turns``); Gemini needs the prefix uploaded
+once as explicit cached content, which ``GeminiContextCache`` manages.
+``PromptCacheStats`` keeps running hit counts for both and exports them as
+Prometheus counters.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from google.genai import types
+
+from core import metrics
+from core.config import env_bool, env_int
+from core.providers.context import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+GEMINI_CONTEXT_CACHE = env_bool("SUMLIME_GEMINI_CONTEXT_CACHE", False)
+# Gemini rejects cached contents below a model-specific minimum size
+GEMINI_CACHE_MIN_TOKENS = env_int("SUMLIME_GEMINI_CACHE_MIN_TOKENS", 4096)
+GEMINI_CACHE_TTL = env_int("SUMLIME_GEMINI_CACHE_TTL", 600)
+# The cached part of the history grows in steps of this many turns
+PREFIX_ALIGN_TURNS = env_int("SUMLIME_PREFIX_ALIGN_TURNS", 4)
+
+# Recreate a cache this close to expiry rather than risk using a dead name
+_EXPIRY_MARGIN = 30
+
+
+class PromptCacheStats:
+    """Running totals of prompt tokens served from an upstream cache."""
+
+    def __init__(self, provider: str):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self._lock = threading.Lock()
+        self._requests = metrics.PROMPT_CACHE_REQUESTS.labels(provider)
+        self._prompt_tokens = metrics.PROMPT_TOKENS.labels(provider)
+        self._cached_tokens = metrics.PROMPT_CACHED_TOKENS.labels(provider)
+
+    def record(self, prompt_tokens: int | None, cached_tokens: int | None) -> None:
+        with self._lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens or 0
+            self.cached_tokens += cached_tokens or 0
+        self._requests.inc()
+        self._prompt_tokens.inc(prompt_tokens or 0)
+        self._cached_tokens.inc(cached_tokens or 0)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "prompt_tokens": self.prompt_tokens,
+                "cached_tokens": self.cached_tokens,
+                "hit_ratio": (
+                    self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+                ),
+            }
+
+
+def stable_prefix_turns(n_turns: int) -> int:
+    """How many of a window's ``n_turns`` belong to the cacheable prefix."""
+    if PREFIX_ALIGN_TURNS <= 1:  # no alignment
+        return n_turns
+    return n_turns - n_turns % PREFIX_ALIGN_TURNS
+
+
+def _content_tokens(contents: list[dict]) -> int:
+    return sum(
+        estimate_tokens(p.get("text", "")) for c in contents for p in c.get("parts", [])
+    )
+
+
+@dataclass
+class _CachedPrefix:
+    digest: str
+    name: str
+    expires_at: float
+
+
+class GeminiContextCache:
+    """Explicit Gemini cached contents, one per session and mode.
+
+    ``lookup`` returns the name of a cache holding exactly ``prefix``,
+    creating it when the session has none yet and replacing (and deleting)
+    the old one when the prefix has changed.  Failures are logged and
+    reported as a miss, so callers just send the full contents.
+    """
+
+    def __init__(
+        self,
+        client,
+        model: str,
+        ttl: int = GEMINI_CACHE_TTL,
+        min_tokens: int = GEMINI_CACHE_MIN_TOKENS,
+        maxsize: int = 1024,
+    ):
+        self.client = client
+        self.model = model
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.maxsize = maxsize
+        self._entries: OrderedDict[tuple, _CachedPrefix] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(self, key: tuple, prefix: list[dict]) -> str | None:
+        if not prefix or _content_tokens(prefix) < self.min_tokens:
+            return None
+        digest = hashlib.sha256(
+            json.dumps(prefix, sort_keys=True, ensure_ascii=False).encode()
+        ).hexdigest()
+
+        with self._lock:
+            old = self._entries.get(key)
+            if old is not None:
+                self._entries.move_to_end(key)
+                if old.digest == digest and old.expires_at - time.monotonic() > _EXPIRY_MARGIN:
+                    return old.name
+
+        try:
+            cache = self.client.caches.create(
+                model=self.model,
+                config=types.CreateCachedContentConfig(
+                    contents=prefix,  # type: ignore
+                    ttl=f"{self.ttl}s",
+                ),
+            )
+        except Exception as e:
+            logger.warning("Gemini cache creation failed: %s", e)
+            return None
+
+        entry = _CachedPrefix(digest, cache.name, time.monotonic() + self.ttl)
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        if old is not None and old.name != entry.name:
+            self._delete(old.name)
+        return entry.name
+
+    def _delete(self, name: str) -> None:
+        # Best effort: the TTL reclaims anything we fail to delete
+        try:
+            self.client.caches.delete(name=name)
+        except Exception as e:
+            logger.info("Gemini cache %s not deleted: %s", name, e)
@@ -0,0 +1,147 @@
+"""Providers by name, imported and built on first use.
+
+Building every provider at import time pulled in the openai, google-genai
+and anthropic SDKs and constructed their clients before a worker could
+serve anything.  ``ProviderRegistry`` only keeps ``"module:Class"`` specs
+until a provider is first looked up.
+
+Which providers are enabled:
+
+- ``SUMLIME_PROVIDERS``: comma-separated names (default
+  ``deepseek,gemini``); an entry may also be ``name=module:Class`` to add
+  a provider without editing this file.
+- Installed packages can register providers under the
+  ``sumlime.providers`` entry-point group; they are enabled as well.
+"""
+
+from collections.abc import MutableMapping
+from importlib import import_module
+from importlib.metadata import entry_points
+import logging
+import os
+import threading
+from typing import Callable, Iterator
+
+from core.providers.base import LLMProvider
+
+logger = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "sumlime.providers"
+
+BUILTIN_PROVIDERS = {
+    "deepseek": "core.providers.deepseek:DeepSeekProvider",
+    "gemini": "core.providers.gemini:GeminiProvider",
+    "chatgpt": "core.providers.chatgpt:ChatGPTProvider",
+    "claude": "core.providers.claude:ClaudeProvider",
+}
+DEFAULT_PROVIDERS = "deepseek,gemini"
+
+Factory = str | Callable[[], LLMProvider]
+
+
+def _load(spec: str) -> Callable[[], LLMProvider]:
+    module, _, attr = spec.partition(":")
+    return getattr(import_module(module), attr)
+
+
+def configured_factories(setting: str | None = None) -> dict[str, Factory]:
+    """Enabled provider names and their factories, from config and entry points."""
+    if setting is None:
+        setting = os.environ.get("SUMLIME_PROVIDERS") or DEFAULT_PROVIDERS
+    factories: dict[str, Factory] = {}
+    for entry in filter(None, (e.strip() for e in setting.split(","))):
+        name, _, spec = entry.partition("=")
+        name = name.strip()
+        spec = spec.strip() or BUILTIN_PROVIDERS.get(name)
+        if not spec:
+            raise ValueError(f"Unknown provider {name!r} in SUMLIME_PROVIDERS")
+        factories[name] = spec
+    for ep in entry_points(group=ENTRY_POINT_GROUP):
+        factories.setdefault(ep.name, ep.load)
+    return factories
+
+
+class ProviderRegistry(MutableMapping):
+    """A ``dict`` of providers whose values are created on first access.
+
+    Iteration, ``len`` and ``in`` only look at names; reading a value (also
+    via ``values()``/``items()``) builds that provider once, thread-safely.
+    Assigning a value registers a ready-made provider.
+    """
+
+    def __init__(self, factories: dict[str, Factory] | None = None):
+        self._factories: dict[str, Factory] = dict(factories or {})
+        self._instances: dict[str, LLMProvider] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> LLMProvider:
+        provider = self._instances.get(name)
+        if provider is not None:
+            return provider
+        with self._lock:
+            if name in self._instances:
+                return self._instances[name]
+            factory = self._factories[name]  # KeyError, like a dict
+            if isinstance(factory, str):
+                factory = _load(factory)
+            provider = factory()
+            # A plain entry point may point at the class rather than a factory
+            if isinstance(provider, type):
+                provider = provider()
+            self._instances[name] = provider
+            logger.debug("Provider %s ready", name)
+            return provider
+
+    def __setitem__(self, name: str, provider: LLMProvider) -> None:
+        with self._lock:
+            self._factories[name] = lambda: provider
+            self._instances[name] = provider
+
+    def __delitem__(self, name: str) -> None:
+        with self._lock:
+            del self._factories[name]
+            self._instances.pop(name, None)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(list(self._factories))
+
+    def __len__(self) -> int:
+        return len(self._factories)
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._factories
+
+    def __repr__(self) -> str:
+        built = ", ".join(
+            f"{n}{'' if n in self._instances else ' (lazy)'}" for n in self._factories
+        )
+        return f"ProviderRegistry({built})"
+
+    def loaded(self) -> list[str]:
+        """Names of the providers built so far."""
+        return list(self._instances)
+
+    def copy(self) -> "ProviderRegistry":
+        """Shallow copy; providers not built yet stay lazy in both."""
+        other = ProviderRegistry()
+        with self._lock:
+            other._factories = dict(self._factories)
+            other._instances = dict(self._instances)
+        return other
+
+    def update(self, other=(), /, **kwargs) -> None:
+        if isinstance(other, ProviderRegistry):
+            with other._lock:
+                factories, instances = dict(other._factories), dict(other._instances)
+            with self._lock:
+                for name in factories.keys() - instances.keys():
+                    self._instances.pop(name, None)
+                self._factories.update(factories)
+                self._instances.update(instances)
+            other = ()
+        super().update(other, **kwargs)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._factories.clear()
+            self._instances.clear()
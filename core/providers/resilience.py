@@ -0,0 +1,475 @@
+"""Hedged requests and circuit breakers for upstream model streams.
+
+``llm_retry`` only reacts to outright failures, so a call that is merely
+slow keeps the user waiting.  ``guarded_stream`` adds two things per
+provider:
+
+- Hedging (``SUMLIME_HEDGE``): if the first chunk has not arrived within
+  the provider's recent ``SUMLIME_HEDGE_PERCENTILE`` time-to-first-chunk,
+  a duplicate request is started and whichever streams first is kept; the
+  other is closed.  The duplicate needs a free limiter slot of its own,
+  held until the loser is closed.  Nothing is hedged until ``SUMLIME_HEDGE_MIN_SAMPLES``
+  latencies have been observed.
+- A circuit breaker: after ``SUMLIME_BREAKER_FAILURES`` consecutive
+  failed calls the provider fails fast with ``CircuitOpenError`` for
+  ``SUMLIME_BREAKER_RESET_SECONDS``, then lets a single probe through.
+  Providers decorate upstream calls with ``guarded_retry(name)`` so
+  pending retries stop once the circuit opens.
+- An adaptive concurrency limit (see ``core.providers.limiter``), which
+  also sees the errors of retried attempts.
+
+Hedges, hedge wins and breaker trips, rejections and state are exported
+as Prometheus metrics (``core.metrics``) besides ``stats()``.
+
+Only the upstream stream is guarded; cache hits never reach it.
+"""
+
+import asyncio
+from collections import deque
+import contextvars
+import logging
+import math
+import queue
+import threading
+import time
+from typing import AsyncIterator, Callable, Iterator
+
+from core import metrics
+from core.config import env_bool, env_float, env_int
+from core.providers.base import is_retryable_llm, llm_retry
+from core.providers.limiter import AIMDLimiter, LimiterRejected
+
+logger = logging.getLogger(__name__)
+
+HEDGE_ENABLED = env_bool("SUMLIME_HEDGE", False)
+HEDGE_PERCENTILE = env_float("SUMLIME_HEDGE_PERCENTILE", 95)
+HEDGE_MIN_SAMPLES = env_int("SUMLIME_HEDGE_MIN_SAMPLES", 20)
+HEDGE_WINDOW = env_int("SUMLIME_HEDGE_WINDOW", 200)
+# 0 disables the breaker
+BREAKER_FAILURES = env_int("SUMLIME_BREAKER_FAILURES", 5)
+BREAKER_RESET_SECONDS = env_float("SUMLIME_BREAKER_RESET_SECONDS", 30)
+
+_EMPTY = object()
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling an upstream whose circuit is open."""
+
+    def __init__(self, provider: str):
+        super().__init__(f"{provider} is unavailable (circuit open)")
+        self.provider = provider
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker: closed → open → half-open → closed."""
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(
+        self,
+        failures: int = BREAKER_FAILURES,
+        reset_after: float = BREAKER_RESET_SECONDS,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failures = failures
+        self.reset_after = reset_after
+        self.clock = clock
+        self.state = self.CLOSED
+        # Called as ``on_change(old, new)`` on every state change
+        self.on_change: Callable[[str, str], None] | None = None
+        self.trips = 0
+        self.rejected = 0
+        self._streak = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; half-open admits one probe."""
+        with self._lock:
+            if self.state == self.OPEN and self.clock() - self._opened_at >= self.reset_after:
+                self._move(self.HALF_OPEN)
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def is_open(self) -> bool:
+        return self.state == self.OPEN
+
+    def _move(self, state: str) -> None:
+        # Called with the lock held
+        if state == self.state:
+            return
+        old, self.state = self.state, state
+        if state == self.OPEN:
+            self.trips += 1
+        if self.on_change is not None:
+            self.on_change(old, state)
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._streak = 0
+            self._probing = False
+            self._move(self.CLOSED)
+
+    def release(self) -> None:
+        """End a call without a verdict (e.g. the client went away)."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._streak += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or (
+                self.failures and self._streak >= self.failures
+            ):
+                self._move(self.OPEN)
+                self._opened_at = self.clock()
+
+
+class LatencyTracker:
+    """Recent time-to-first-chunk samples, in seconds."""
+
+    def __init__(self, window: int = HEDGE_WINDOW, min_samples: int = HEDGE_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._samples: deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float) -> float | None:
+        """Nearest-rank percentile, or ``None`` with too few samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples or len(samples) < self.min_samples:
+            return None
+        rank = max(1, math.ceil(p / 100 * len(samples)))
+        return samples[min(rank, len(samples)) - 1]
+
+
+class ProviderGuard:
+    """Breaker, concurrency limit, latency history and counters of one provider."""
+
+    def __init__(
+        self,
+        name: str,
+        breaker: CircuitBreaker | None = None,
+        latency: LatencyTracker | None = None,
+        limiter: AIMDLimiter | None = None,
+        hedge: bool = HEDGE_ENABLED,
+        percentile: float = HEDGE_PERCENTILE,
+        is_failure: Callable[[BaseException], bool] = is_retryable_llm,
+    ):
+        self.name = name
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = latency or LatencyTracker()
+        self.limiter = limiter or AIMDLimiter(name)
+        self.hedge = hedge
+        self.percentile = percentile
+        self.is_failure = is_failure
+        self.calls = 0
+        self.failures = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._lock = threading.Lock()
+        self._ttft = metrics.PROVIDER_TTFT.labels(name)
+        self._duration = metrics.PROVIDER_STREAM.labels(name)
+        self._chunk_rate = metrics.PROVIDER_CHUNK_RATE.labels(name)
+        self._chunks = metrics.PROVIDER_CHUNKS.labels(name)
+        self._hedges = metrics.PROVIDER_HEDGES.labels(name)
+        self._hedge_wins = metrics.PROVIDER_HEDGE_WINS.labels(name)
+        self._trips = metrics.BREAKER_TRIPS.labels(name)
+        self._rejected = metrics.BREAKER_REJECTED.labels(name)
+        for state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN):
+            metrics.BREAKER_STATE.labels(name, state).set(state == self.breaker.state)
+        self.breaker.on_change = self._breaker_moved
+
+    def hedge_delay(self) -> float | None:
+        return self.latency.percentile(self.percentile) if self.hedge else None
+
+    def _count(self, field: str, metric=None) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+        if metric is not None:
+            metric.inc()
+
+    def _breaker_moved(self, old: str, new: str) -> None:
+        metrics.BREAKER_STATE.labels(self.name, old).set(0)
+        metrics.BREAKER_STATE.labels(self.name, new).set(1)
+        if new == CircuitBreaker.OPEN:
+            self._trips.inc()
+
+    def _admit(self) -> None:
+        self._count("calls")
+        if not self.breaker.allow():
+            self._rejected.inc()
+            exc = CircuitOpenError(self.name)
+            self._failure_metric(exc)
+            raise exc
+
+    def retrying(self, exc: BaseException) -> None:
+        """``llm_retry`` hook: an attempt failed and will be retried."""
+        self.limiter.observe(exc)
+        metrics.PROVIDER_RETRIES.labels(self.name, type(exc).__name__).inc()
+
+    def _first_chunk_at(self, started: float) -> float:
+        now = time.monotonic()
+        self.latency.add(now - started)
+        self._ttft.observe(now - started)
+        return now
+
+    def _streamed(self, started: float, first_at: float, chunks: int) -> None:
+        """Record a completed stream's duration and chunk rate."""
+        now = time.monotonic()
+        self._chunks.inc(chunks)
+        self._duration.observe(now - started)
+        if chunks > 1 and now > first_at:
+            self._chunk_rate.observe((chunks - 1) / (now - first_at))
+
+    def _failure_metric(self, exc: BaseException) -> None:
+        metrics.PROVIDER_FAILURES.labels(
+            self.name, type(exc).__name__, str(is_retryable_llm(exc)).lower()
+        ).inc()
+
+    def _failed(self, exc: BaseException) -> None:
+        self._count("failures")
+        self._failure_metric(exc)
+        self.limiter.release(exc)
+        if self.is_failure(exc):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    def _succeeded(self) -> None:
+        self.limiter.release()
+        self.breaker.record_success()
+
+    def _abandoned(self) -> None:
+        # The consumer went away mid-call; no verdict on the upstream
+        self.limiter.release()
+        self.breaker.release()
+
+    def snapshot(self) -> dict:
+        p = self.latency.percentile(self.percentile)
+        return {
+            "calls": self.calls,
+            "failures": self.failures,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "hedge_delay_ms": None if p is None else round(p * 1000, 1),
+            "breaker_state": self.breaker.state,
+            "breaker_trips": self.breaker.trips,
+            "breaker_rejected": self.breaker.rejected,
+            **{f"limiter_{k}": v for k, v in self.limiter.snapshot().items()},
+        }
+
+    # --- sync ---
+
+    def _first_chunk(self, produce: Callable[[], Iterator[str]]):
+        """Start ``produce`` (hedged if due) and return ``(stream, first chunk)``."""
+        delay = self.hedge_delay()
+        if delay is None:
+            stream = produce()
+            return stream, next(stream, _EMPTY)
+
+        results: queue.Queue = queue.Queue()
+        won = threading.Event()
+        lock = threading.Lock()
+
+        def attempt(index: int):
+            stream = produce()
+            try:
+                first = next(stream, _EMPTY)
+                outcome = (index, stream, first, None)
+            except Exception as exc:
+                outcome = (index, stream, _EMPTY, exc)
+            with lock:
+                late = won.is_set()
+                if not late:
+                    results.put(outcome)
+            if late:
+                stream.close()
+                self.limiter.release()  # only a hedged call has a loser
+
+        def launch(index: int):
+            ctx = contextvars.copy_context()
+            threading.Thread(
+                target=ctx.run, args=(attempt, index), name=f"{self.name}-hedge", daemon=True
+            ).start()
+
+        launch(0)
+        launched = 1
+        try:
+            outcome = results.get(timeout=delay)
+        except queue.Empty:
+            if self.limiter.try_acquire():
+                self._count("hedges", self._hedges)
+                launch(1)
+                launched = 2
+            outcome = results.get()
+        if outcome[3] is not None and launched == 2:
+            # One attempt failed before streaming; the other may still succeed
+            logger.warning("%s hedge attempt failed: %r", self.name, outcome[3])
+            self.limiter.release()
+            outcome = results.get()
+        with lock:
+            won.set()
+        while not results.empty():
+            results.get_nowait()[1].close()
+            self.limiter.release()
+
+        index, stream, first, exc = outcome
+        if exc is not None:
+            raise exc
+        if index == 1:
+            self._count("hedge_wins", self._hedge_wins)
+        return stream, first
+
+    def stream(self, produce: Callable[[], Iterator[str]]) -> Iterator[str]:
+        self._admit()
+        try:
+            self.limiter.acquire()
+        except LimiterRejected as exc:
+            self._failure_metric(exc)
+            self.breaker.release()
+            raise
+        started = time.monotonic()
+        chunks = 0
+        try:
+            stream, first = self._first_chunk(produce)
+            first_at = self._first_chunk_at(started)
+            if first is not _EMPTY:
+                chunks += 1
+                yield first
+            for chunk in stream:
+                chunks += 1
+                yield chunk
+        except Exception as exc:
+            self._chunks.inc(chunks)
+            self._failed(exc)
+            raise
+        except BaseException:
+            self._chunks.inc(chunks)
+            self._abandoned()
+            raise
+        self._streamed(started, first_at, chunks)
+        self._succeeded()
+
+    # --- async ---
+
+    async def _afirst_chunk(self, produce: Callable[[], AsyncIterator[str]]):
+        """Async variant of :meth:`_first_chunk`."""
+
+        async def first(stream):
+            return await anext(stream, _EMPTY)
+
+        delay = self.hedge_delay()
+        primary = produce()
+        if delay is None:
+            return primary, await first(primary)
+
+        attempts = {asyncio.ensure_future(first(primary)): (0, primary)}
+        done, _ = await asyncio.wait(attempts, timeout=delay)
+        spare = False  # the hedge's slot, held until one attempt is gone
+        if not done and self.limiter.try_acquire():
+            spare = True
+            self._count("hedges", self._hedges)
+            secondary = produce()
+            attempts[asyncio.ensure_future(first(secondary))] = (1, secondary)
+        try:
+            while True:
+                done, _ = await asyncio.wait(attempts, return_when=asyncio.FIRST_COMPLETED)
+                task = next(iter(done))
+                index, stream = attempts.pop(task)
+                if task.exception() is None:
+                    break
+                if not attempts:
+                    raise task.exception()  # type: ignore[misc]
+                logger.warning("%s hedge attempt failed: %r", self.name, task.exception())
+                self.limiter.release()
+                spare = False
+        finally:
+            for pending, (_, loser) in attempts.items():
+                if not pending.done():
+                    pending.cancel()
+                elif not pending.cancelled() and pending.exception() is None:
+                    # Finished in the same wakeup as the winner
+                    await loser.aclose()
+            if spare:
+                self.limiter.release()
+        if index == 1:
+            self._count("hedge_wins", self._hedge_wins)
+        return stream, task.result()
+
+    async def astream(self, produce: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        self._admit()
+        try:
+            await self.limiter.aacquire()
+        except BaseException as exc:
+            if isinstance(exc, LimiterRejected):
+                self._failure_metric(exc)
+            self.breaker.release()
+            raise
+        started = time.monotonic()
+        chunks = 0
+        try:
+            stream, first = await self._afirst_chunk(produce)
+            first_at = self._first_chunk_at(started)
+            if first is not _EMPTY:
+                chunks += 1
+                yield first
+            async for chunk in stream:
+                chunks += 1
+                yield chunk
+        except Exception as exc:
+            self._chunks.inc(chunks)
+            self._failed(exc)
+            raise
+        except BaseException:
+            self._chunks.inc(chunks)
+            self._abandoned()
+            raise
+        self._streamed(started, first_at, chunks)
+        self._succeeded()
+
+
+_guards: dict[str, ProviderGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def guard(name: str, **kwargs) -> ProviderGuard:
+    """The process-wide guard of provider ``name`` (created on first use)."""
+    with _guards_lock:
+        if name not in _guards:
+            _guards[name] = ProviderGuard(name, **kwargs)
+        return _guards[name]
+
+
+def guarded_retry(name: str, **kwargs):
+    """``llm_retry`` that stops on an open circuit and feeds the limiter and metrics."""
+    g = guard(name)
+    return llm_retry(give_up=g.breaker.is_open, on_retry=g.retrying, **kwargs)
+
+
+def guarded_stream(name: str, produce: Callable[[], Iterator[str]]) -> Iterator[str]:
+    return guard(name).stream(produce)
+
+
+def aguarded_stream(
+    name: str, produce: Callable[[], AsyncIterator[str]]
+) -> AsyncIterator[str]:
+    return guard(name).astream(produce)
+
+
+def stats() -> dict[str, dict]:
+    """Snapshot of every guard's counters, keyed by provider."""
+    with _guards_lock:
+        guards = list(_guards.values())
+    return {g.name: g.snapshot() for g in guards}
@@ -0,0 +1,205 @@
+"""Exact-match cache of provider responses.
+
+Responses are keyed by provider, model, mode and the exact message list a
+provider would send upstream, so a hit is only possible when the model would
+have seen precisely the same input.  Hits are replayed through the normal
+provider stream (and still persisted), so callers cannot tell the difference.
+
+``SUMLIME_RESPONSE_CACHE`` selects the backend: ``memory`` keeps entries per
+process, ``sqlite`` stores them in ``SUMLIME_RESPONSE_CACHE_PATH`` so all
+gunicorn workers on a host share them.
+"""
+
+import asyncio
+from collections import OrderedDict
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import AsyncIterator, Callable, Iterator
+
+from core.config import env_int
+
+logger = logging.getLogger(__name__)
+
+RESPONSE_CACHE_TTL = env_int("SUMLIME_RESPONSE_CACHE_TTL", 24 * 3600)
+RESPONSE_CACHE_SIZE = env_int("SUMLIME_RESPONSE_CACHE_SIZE", 2048)
+# Size of the pieces a cached response is replayed in
+REPLAY_CHUNK_CHARS = 64
+
+
+def response_key(provider: str, model: str, is_summarizing: bool, messages) -> str:
+    payload = json.dumps(
+        [provider, model, is_summarizing, messages],
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class MemoryResponseCache:
+    """Per-process LRU with a TTL."""
+
+    def __init__(
+        self,
+        maxsize: int = RESPONSE_CACHE_SIZE,
+        ttl: int = RESPONSE_CACHE_TTL,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: OrderedDict[str, tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= self.clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, text: str) -> None:
+        with self._lock:
+            self._entries[key] = (self.clock() + self.ttl, text)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class SQLiteResponseCache:
+    """LRU with a TTL in a SQLite file, shared by every process using it."""
+
+    def __init__(
+        self,
+        path: str,
+        maxsize: int = RESPONSE_CACHE_SIZE,
+        ttl: int = RESPONSE_CACHE_TTL,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._local = threading.local()
+        self._conn().execute(
+            "CREATE TABLE IF NOT EXISTS response_cache ("
+            " key TEXT PRIMARY KEY, text TEXT NOT NULL,"
+            " expires_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._conn().execute(
+            "CREATE INDEX IF NOT EXISTS response_cache_used_at"
+            " ON response_cache (used_at)"
+        )
+
+    def _conn(self) -> sqlite3.Connection:
+        # sqlite3 connections must stay on the thread that made them
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> str | None:
+        now = self.clock()
+        conn = self._conn()
+        row = conn.execute(
+            "SELECT text, expires_at FROM response_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        if row[1] <= now:
+            conn.execute("DELETE FROM response_cache WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE response_cache SET used_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key: str, text: str) -> None:
+        now = self.clock()
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO response_cache VALUES (?, ?, ?, ?)",
+            (key, text, now + self.ttl, now),
+        )
+        conn.execute("DELETE FROM response_cache WHERE expires_at <= ?", (now,))
+        conn.execute(
+            "DELETE FROM response_cache WHERE key IN ("
+            " SELECT key FROM response_cache ORDER BY used_at DESC LIMIT -1 OFFSET ?)",
+            (self.maxsize,),
+        )
+
+    def clear(self) -> None:
+        self._conn().execute("DELETE FROM response_cache")
+
+
+def _from_env() -> MemoryResponseCache | SQLiteResponseCache | None:
+    backend = os.environ.get("SUMLIME_RESPONSE_CACHE", "").strip().lower()
+    if backend == "memory":
+        return MemoryResponseCache()
+    if backend == "sqlite":
+        return SQLiteResponseCache(
+            os.environ.get("SUMLIME_RESPONSE_CACHE_PATH", "response_cache.sqlite3")
+        )
+    if backend:
+        logger.warning("Unknown SUMLIME_RESPONSE_CACHE backend %r; cache disabled", backend)
+    return None
+
+
+RESPONSE_CACHE = _from_env()
+
+
+def replay(text: str) -> Iterator[str]:
+    for i in range(0, len(text), REPLAY_CHUNK_CHARS):
+        yield text[i : i + REPLAY_CHUNK_CHARS]
+
+
+def cached_stream(key: str, produce: Callable[[], Iterator[str]]) -> Iterator[str]:
+    """Replay ``key`` from ``RESPONSE_CACHE``, or stream ``produce()`` and store it.
+
+    Only complete, non-empty responses are stored.
+    """
+    cache = RESPONSE_CACHE
+    text = cache.get(key) if cache is not None else None
+    if text is not None:
+        yield from replay(text)
+        return
+    parts: list[str] = []
+    for chunk in produce():
+        parts.append(chunk)
+        yield chunk
+    if cache is not None and parts:
+        cache.set(key, "".join(parts))
+
+
+async def acached_stream(
+    key: str, produce: Callable[[], AsyncIterator[str]]
+) -> AsyncIterator[str]:
+    """Async variant of :func:`cached_stream`.
+
+    Cache reads and writes run on worker threads: the SQLite backend blocks.
+    """
+    cache = RESPONSE_CACHE
+    text = await asyncio.to_thread(cache.get, key) if cache is not None else None
+    if text is not None:
+        for chunk in replay(text):
+            yield chunk
+        return
+    parts: list[str] = []
+    async for chunk in produce():
+        parts.append(chunk)
+        yield chunk
+    if cache is not None and parts:
+        await asyncio.to_thread(cache.set, key, "".join(parts))
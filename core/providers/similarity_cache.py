@@ -0,0 +1,205 @@
+"""Near-duplicate cache for first-turn prompts.
+
+Opening prompts are often trivial rewordings of each other (punctuation,
+casing, word order), which the exact response cache cannot match.  This
+cache indexes each answered prompt's normalized word set with MinHash
+banding; a lookup scores the candidates sharing a band by exact Jaccard
+similarity and serves the best answer at or above the threshold.
+
+Only history-free, non-summarizing requests are eligible, since any prior
+context would change the answer.  Opt-in via ``SUMLIME_SIMILARITY_CACHE``.
+
+Lookups are exported as Prometheus metrics by hit or miss, along with the
+similarity of each lookup's closest candidate, to tune the threshold.
+"""
+
+from collections import OrderedDict
+from dataclasses import dataclass
+import hashlib
+import itertools
+import logging
+import random
+import re
+import threading
+import time
+from typing import AsyncIterator, Callable, Iterator
+
+from core import metrics
+from core.config import env_bool, env_float, env_int
+from core.providers.response_cache import replay
+
+logger = logging.getLogger(__name__)
+
+SIMILARITY_CACHE_ENABLED = env_bool("SUMLIME_SIMILARITY_CACHE", False)
+# Minimum Jaccard similarity of the prompts' word sets for a hit
+SIMILARITY_THRESHOLD = env_float("SUMLIME_SIMILARITY_THRESHOLD", 0.85)
+# Prompts remembered per process, least recently used evicted first
+SIMILARITY_CACHE_SIZE = env_int("SUMLIME_SIMILARITY_CACHE_SIZE", 5000)
+
+# 32 bands of 4 rows: pairs above ~0.5 similarity almost always share a band
+_BANDS, _ROWS = 32, 4
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5EED)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(_BANDS * _ROWS)
+]
+
+
+def shingles(prompt: str) -> frozenset[str]:
+    """Normalized word set: casing, punctuation and word order are ignored."""
+    return frozenset(re.findall(r"\w+", prompt.casefold()))
+
+
+def _signature(words: frozenset[str]) -> list[int]:
+    hashes = [
+        int.from_bytes(hashlib.blake2b(w.encode(), digest_size=8).digest(), "big")
+        for w in words
+    ]
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def _bands(signature: list[int]) -> list[tuple[int, ...]]:
+    return [
+        tuple(signature[i * _ROWS : (i + 1) * _ROWS]) for i in range(_BANDS)
+    ]
+
+
+@dataclass
+class _Entry:
+    namespace: str
+    words: frozenset[str]
+    bands: list[tuple[int, ...]]
+    answer: str
+
+
+class SimilarityCache:
+    """MinHash-LSH index of answered prompts, per provider namespace."""
+
+    def __init__(
+        self,
+        threshold: float = SIMILARITY_THRESHOLD,
+        maxsize: int = SIMILARITY_CACHE_SIZE,
+    ):
+        self.threshold = threshold
+        self.maxsize = maxsize
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+        self._buckets: dict[tuple, set[int]] = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.lookup_seconds = 0.0
+        self.max_lookup_seconds = 0.0
+
+    def lookup(self, namespace: str, prompt: str) -> str | None:
+        """The stored answer for the most similar prompt, if similar enough."""
+        start = time.perf_counter()
+        words = shingles(prompt)
+        answer = None
+        closest = None
+        if words:
+            bands = _bands(_signature(words))
+            with self._lock:
+                candidates: set[int] = set()
+                for i, band in enumerate(bands):
+                    candidates |= self._buckets.get((namespace, i, band), set())
+                best_id, best = None, self.threshold
+                for entry_id in candidates:
+                    entry = self._entries[entry_id]
+                    similarity = len(words & entry.words) / len(words | entry.words)
+                    closest = max(closest or 0.0, similarity)
+                    if similarity >= best:
+                        best_id, best = entry_id, similarity
+                if best_id is not None:
+                    self._entries.move_to_end(best_id)
+                    answer = self._entries[best_id].answer
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            if answer is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            self.lookup_seconds += elapsed
+            self.max_lookup_seconds = max(self.max_lookup_seconds, elapsed)
+        outcome = "miss" if answer is None else "hit"
+        metrics.SIMILARITY_LOOKUP.labels(namespace, outcome).observe(elapsed)
+        if closest is not None:
+            metrics.SIMILARITY_SCORE.labels(namespace).observe(closest)
+        return answer
+
+    def add(self, namespace: str, prompt: str, answer: str) -> None:
+        words = shingles(prompt)
+        if not words:
+            return
+        entry = _Entry(namespace, words, _bands(_signature(words)), answer)
+        with self._lock:
+            entry_id = next(self._ids)
+            self._entries[entry_id] = entry
+            for i, band in enumerate(entry.bands):
+                self._buckets.setdefault((namespace, i, band), set()).add(entry_id)
+            while len(self._entries) > self.maxsize:
+                self._evict(*self._entries.popitem(last=False))
+
+    def _evict(self, entry_id: int, entry: _Entry) -> None:
+        for i, band in enumerate(entry.bands):
+            key = (entry.namespace, i, band)
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "mean_lookup_ms": 1000 * self.lookup_seconds / lookups if lookups else 0.0,
+                "max_lookup_ms": 1000 * self.max_lookup_seconds,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+
+SIMILARITY_CACHE = SimilarityCache() if SIMILARITY_CACHE_ENABLED else None
+
+
+def similar_stream(
+    namespace: str, prompt: str, produce: Callable[[], Iterator[str]]
+) -> Iterator[str]:
+    """Replay a near-duplicate's answer, or stream ``produce()`` and index it."""
+    cache = SIMILARITY_CACHE
+    answer = cache.lookup(namespace, prompt) if cache is not None else None
+    if answer is not None:
+        yield from replay(answer)
+        return
+    parts: list[str] = []
+    for chunk in produce():
+        parts.append(chunk)
+        yield chunk
+    if cache is not None and parts:
+        cache.add(namespace, prompt, "".join(parts))
+
+
+async def asimilar_stream(
+    namespace: str, prompt: str, produce: Callable[[], AsyncIterator[str]]
+) -> AsyncIterator[str]:
+    """Async variant of :func:`similar_stream`."""
+    cache = SIMILARITY_CACHE
+    answer = cache.lookup(namespace, prompt) if cache is not None else None
+    if answer is not None:
+        for chunk in replay(answer):
+            yield chunk
+        return
+    parts: list[str] = []
+    async for chunk in produce():
+        parts.append(chunk)
+        yield chunk
+    if cache is not None and parts:
+        cache.add(namespace, prompt, "".join(parts))
@@ -0,0 +1,155 @@
+"""Shared HTTP transport for the provider SDK clients.
+
+Every SDK client used to open its own connection pool with default limits
+and timeouts.  All providers now send through one pooled transport per
+worker (one for sync clients, one for async clients), configured here:
+
+- ``SUMLIME_HTTP_MAX_CONNECTIONS`` / ``SUMLIME_HTTP_MAX_KEEPALIVE`` /
+  ``SUMLIME_HTTP_KEEPALIVE_EXPIRY``: pool limits and idle keep-alive.
+- ``SUMLIME_HTTP2``: negotiate HTTP/2 where the upstream supports it
+  (requires the ``h2`` package; ignored with a warning otherwise).
+- ``SUMLIME_HTTP_CONNECT_TIMEOUT`` / ``SUMLIME_HTTP_READ_TIMEOUT``.
+
+With ``SUMLIME_HTTP_WARMUP`` the worker opens a connection to each
+provider's origin at boot (see ``gunicorn.conf.py`` and ``asgi.py``), so
+the first user request does not pay for DNS and the TLS handshake.
+
+The async transport binds its connections to the event loop that first
+uses it; a worker is expected to run a single loop.
+"""
+
+import asyncio
+import importlib.util
+import logging
+import threading
+
+import httpx
+
+from core.config import env_bool, env_float, env_int
+
+logger = logging.getLogger(__name__)
+
+HTTP_MAX_CONNECTIONS = env_int("SUMLIME_HTTP_MAX_CONNECTIONS", 100)
+HTTP_MAX_KEEPALIVE = env_int("SUMLIME_HTTP_MAX_KEEPALIVE", 20)
+HTTP_KEEPALIVE_EXPIRY = env_float("SUMLIME_HTTP_KEEPALIVE_EXPIRY", 60.0)
+HTTP2 = env_bool("SUMLIME_HTTP2", False)
+HTTP_CONNECT_TIMEOUT = env_float("SUMLIME_HTTP_CONNECT_TIMEOUT", 5.0)
+HTTP_READ_TIMEOUT = env_float("SUMLIME_HTTP_READ_TIMEOUT", 120.0)
+HTTP_WARMUP = env_bool("SUMLIME_HTTP_WARMUP", False)
+
+
+def limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def timeout() -> httpx.Timeout:
+    # Streams may idle between tokens, so the read timeout is per chunk
+    return httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+
+
+def http2_enabled() -> bool:
+    if HTTP2 and importlib.util.find_spec("h2") is None:
+        logger.warning("SUMLIME_HTTP2 is set but the h2 package is missing; using HTTP/1.1")
+        return False
+    return HTTP2
+
+
+class _Shared(httpx.BaseTransport):
+    """Sync transport that outlives the clients using it.
+
+    SDK clients close their transport when they are closed or collected;
+    the shared pool must survive that.
+    """
+
+    def __init__(self, transport: httpx.BaseTransport):
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        return self.transport.handle_request(request)
+
+    def close(self) -> None:
+        pass
+
+
+class _AsyncShared(httpx.AsyncBaseTransport):
+    """Async counterpart of :class:`_Shared`."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self.transport.handle_async_request(request)
+
+    async def aclose(self) -> None:
+        pass
+
+
+_lock = threading.Lock()
+_sync: _Shared | None = None
+_async: _AsyncShared | None = None
+
+
+def sync_transport() -> httpx.BaseTransport:
+    """The worker's pooled transport for blocking clients."""
+    global _sync
+    with _lock:
+        if _sync is None:
+            _sync = _Shared(httpx.HTTPTransport(limits=limits(), http2=http2_enabled()))
+        return _sync
+
+
+def async_transport() -> httpx.AsyncBaseTransport:
+    """The worker's pooled transport for async clients."""
+    global _async
+    with _lock:
+        if _async is None:
+            _async = _AsyncShared(
+                httpx.AsyncHTTPTransport(limits=limits(), http2=http2_enabled())
+            )
+        return _async
+
+
+def http_client() -> httpx.Client:
+    """A client on the shared sync transport (cheap; the pool is shared)."""
+    return httpx.Client(transport=sync_transport(), timeout=timeout())
+
+
+def async_http_client() -> httpx.AsyncClient:
+    """A client on the shared async transport."""
+    return httpx.AsyncClient(transport=async_transport(), timeout=timeout())
+
+
+def client_args() -> dict:
+    """``httpx.Client`` kwargs for SDKs that build their own client (google-genai)."""
+    return {"transport": sync_transport(), "timeout": timeout()}
+
+
+def async_client_args() -> dict:
+    return {"transport": async_transport(), "timeout": timeout()}
+
+
+def warm_up(origins: list[str]) -> None:
+    """Open a pooled connection to each origin; failures are only logged."""
+    with http_client() as client:
+        for origin in origins:
+            try:
+                client.head(origin)
+            except httpx.HTTPError as exc:
+                logger.warning("Warm-up of %s failed: %r", origin, exc)
+
+
+async def awarm_up(origins: list[str]) -> None:
+    """Async variant of :func:`warm_up`; origins are contacted concurrently."""
+
+    async def one(client: httpx.AsyncClient, origin: str) -> None:
+        try:
+            await client.head(origin)
+        except httpx.HTTPError as exc:
+            logger.warning("Warm-up of %s failed: %r", origin, exc)
+
+    async with async_http_client() as client:
+        await asyncio.gather(*(one(client, origin) for origin in origins))
@@ -0,0 +1,226 @@
+"""Write-behind persistence of provider outputs.
+
+Without it every provider commits its own ``LLMOutput`` as its stream ends,
+so a turn pays one synchronous commit per model inside the streaming path.
+With ``SUMLIME_WRITE_BEHIND`` enabled the pipeline opens an ``OutputBatch``
+for the turn; ``persist_output`` only appends to it, and the pipeline
+flushes all rows in one transaction just before the final event.
+
+The batch lives in a context variable, so provider threads and tasks
+started from the pipeline's context share it.  If a flush fails, its rows
+go to a local spool directory; after a later flush succeeds, the pipeline
+re-inserts them on a background thread, off the request path.
+"""
+
+from contextvars import ContextVar
+from datetime import datetime, timezone
+import fcntl
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from sqlalchemy.exc import IntegrityError
+
+from db import db
+from core.config import env_bool
+from core.providers.models import ChatTurn, LLMOutput
+
+logger = logging.getLogger(__name__)
+
+WRITE_BEHIND = env_bool("SUMLIME_WRITE_BEHIND", False)
+SPOOL_DIR = os.environ.get("SUMLIME_SPOOL_DIR", "spool")
+
+_current: ContextVar["OutputBatch | None"] = ContextVar("output_batch", default=None)
+
+
+class OutputBatch:
+    """``LLMOutput`` rows of one turn, waiting for a single commit."""
+
+    def __init__(self):
+        self.rows: list[dict] = []
+        self.completed: list[int] = []  # turns to mark complete with the rows
+        self._lock = threading.Lock()
+
+    def add(
+        self, provider: str, chat_turn: int, prompt: str, is_summarizing: bool, content: str
+    ) -> None:
+        row = {
+            "turn_id": chat_turn,
+            "provider": provider,
+            "summarizer_prompt": prompt if is_summarizing else None,
+            "content": content,
+        }
+        with self._lock:
+            self.rows.append(row)
+
+    def merge_summarizer(self, chat_turn: int, provider: str, content: str) -> None:
+        """Fold pending summarizer rows into the first one, as the pipeline's
+        DB-side merge does for committed rows."""
+        with self._lock:
+            matches = [
+                r
+                for r in self.rows
+                if r["turn_id"] == chat_turn
+                and r["provider"] == provider
+                and r["summarizer_prompt"] is not None
+            ]
+            if len(matches) < 2:
+                return
+            matches[0]["content"] = content
+            extra = {id(r) for r in matches[1:]}
+            self.rows = [r for r in self.rows if id(r) not in extra]
+
+    def complete(self, chat_turn: int) -> None:
+        with self._lock:
+            self.completed.append(chat_turn)
+
+    def take(self) -> list[dict]:
+        with self._lock:
+            rows, self.rows = self.rows, []
+        return rows
+
+    def take_completed(self) -> list[int]:
+        with self._lock:
+            completed, self.completed = self.completed, []
+        return completed
+
+
+def current_batch() -> OutputBatch | None:
+    return _current.get()
+
+
+def open_batch() -> OutputBatch:
+    """Start collecting outputs in the current context."""
+    batch = OutputBatch()
+    _current.set(batch)
+    return batch
+
+
+def close_batch() -> None:
+    _current.set(None)
+
+
+def _insert(rows: list[dict], completed: list[int] | None = None) -> None:
+    db.session.add_all(LLMOutput(**row) for row in rows)
+    if completed:
+        db.session.execute(
+            db.update(ChatTurn)
+            .where(ChatTurn.id.in_(completed))
+            .values(completed_at=datetime.now(timezone.utc))
+        )
+    db.session.commit()
+
+
+def flush(batch: OutputBatch) -> bool:
+    """Commit the batch's rows in one transaction, spooling them on failure.
+
+    Turns the batch completes are marked in the same transaction.  Spooled
+    rows are replayed without the mark: those turns only stay uncached.
+    Returns whether the database took the rows.
+    """
+    rows = batch.take()
+    completed = batch.take_completed()
+    if not rows and not completed:
+        return True
+    try:
+        _insert(rows, completed)
+    except Exception:
+        db.session.rollback()
+        logger.exception("Output flush failed; spooling %d rows", len(rows))
+        if rows:
+            spool(rows)
+        return False
+    return True
+
+
+def spool(rows: list[dict], spool_dir: str | None = None) -> str:
+    """Durably write ``rows`` to a new spool file and return its path."""
+    spool_dir = spool_dir or SPOOL_DIR
+    os.makedirs(spool_dir, exist_ok=True)
+    path = os.path.join(spool_dir, f"{time.time_ns()}-{uuid.uuid4().hex}.json")
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(rows, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def spool_pending(spool_dir: str | None = None) -> bool:
+    """Whether the spool holds files waiting to be replayed."""
+    try:
+        return any(n.endswith(".json") for n in os.listdir(spool_dir or SPOOL_DIR))
+    except FileNotFoundError:
+        return False
+
+
+_draining = threading.Lock()
+
+
+def replay_spool() -> int:
+    """Drain the spool unless this process is already draining it."""
+    if not _draining.acquire(blocking=False):
+        return 0
+    try:
+        return drain_spool()
+    finally:
+        _draining.release()
+
+
+def drain_spool(spool_dir: str | None = None) -> int:
+    """Re-insert spooled rows, oldest file first; returns rows written.
+
+    Stops at the first failure, leaving that file for the next attempt.
+    Files whose rows can no longer be inserted (e.g. the turn was deleted)
+    are renamed to ``*.dead`` so they do not block the rest.
+
+    A worker claims a file with an exclusive ``flock`` while replaying it,
+    so concurrent workers never replay it twice; the claim dies with the
+    worker, leaving the file to be picked up again.
+    """
+    spool_dir = spool_dir or SPOOL_DIR
+    try:
+        names = sorted(n for n in os.listdir(spool_dir) if n.endswith(".json"))
+    except FileNotFoundError:
+        return 0
+    written = 0
+    for name in names:
+        path = os.path.join(spool_dir, name)
+        try:
+            f = open(path, encoding="utf-8")
+        except FileNotFoundError:
+            continue
+        with f:
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                continue  # another worker is replaying it
+            if not _still_spooled(path, f):
+                continue  # replayed and removed since we listed it
+            try:
+                rows = json.load(f)
+                _insert(rows)
+            except (ValueError, TypeError, IntegrityError):
+                db.session.rollback()
+                logger.exception("Unreplayable spool file %s", path)
+                os.replace(path, path + ".dead")
+                continue
+            except Exception:
+                db.session.rollback()
+                logger.exception("Spool replay failed at %s", path)
+                break
+            # Removed while still locked, so no other worker can claim it
+            os.remove(path)
+        written += len(rows)
+    return written
+
+
+def _still_spooled(path: str, f) -> bool:
+    try:
+        return os.stat(path).st_ino == os.fstat(f.fileno()).st_ino
+    except FileNotFoundError:
+        return False
@@ -0,0 +1,177 @@
+"""Coalescing of pipeline events before they are framed as SSE.
+
+Providers emit deltas of a few characters; framing each one as its own SSE
+event costs a ``json.dumps``, a write and a browser re-render.  ``coalesce``
+merges consecutive chunks from the same provider until ``max_bytes`` have
+accumulated or ``max_delay`` seconds have passed since the first of them,
+and flushes immediately when the provider changes, before any non-chunk
+event (title, final) and at the end of the stream.
+
+The time limit must hold even while upstream is silent, so the sync
+variant pulls events on a reader thread (running in a copy of the caller's
+context, so Flask's ``g`` and ``db.session`` still work) and waits on a
+queue with a timeout.
+"""
+
+import asyncio
+import contextvars
+import queue
+import threading
+import time
+from typing import AsyncGenerator, AsyncIterator, Generator
+
+from core.config import env_float, env_int
+
+# 0 disables the respective limit; both 0 disables coalescing
+COALESCE_MS = env_float("SUMLIME_SSE_COALESCE_MS", 30)
+COALESCE_BYTES = env_int("SUMLIME_SSE_COALESCE_BYTES", 512)
+
+_ITEM, _RETURN, _ERROR = range(3)
+
+
+def _is_chunk(event) -> bool:
+    return isinstance(event, dict) and event.keys() == {"provider", "chunk"}
+
+
+class _Buffer:
+    def __init__(self, max_bytes: int, max_delay: float):
+        self.max_bytes = max_bytes or float("inf")
+        self.max_delay = max_delay or float("inf")
+        self.provider: str | None = None
+        self.parts: list[str] = []
+        self.size = 0
+        self.deadline = float("inf")
+
+    def timeout(self) -> float | None:
+        if not self.parts:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+    def add(self, event: dict) -> list[dict]:
+        """Buffer a chunk event; return the events that must go out now."""
+        out = self.flush() if event["provider"] != self.provider else []
+        if not self.parts:
+            self.provider = event["provider"]
+            self.deadline = time.monotonic() + self.max_delay
+        self.parts.append(event["chunk"])
+        self.size += len(event["chunk"].encode())
+        if self.size >= self.max_bytes:
+            out += self.flush()
+        return out
+
+    def flush(self) -> list[dict]:
+        if not self.parts:
+            return []
+        event = {"provider": self.provider, "chunk": "".join(self.parts)}
+        self.parts, self.size, self.deadline = [], 0, float("inf")
+        return [event]
+
+
+def coalesce(
+    events: Generator,
+    max_bytes: int = COALESCE_BYTES,
+    max_delay_ms: float = COALESCE_MS,
+) -> Generator:
+    """Coalesce the chunk events of ``events``; returns what ``events`` returns."""
+    if not max_bytes and not max_delay_ms:
+        return (yield from events)
+
+    buffer = _Buffer(max_bytes, max_delay_ms / 1000)
+    items: queue.Queue = queue.Queue()
+    stop = threading.Event()
+
+    def pump():
+        try:
+            while not stop.is_set():
+                try:
+                    item = next(events)
+                except StopIteration as done:
+                    items.put((_RETURN, done.value))
+                    return
+                items.put((_ITEM, item))
+            events.close()  # consumer went away
+        except BaseException as exc:
+            items.put((_ERROR, exc))
+
+    reader = threading.Thread(
+        target=contextvars.copy_context().run, args=(pump,), name="sse-reader", daemon=True
+    )
+    reader.start()
+    try:
+        while True:
+            try:
+                kind, value = items.get(timeout=buffer.timeout())
+            except queue.Empty:
+                yield from buffer.flush()
+                continue
+            if kind == _ITEM and _is_chunk(value):
+                yield from buffer.add(value)
+                continue
+            yield from buffer.flush()
+            if kind == _ITEM:
+                yield value
+            elif kind == _RETURN:
+                return value
+            else:
+                raise value
+    finally:
+        # The reader closes ``events`` once its pending ``next`` returns;
+        # wait for that so it happens before the caller's context goes away.
+        stop.set()
+        reader.join()
+
+
+async def acoalesce(
+    events: AsyncGenerator,
+    max_bytes: int = COALESCE_BYTES,
+    max_delay_ms: float = COALESCE_MS,
+) -> AsyncIterator:
+    """Async variant of :func:`coalesce`.
+
+    ``events`` is driven by a single task, so context variables it sets
+    (e.g. the write-behind batch) persist from one step to the next.
+    """
+    if not max_bytes and not max_delay_ms:
+        async for event in events:
+            yield event
+        return
+
+    buffer = _Buffer(max_bytes, max_delay_ms / 1000)
+    items: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for item in events:
+                await items.put((_ITEM, item))
+            await items.put((_RETURN, None))
+        except Exception as exc:
+            await items.put((_ERROR, exc))
+
+    reader = asyncio.create_task(pump())
+    try:
+        while True:
+            try:
+                kind, value = await asyncio.wait_for(items.get(), buffer.timeout())
+            except asyncio.TimeoutError:
+                for event in buffer.flush():
+                    yield event
+                continue
+            if kind == _ITEM and _is_chunk(value):
+                for event in buffer.add(value):
+                    yield event
+                continue
+            for event in buffer.flush():
+                yield event
+            if kind == _ITEM:
+                yield value
+            elif kind == _RETURN:
+                return
+            else:
+                raise value
+    finally:
+        reader.cancel()
+        try:
+            await reader
+        except asyncio.CancelledError:
+            pass
+        await events.aclose()
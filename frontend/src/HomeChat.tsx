@@ -10,6 +10,7 @@ import rehypeMathCopy from "./math/rehypeMathCopy.ts"
 import { MathInline, MathBlock } from "./math/MathWrappers.tsx"
 
 type Session = { id: number; title: string; last_used: string };
+type SessionsPage = { sessions: Session[]; next_cursor: string | null };
 type LLMResponse = { provider: string; content: string };
 type ChatTurn = {
   turn_id: number;
@@ -18,6 +19,8 @@ type ChatTurn = {
   responses: LLMResponse[];
 }
 
+type TranscriptPage = { turns: ChatTurn[]; next_before: number | null };
+
 const API_BASE = import.meta.env.VITE_BACKEND_URL || "http://localhost:5050";
 
 
@@ -27,7 +30,10 @@ export default function HomeChat() {
   const [prompt, setPrompt] = useState("");
   const [chatSession, setChatSession] = useState<number | null>(null);
   const [sessions, setSessions] = useState<Session[]>([]);
+  const [sessionsCursor, setSessionsCursor] = useState<string | null>(null);
   const [chatTurns, setChatTurns] = useState<ChatTurn[]>([]);
+  // Oldest loaded turn when the session has earlier ones, else null
+  const [turnsBefore, setTurnsBefore] = useState<number | null>(null);
   const [isSending, setIsSending] = useState(false);
   const [sidebarOpen, setSidebarOpen] = useState(() => window.matchMedia("(min-width: 768px)").matches);
 
@@ -57,26 +63,39 @@ export default function HomeChat() {
   }
 
 
+  // Sessions come in pages, newest first; `cursor` continues after the last page
+  const fetchSessions = async (cursor: string | null = null) => {
+    const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+    const res = await apiFetch(`${API_BASE}/api/sessions${query}`);
+    if (!res.ok) return;
+    const page: SessionsPage = await res.json();
+    setSessions((prev) => (cursor ? [...prev, ...page.sessions] : page.sessions));
+    setSessionsCursor(page.next_cursor);
+  };
+
   useEffect(() => {
-    apiFetch(`${API_BASE}/api/sessions`)
-      .then((r) => r.json())
-      .then(setSessions)
-      .catch(() => { });
+    fetchSessions().catch(() => { });
   }, []);
 
+  const rememberDefaultProviders = (turns: ChatTurn[]) => {
+    // Initialize per-turn default provider (summarizer first if available)
+    setSelectedProviderByTurn((prev) => ({
+      ...prev,
+      ...Object.fromEntries(turns.map((t) => [t.turn_id, pickDefaultProvider(t.responses)])),
+    }));
+  };
+
   const loadSession = async (id: number) => {
     setChatSession(id);
+    setTurnsBefore(null);
     try {
       const res = await apiFetch(`${API_BASE}/api/sessions/${id}`);
       if (res.ok) {
-        const data: ChatTurn[] = await res.json();
-        setChatTurns(data);
-        // Initialize per-turn default provider (summarizer first if available)
-        setSelectedProviderByTurn(
-          Object.fromEntries(
-            data.map((t) => [t.turn_id, pickDefaultProvider(t.responses)])
-          )
-        );
+        const data: TranscriptPage = await res.json();
+        setChatTurns(data.turns);
+        setTurnsBefore(data.next_before);
+        setSelectedProviderByTurn({});
+        rememberDefaultProviders(data.turns);
         // After loading a session, ensure scroll to bottom
         setTimeout(() => bottomRef.current?.scrollIntoView({ behavior: "auto", block: "end" }), 0);
       } else {
@@ -88,6 +107,16 @@ export default function HomeChat() {
     }
   };
 
+  const loadEarlierTurns = async () => {
+    if (chatSession === null || turnsBefore === null) return;
+    const res = await apiFetch(`${API_BASE}/api/sessions/${chatSession}?before=${turnsBefore}`);
+    if (!res.ok) return;
+    const data: TranscriptPage = await res.json();
+    setChatTurns((prev) => [...data.turns, ...prev]);
+    setTurnsBefore(data.next_before);
+    rememberDefaultProviders(data.turns);
+  };
+
   const fetchSummary = async () => {
     if (!prompt.trim()) return;
     if (isSending) return;
@@ -165,14 +194,15 @@ export default function HomeChat() {
             });
             // Refresh sessions list
             try {
-              const sessRes = await apiFetch(`${API_BASE}/api/sessions`);
-              if (sessRes.ok) {
-                const sess = await sessRes.json();
-                setSessions(sess);
-              }
+              await fetchSessions();
             } catch (err) {
               console.error(err);
             }
+          } else if (payload.title) {
+            // Model-written title for a new chat, replacing the placeholder
+            setSessions((prev) =>
+              prev.map((s) => (s.id === payload.session_id ? { ...s, title: payload.title } : s))
+            );
           } else {
             const { provider, chunk } = payload as {
               provider: string;
@@ -256,6 +286,7 @@ export default function HomeChat() {
             onClick={() => {
               setChatSession(null);
               setChatTurns([]);
+              setTurnsBefore(null);
               setPrompt("");
             }}
             title="Start a new chat"
@@ -287,6 +318,14 @@ export default function HomeChat() {
             ))}
           </ul>
         )}
+        {sessionsCursor && (
+          <button
+            className="mt-3 w-full text-xs px-2 py-1 border rounded hover:bg-gray-50"
+            onClick={() => fetchSessions(sessionsCursor).catch(() => { })}
+          >
+            Load more
+          </button>
+        )}
       </aside>
       <main className="flex-1 flex flex-col overflow-y-auto">
         {/* Output panel */}
@@ -296,6 +335,14 @@ export default function HomeChat() {
           {chatTurns.length > 0 ? (
             <div className="mb-6 space-y-3 w-full max-w-none">
               <h2 className="text-lg font-semibold">Chat history</h2>
+              {turnsBefore !== null && (
+                <button
+                  className="text-xs px-2 py-1 border rounded hover:bg-gray-50"
+                  onClick={() => loadEarlierTurns().catch(() => { })}
+                >
+                  Load earlier turns
+                </button>
+              )}
               {chatTurns.map((t, idx) => (
                 <div key={t.turn_id ?? idx} className="border rounded p-3">
                   <div className="text-xs text-gray-500 mb-2">
@@ -0,0 +1,73 @@
+"""Gunicorn settings, picked up from the working directory:
+
+    gunicorn app:app
+    gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+"""
+
+import fcntl
+import os
+import shutil
+import tempfile
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:5050")
+workers = int(os.environ.get("WEB_CONCURRENCY", "2"))
+# Long SSE streams must not trip the worker timeout
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "300"))
+# Workers record metrics in files here, so a scrape of any worker sums them
+# all.  Unless set, each server gets a private directory.
+_OWN_METRICS_DIR = "PROMETHEUS_MULTIPROC_DIR" not in os.environ
+if _OWN_METRICS_DIR:
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="sumlime-metrics-")
+METRICS_DIR = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+_metrics_lock = None
+
+
+def on_starting(server):
+    """Claim the metrics directory and clear a previous run's files.
+
+    A directory another live server holds is refused rather than wiped, as
+    its files are that server's current metrics.
+    """
+    global _metrics_lock
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    lock = open(os.path.join(METRICS_DIR, ".lock"), "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock.close()
+        raise RuntimeError(
+            f"{METRICS_DIR} is in use by another server; "
+            "give each one its own PROMETHEUS_MULTIPROC_DIR"
+        )
+    _metrics_lock = lock
+    for name in os.listdir(METRICS_DIR):
+        if name.endswith(".db"):
+            os.remove(os.path.join(METRICS_DIR, name))
+
+
+def on_exit(server):
+    if _OWN_METRICS_DIR:
+        shutil.rmtree(METRICS_DIR, ignore_errors=True)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
+
+
+def post_worker_init(worker):
+    """Fetch JWKS keys and open upstream connections before taking traffic.
+
+    Only the sync pool is warmed here; under uvicorn workers the async pool
+    is warmed by the app's lifespan hook on the worker's event loop.
+    """
+    from auth import start_jwks_refresh
+    from core.providers.transport import HTTP_WARMUP
+
+    start_jwks_refresh()
+
+    if HTTP_WARMUP:
+        from core.pipeline import warm_up
+
+        warm_up()
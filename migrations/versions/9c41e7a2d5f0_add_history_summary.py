@@ -0,0 +1,30 @@
+"""Add rolling history summary to chat_session
+
+Revision ID: 9c41e7a2d5f0
+Revises: 3b703d5da017
+Create Date: 2026-10-17 10:12:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9c41e7a2d5f0'
+down_revision: Union[str, Sequence[str], None] = '3b703d5da017'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_session', sa.Column('history_summary', sa.Text(), nullable=True))
+    op.add_column('chat_session', sa.Column('history_summary_turn_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_session', 'history_summary_turn_id')
+    op.drop_column('chat_session', 'history_summary')
@@ -0,0 +1,34 @@
+"""Add completed_at to chat_turn
+
+Revision ID: e4a1c7b93d26
+Revises: 9c41e7a2d5f0
+Create Date: 2026-10-18 09:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4a1c7b93d26'
+down_revision: Union[str, Sequence[str], None] = '9c41e7a2d5f0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_turn', sa.Column('completed_at', sa.DateTime(timezone=True), nullable=True))
+    # Existing turns with a summary finished before the marker existed
+    op.execute(
+        "UPDATE chat_turn SET completed_at = created_at WHERE EXISTS ("
+        "SELECT 1 FROM llm_output WHERE llm_output.turn_id = chat_turn.id"
+        " AND llm_output.summarizer_prompt IS NOT NULL)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_turn', 'completed_at')
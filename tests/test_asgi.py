@@ -0,0 +1,87 @@
+import os
+from uuid import uuid4
+
+import pytest
+from starlette.testclient import TestClient
+
+os.environ.setdefault("DEEPSEEK_API_KEY", "test")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import asgi  # noqa: E402
+from app import app as flask_app  # noqa: E402
+from core import pipeline  # noqa: E402
+from core.pipeline import MODEL_PROVIDERS  # noqa: E402
+from core.providers.history import HISTORY_CACHE  # noqa: E402
+from core.providers.models import ChatSession  # noqa: E402
+from db import db  # noqa: E402
+from tests.test_pipeline_stream import DummyProvider  # noqa: E402
+
+USER = uuid4()
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    monkeypatch.setattr(asgi, "authenticate_token", lambda token: USER)
+    monkeypatch.setattr(asgi, "ensure_profile_exists", lambda user_id: None)
+    orig = MODEL_PROVIDERS.copy()
+    MODEL_PROVIDERS.clear()
+    MODEL_PROVIDERS.update({"dummy": DummyProvider("dummy", ["a"])})
+    with flask_app.app_context():
+        db.create_all()
+        session = ChatSession(title="chat", user_id=USER)  # type: ignore[arg-type]
+        db.session.add(session)
+        db.session.commit()
+        session_id = session.id
+    # Starlette's client drives the app on its own thread and loop
+    with TestClient(asgi.app) as client:
+        yield client, session_id
+    with flask_app.app_context():
+        db.drop_all()
+    MODEL_PROVIDERS.clear()
+    MODEL_PROVIDERS.update(orig)
+    HISTORY_CACHE.clear()
+
+
+def post(client, headers=None, **kwargs):
+    headers = {"Authorization": "Bearer t", **(headers or {})}
+    return client.post("/api/summarize", headers=headers, **kwargs)
+
+
+def test_rls_claims_cover_the_turn_transaction(client, monkeypatch):
+    client, session_id = client
+    seen = []
+
+    def set_rls_claims(user_id):
+        db.session.execute(db.select(1))  # opens the transaction
+        seen.append(("claims", user_id, db.session().get_transaction()))
+
+    open_turn = pipeline._open_turn_committed
+
+    def open_turn_committed(*args):
+        seen.append(("turn", None, db.session().get_transaction()))
+        return open_turn(*args)
+
+    monkeypatch.setattr(asgi, "set_rls_claims", set_rls_claims)
+    monkeypatch.setattr(pipeline, "_open_turn_committed", open_turn_committed)
+    res = post(
+        client,
+        json={
+            "prompt": "hi",
+            "models": ["dummy"],
+            "summary_model": "dummy",
+            "chatSession": session_id,
+        },
+    )
+    assert b'"final"' in res.content
+    (_, user_id, claims_tx), (_, _, turn_tx) = seen
+    assert user_id == USER and claims_tx is not None and turn_tx is claims_tx
+
+
+@pytest.mark.parametrize("body", [b"{not json", b"[1, 2]"])
+def test_invalid_json_is_a_bad_request(client, body):
+    client, _ = client
+    res = post(client, content=body, headers={"Content-Type": "application/json"})
+    assert res.status_code == 400
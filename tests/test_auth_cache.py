@@ -0,0 +1,150 @@
+import os
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+
+import auth  # noqa: E402
+from auth import JWKSCache, VerifiedTokenCache  # noqa: E402
+
+PRIVATE_KEY = ec.generate_private_key(ec.SECP256R1())
+
+
+def make_token(kid: str = "k1", exp_in: int = 3600, sub: str = "user") -> str:
+    now = int(time.time())
+    return jwt.encode(
+        {
+            "sub": sub,
+            "aud": "authenticated",
+            "iss": f"{auth.SUPABASE_URL}/auth/v1",
+            "iat": now,
+            "exp": now + exp_in,
+        },
+        PRIVATE_KEY,
+        algorithm="ES256",
+        headers={"kid": kid},
+    )
+
+
+@pytest.fixture()
+def jwks(monkeypatch):
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        return {"k1": PRIVATE_KEY.public_key()}
+
+    cache = JWKSCache(fetch)
+    cache.fetches = fetches  # type: ignore[attr-defined]
+    monkeypatch.setattr(auth, "_jwks", cache)
+    monkeypatch.setattr(auth, "_verified", VerifiedTokenCache(maxsize=2))
+    return cache
+
+
+def test_verified_claims_are_cached_until_exp(jwks, monkeypatch):
+    calls = []
+    verify = auth._verify_supabase_jwt
+
+    def counting_verify(token):
+        calls.append(token)
+        return verify(token)
+
+    monkeypatch.setattr(auth, "_verify_supabase_jwt", counting_verify)
+    token = make_token()
+    assert auth.authenticate_token(token) == "user"
+    assert auth.authenticate_token(token) == "user"
+    assert len(calls) == 1
+
+    cache = auth._verified
+    digest = next(iter(cache._entries))
+    cache._entries[digest] = dict(cache._entries[digest], exp=time.time() - 1)
+    assert auth.authenticate_token(token) == "user"
+    assert len(calls) == 2
+
+
+def test_cache_is_bounded(jwks):
+    for sub in ("a", "b", "c"):
+        assert auth.authenticate_token(make_token(sub=sub)) == sub
+    assert len(auth._verified._entries) == 2
+
+
+def test_invalid_tokens_are_not_cached(jwks):
+    token = make_token()
+    assert auth.authenticate_token(token[:-4] + "AAAA") is None
+    assert len(auth._verified._entries) == 0
+
+
+def test_rotated_key_is_fetched_on_first_use(monkeypatch):
+    now = [0.0]
+    published = {"k1": PRIVATE_KEY.public_key()}
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        return dict(published)
+
+    cache = JWKSCache(fetch, clock=lambda: now[0])
+    monkeypatch.setattr(auth, "_jwks", cache)
+    monkeypatch.setattr(auth, "_verified", VerifiedTokenCache())
+    cache.refresh()
+
+    # Supabase rotates its key after the last routine refresh
+    published["k2"] = PRIVATE_KEY.public_key()
+    now[0] = 100
+    assert auth.authenticate_token(make_token(kid="k2", sub="a")) == "a"
+    assert len(fetches) == 2
+
+
+def test_unknown_kids_refetch_at_most_once_per_interval(jwks):
+    jwks.refresh()
+    for kid in ("x1", "x2", "x3"):
+        assert auth.authenticate_token(make_token(kid=kid)) is None
+    assert len(jwks.fetches) == 1  # the refresh above is recent enough
+
+
+def test_refresher_prefetches_in_background(jwks):
+    jwks.start()
+    assert jwks.loaded.wait(2)
+    assert auth.authenticate_token(make_token()) == "user"
+
+
+@pytest.fixture()
+def profiles_db():
+    from flask import Flask
+    from db import db
+
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        auth._known_profiles.clear()
+        yield db
+        db.drop_all()
+        auth._known_profiles.clear()
+
+
+def test_profile_upsert_is_idempotent_and_skipped_once_known(profiles_db):
+    from sqlalchemy import event
+
+    user_id = "5fb410e5-25f5-4fa9-b5b8-b325780ff317"
+    auth.ensure_profile_exists(user_id)
+    auth._known_profiles.clear()  # e.g. another worker
+    auth.ensure_profile_exists(user_id)
+    assert profiles_db.session.query(auth.Profile).count() == 1
+
+    statements = []
+
+    def record(*args):
+        statements.append(args)
+
+    event.listen(profiles_db.engine, "before_cursor_execute", record)
+    try:
+        auth.ensure_profile_exists(user_id)
+    finally:
+        event.remove(profiles_db.engine, "before_cursor_execute", record)
+    assert statements == []
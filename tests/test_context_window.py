@@ -0,0 +1,105 @@
+import pytest
+from flask import Flask
+from uuid import uuid4
+
+from core.providers import context
+from core.providers.context import (
+    estimate_tokens,
+    fit_history,
+    maybe_compact,
+    window_turns,
+)
+from core.providers.history import (
+    HISTORY_CACHE,
+    ChatHistory,
+    HistoryOutput,
+    HistoryTurn,
+)
+from core.providers.models import ChatSession, ChatTurn
+from db import db
+
+
+def fmt(user_text: str, content: str | None) -> list[dict]:
+    items = [{"role": "user", "content": user_text}]
+    if content:
+        items.append({"role": "assistant", "content": content})
+    return items
+
+
+def turn(turn_id: int, prompt: str, answer: str) -> HistoryTurn:
+    return HistoryTurn(
+        turn_id,
+        prompt,
+        (HistoryOutput("p", None, answer), HistoryOutput("p", "s" + prompt, answer)),
+    )
+
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 0
+    assert estimate_tokens("abcd" * 10) == 10
+    assert estimate_tokens("你好") == 2
+
+
+def test_fit_history_drops_oldest_turns():
+    history = ChatHistory((turn(1, "a" * 40, "b" * 40), turn(2, "c" * 4, "d" * 4)))
+    # 20 tokens for turn 1, 2 for turn 2
+    assert fit_history(history, "p", False, fmt, 21) == fmt("cccc", "dddd")
+    assert len(fit_history(history, "p", False, fmt, 22)) == 4
+    assert fit_history(history, "p", False, fmt, 1) == []
+
+
+def test_fit_history_keeps_summary_in_front():
+    history = ChatHistory((turn(5, "q", "a"),), summary="earlier", summary_turn_id=4)
+    items = fit_history(history, "p", False, fmt, 100)
+    assert items[0]["content"].endswith("earlier")
+    assert items[1:] == fmt("q", "a")
+
+
+@pytest.fixture()
+def chat():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        session = ChatSession(title="chat", user_id=uuid4())  # type: ignore[arg-type]
+        db.session.add(session)
+        db.session.commit()
+        yield session.id
+        db.drop_all()
+        HISTORY_CACHE.clear()
+
+
+def test_maybe_compact_stores_rolling_summary(chat, monkeypatch):
+    monkeypatch.setattr(context, "COMPACT_AFTER_TOKENS", 10)
+    monkeypatch.setattr(context, "COMPACT_KEEP_TURNS", 1)
+    ids = []
+    for prompt in ("one", "two", "three"):
+        t = ChatTurn(session_id=chat, prompt=prompt)  # type: ignore[arg-type]
+        db.session.add(t)
+        db.session.commit()
+        ids.append(t.id)
+    history = ChatHistory(tuple(turn(i, "x" * 40, "y" * 40) for i in ids))
+    HISTORY_CACHE.load(chat, ids[-1] + 1)
+
+    transcripts: list[str] = []
+    maybe_compact(chat, history, lambda text: transcripts.append(text) or "the gist")
+
+    assert transcripts and transcripts[0].count("User: ") == 2
+    session = db.session.get(ChatSession, chat)
+    assert (session.history_summary, session.history_summary_turn_id) == ("the gist", ids[1])
+
+    loaded = HISTORY_CACHE.load(chat, ids[-1] + 1)
+    assert loaded.summary == "the gist"
+    assert [t.id for t in loaded.turns] == [ids[2]]
+
+
+def test_window_start_only_moves_on_overflow():
+    # 10 tokens per turn, 50-token budget: trims to 25 when it overflows
+    turns = [turn(i, "a" * 20, "b" * 20) for i in range(1, 12)]
+    starts = []
+    for n in range(1, len(turns) + 1):
+        _, kept = window_turns(ChatHistory(tuple(turns[:n])), "p", False, fmt, 50)
+        starts.append(n - len(kept))
+    assert starts == [0, 0, 0, 0, 0, 4, 4, 4, 4, 8, 8]
@@ -0,0 +1,148 @@
+from datetime import datetime, timezone
+
+import pytest
+from flask import Flask
+from sqlalchemy import event
+from uuid import uuid4
+
+from core.providers.history import HistoryCache, HistoryOutput, HistoryTurn
+from core.providers.models import ChatSession, ChatTurn, LLMOutput
+from db import db
+
+
+def fmt(user_text: str, content: str | None) -> list[dict]:
+    items = [{"role": "user", "content": user_text}]
+    if content:
+        items.append({"role": "assistant", "content": content})
+    return items
+
+
+@pytest.fixture()
+def chat():
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite://"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        session = ChatSession(title="chat", user_id=uuid4())  # type: ignore[arg-type]
+        db.session.add(session)
+        db.session.commit()
+        yield session.id
+        db.drop_all()
+
+
+def add_turn(session_id: int, prompt: str, *outputs: tuple[str, str | None, str]) -> int:
+    """A turn with ``outputs``, complete if it has any."""
+    turn = ChatTurn(session_id=session_id, prompt=prompt)  # type: ignore[arg-type]
+    db.session.add(turn)
+    db.session.flush()
+    for provider, summarizer_prompt, content in outputs:
+        add_output(turn.id, provider, summarizer_prompt, content)
+    if outputs:
+        complete(turn.id)
+    db.session.commit()
+    return turn.id
+
+
+def complete(turn_id: int):
+    db.session.get(ChatTurn, turn_id).completed_at = datetime.now(timezone.utc)  # type: ignore[union-attr]
+    db.session.commit()
+
+
+def add_output(turn_id: int, provider: str, summarizer_prompt: str | None, content: str):
+    db.session.add(
+        LLMOutput(
+            turn_id=turn_id,  # type: ignore[arg-type]
+            provider=provider,  # type: ignore[arg-type]
+            summarizer_prompt=summarizer_prompt,  # type: ignore[arg-type]
+            content=content,  # type: ignore[arg-type]
+        )
+    )
+    db.session.commit()
+
+
+@pytest.fixture()
+def selects(chat):
+    counter = {"n": 0}
+
+    def before(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("SELECT"):
+            counter["n"] += 1
+
+    event.listen(db.engine, "before_cursor_execute", before)
+    return counter
+
+
+def test_project_picks_provider_and_mode(chat):
+    cache = HistoryCache()
+    add_turn(chat, "q1", ("p", None, "a1"), ("p", "sq1", "s1"), ("other", None, "o1"))
+    current = add_turn(chat, "q2")
+
+    history = cache.load(chat, current)
+    assert history.project("p", False, fmt) == fmt("q1", "a1")
+    assert history.project("p", True, fmt) == fmt("sq1", "s1")
+    assert history.project("other", True, fmt) == fmt("q1", None)
+
+
+def test_load_reads_only_new_turns(chat, selects):
+    cache = HistoryCache()
+    add_turn(chat, "q1", ("p", None, "a1"), ("p", "sq1", "s1"))
+    current = add_turn(chat, "q2")
+
+    selects["n"] = 0
+    assert cache.load(chat, current).project("p", False, fmt) == fmt("q1", "a1")
+    assert selects["n"] == 1  # turns and outputs in one joined query
+
+    cache.record(
+        chat,
+        HistoryTurn(current, "q2", (HistoryOutput("p", None, "a2"), HistoryOutput("p", "sq2", "s2"))),
+    )
+    nxt = add_turn(chat, "q3")
+    selects["n"] = 0
+    history = cache.load(chat, nxt)
+    assert history.project("p", False, fmt) == fmt("q1", "a1") + fmt("q2", "a2")
+    assert selects["n"] == 1  # only the (empty) "newer turns" probe
+
+
+def test_unsettled_trailing_turn_is_not_cached(chat):
+    cache = HistoryCache()
+    add_turn(chat, "q1", ("p", None, "a1"), ("p", "sq1", "s1"))
+    pending = add_turn(chat, "q2")  # e.g. still streaming in another tab
+    current = add_turn(chat, "q3")
+
+    history = cache.load(chat, current)
+    assert history.project("p", False, fmt) == fmt("q1", "a1") + fmt("q2", None)
+    # The entry is behind, so recording the current turn must not skip q2
+    cache.record(chat, HistoryTurn(current, "q3", (HistoryOutput("p", "sq3", "s3"),)))
+
+    add_output(pending, "p", None, "a2")
+    add_output(pending, "p", "sq2", "s2")
+    complete(pending)
+    nxt = add_turn(chat, "q4")
+    history = cache.load(chat, nxt)
+    assert history.project("p", False, fmt) == fmt("q1", "a1") + fmt("q2", "a2") + fmt("q3", None)
+
+
+def test_progressive_draft_does_not_settle_a_turn(chat):
+    cache = HistoryCache()
+    add_turn(chat, "q1", ("p", None, "a1"), ("p", "sq1", "s1"))
+    pending = add_turn(chat, "q2")
+    # Another worker's progressive turn: the draft summary is stored before
+    # the straggler's output
+    add_output(pending, "fast", None, "f2")
+    add_output(pending, "p", "sq2", "draft")
+    cache.load(chat, add_turn(chat, "q3"))
+
+    add_output(pending, "slow", None, "late")
+    complete(pending)
+    history = cache.load(chat, add_turn(chat, "q4"))
+    assert history.project("slow", False, fmt) == fmt("q1", None) + fmt("q2", "late") + fmt("q3", None)
+
+
+def test_lru_bound(chat):
+    cache = HistoryCache(maxsize=1)
+    current = add_turn(chat, "q1")
+    cache.load(chat, current)
+    cache.load(chat + 1, current)
+    assert list(cache._entries) == [chat + 1]
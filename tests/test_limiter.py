@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from core.providers.limiter import AIMDLimiter, LimiterRejected, is_overload
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+RATE_LIMITED = SimpleNamespace(status_code=429)
+
+
+def test_overload_statuses():
+    assert is_overload(RATE_LIMITED)
+    assert is_overload(SimpleNamespace(code=503))  # google-genai errors
+    assert not is_overload(SimpleNamespace(status_code=500))
+    assert not is_overload(ValueError())
+
+
+def test_limit_halves_on_overload_and_creeps_back_on_success():
+    clock = FakeClock()
+    limiter = AIMDLimiter("fake", initial=8, max_limit=9, clock=clock)
+
+    limiter.acquire()
+    limiter.release(RATE_LIMITED)  # type: ignore[arg-type]
+    assert limiter.limit == 4
+    limiter.observe(RATE_LIMITED)  # type: ignore[arg-type]  # same burst
+    assert limiter.limit == 4
+    clock.now = 2
+    limiter.observe(RATE_LIMITED)  # type: ignore[arg-type]
+    assert limiter.limit == 2
+
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release()
+    assert 6 < limiter.limit < 7
+    for _ in range(100):
+        limiter.acquire()
+        limiter.release()
+    assert limiter.limit == 9
+    assert limiter.snapshot()["overloads"] == 3
+
+
+def test_callers_queue_for_a_slot_with_a_bound_and_a_timeout():
+    limiter = AIMDLimiter("fake", initial=1, max_limit=1, max_queue=1)
+    limiter.acquire()
+
+    got = threading.Event()
+
+    def waiter():
+        limiter.acquire(timeout=5)
+        got.set()
+
+    threading.Thread(target=waiter, daemon=True).start()
+    while limiter.waiting == 0:
+        time.sleep(0.001)
+    with pytest.raises(LimiterRejected, match="queue full"):
+        limiter.acquire()
+
+    limiter.release()
+    assert got.wait(2)
+    with pytest.raises(LimiterRejected, match="timed out"):
+        limiter.acquire(timeout=0.05)
+    assert limiter.snapshot()["rejected"] == 2
+
+
+def test_async_waiters_get_freed_slots():
+    limiter = AIMDLimiter("fake", initial=1, max_limit=1)
+
+    async def main():
+        await limiter.aacquire()
+        waiter = asyncio.ensure_future(limiter.aacquire(timeout=2))
+        await asyncio.sleep(0.05)
+        assert not waiter.done() and limiter.waiting == 1
+        limiter.release()
+        await waiter
+        assert (limiter.inflight, limiter.waiting) == (1, 0)
+        with pytest.raises(LimiterRejected):
+            await limiter.aacquire(timeout=0.05)
+
+    asyncio.run(main())
+
+
+def test_try_acquire_never_waits():
+    limiter = AIMDLimiter("fake", initial=1, max_limit=1)
+    assert limiter.try_acquire()
+    assert not limiter.try_acquire()
+    assert limiter.snapshot()["waiting"] == limiter.snapshot()["rejected"] == 0
+    limiter.release()
+    assert limiter.try_acquire()
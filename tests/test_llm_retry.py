@@ -2,6 +2,7 @@
 import pytest
 import requests
 import httpx
+from google.genai.errors import ClientError, ServerError
 
 from core.providers.base import llm_retry, is_retryable_llm
 
@@ -9,7 +10,7 @@ from core.providers.base import llm_retry, is_retryable_llm
 from openai import APIConnectionError, APITimeoutError, RateLimitError, APIStatusError
 
 
-RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504}
+RETRYABLE_STATUSES = {408, 429, 500, 502, 503, 504, 529}
 
 
 class DummyStatusError(APIStatusError):
@@ -61,6 +62,11 @@ class DummyStatusError(APIStatusError):
             body=None,
         ),
         *[DummyStatusError(s) for s in RETRYABLE_STATUSES],
+        # Gemini (google-genai) and its httpx transport
+        ServerError(503, {"error": {"status": "UNAVAILABLE"}}),
+        ClientError(429, {"error": {"status": "RESOURCE_EXHAUSTED"}}),
+        httpx.ConnectError("refused"),
+        httpx.ReadTimeout("slow"),
     ],
 )
 def test_is_retryable_llm_true(exc):
@@ -74,6 +80,7 @@ def test_is_retryable_llm_true(exc):
         RuntimeError("not retryable"),
         DummyStatusError(418),  # not in RETRYABLE_STATUSES
         DummyStatusError(404),  # not in RETRYABLE_STATUSES
+        ClientError(400, {"error": {"status": "INVALID_ARGUMENT"}}),
     ],
 )
 def test_is_retryable_llm_false(exc):
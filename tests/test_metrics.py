@@ -0,0 +1,152 @@
+import os
+from uuid import uuid4
+
+import pytest
+import requests
+from prometheus_client import REGISTRY
+
+os.environ.setdefault("DEEPSEEK_API_KEY", "test")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import auth  # noqa: E402
+from app import app  # noqa: E402
+from core import metrics  # noqa: E402
+from core.pipeline import MODEL_PROVIDERS  # noqa: E402
+from core.providers.base import llm_retry  # noqa: E402
+from core.providers.models import ChatSession  # noqa: E402
+from core.providers.resilience import CircuitBreaker, ProviderGuard  # noqa: E402
+from db import db  # noqa: E402
+from tests.test_pipeline_stream import DummyProvider  # noqa: E402
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_guard_records_ttft_duration_chunks_and_failures():
+    name = f"m-{uuid4().hex[:8]}"
+    guard = ProviderGuard(name)
+    assert list(guard.stream(lambda: iter(["a", "b", "c"]))) == ["a", "b", "c"]
+
+    assert sample("sumlime_provider_ttft_seconds_count", provider=name) == 1
+    assert sample("sumlime_provider_stream_seconds_count", provider=name) == 1
+    assert sample("sumlime_provider_chunks_per_second_count", provider=name) == 1
+    assert sample("sumlime_provider_chunks_total", provider=name) == 3
+
+    def down():
+        raise requests.ConnectionError("reset")
+        yield
+
+    with pytest.raises(requests.ConnectionError):
+        list(guard.stream(down))
+    failures = "sumlime_provider_failures_total"
+    assert sample(failures, provider=name, exception="ConnectionError", retryable="true") == 1
+    # Failed streams have no duration or rate
+    assert sample("sumlime_provider_stream_seconds_count", provider=name) == 1
+
+
+def test_open_circuit_counts_as_failure():
+    name = f"m-{uuid4().hex[:8]}"
+    guard = ProviderGuard(name, breaker=CircuitBreaker(failures=1))
+    guard.breaker.record_failure()
+    with pytest.raises(Exception):
+        list(guard.stream(lambda: iter(["x"])))
+    failures = "sumlime_provider_failures_total"
+    assert sample(failures, provider=name, exception="CircuitOpenError", retryable="false") == 1
+
+
+def test_breaker_state_trips_and_rejections_are_exported():
+    name = f"m-{uuid4().hex[:8]}"
+    guard = ProviderGuard(name, breaker=CircuitBreaker(failures=1, reset_after=60))
+    state = "sumlime_provider_breaker_state"
+    assert sample(state, provider=name, state="closed") == 1
+
+    def down():
+        raise requests.ConnectionError("reset")
+        yield
+
+    with pytest.raises(requests.ConnectionError):
+        list(guard.stream(down))
+    with pytest.raises(Exception):
+        list(guard.stream(down))
+    assert sample(state, provider=name, state="open") == 1
+    assert sample(state, provider=name, state="closed") == 0
+    assert sample("sumlime_provider_breaker_trips_total", provider=name) == 1
+    assert sample("sumlime_provider_breaker_rejected_total", provider=name) == 1
+
+
+def test_retries_are_counted_by_exception_class():
+    name = f"m-{uuid4().hex[:8]}"
+    guard = ProviderGuard(name)
+    calls = []
+
+    @llm_retry(max_attempts=3, initial=0, max_wait=0, on_retry=guard.retrying)
+    def create():
+        calls.append(1)
+        if len(calls) < 3:
+            raise requests.Timeout("slow")
+        return iter(["ok"])
+
+    assert list(guard.stream(create)) == ["ok"]
+    assert sample("sumlime_provider_retries_total", provider=name, exception="Timeout") == 2
+
+
+@pytest.fixture()
+def api(monkeypatch):
+    """A test client and a chat session of its (stubbed) user."""
+    user = uuid4()
+    monkeypatch.setattr(auth, "authenticate_token", lambda token: user)
+    monkeypatch.setattr(auth, "ensure_profile_exists", lambda user_id: None)
+    monkeypatch.setattr(auth, "set_rls_claims", lambda user_id: None)
+    orig = MODEL_PROVIDERS.copy()
+    MODEL_PROVIDERS.clear()
+    MODEL_PROVIDERS.update(
+        {"dummy": DummyProvider("dummy", ["a", "b"]), "gemini": DummyProvider("gemini", ["s"])}
+    )
+    with app.app_context():
+        db.create_all()
+        session = ChatSession(title="chat", user_id=user)  # type: ignore[arg-type]
+        db.session.add(session)
+        db.session.commit()
+        try:
+            yield app.test_client(), session.id
+        finally:
+            db.drop_all()
+            MODEL_PROVIDERS.clear()
+            MODEL_PROVIDERS.update(orig)
+
+
+def test_streamed_request_records_db_time_and_summarizer(api):
+    client, session_id = api
+    db_count = "sumlime_request_db_seconds_count"
+    before = sample(db_count, endpoint="summarize_prompts")
+    summaries = sample("sumlime_summarizer_seconds_count", kind="summary")
+
+    res = client.post(
+        "/api/summarize",
+        json={"prompt": "hi", "models": ["dummy"], "chatSession": session_id},
+        headers={"Authorization": "Bearer t"},
+    )
+    assert b'"final"' in res.get_data()
+
+    assert sample(db_count, endpoint="summarize_prompts") == before + 1
+    assert sample("sumlime_request_db_seconds_sum", endpoint="summarize_prompts") > 0
+    assert sample("sumlime_summarizer_seconds_count", kind="summary") == summaries + 1
+
+
+def test_metrics_endpoint_is_opt_in_and_token_protected(api, monkeypatch):
+    client, _ = api
+    assert client.get("/metrics").status_code == 404
+
+    monkeypatch.setattr(metrics, "METRICS_ENABLED", True)
+    res = client.get("/metrics")
+    assert res.status_code == 200
+    assert b"sumlime_provider_ttft_seconds" in res.data
+
+    monkeypatch.setattr(metrics, "METRICS_TOKEN", "secret")
+    assert client.get("/metrics").status_code == 401
+    ok = client.get("/metrics", headers={"Authorization": "Bearer secret"})
+    assert ok.status_code == 200
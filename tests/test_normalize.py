@@ -0,0 +1,44 @@
+import asyncio
+import itertools
+
+import pytest
+
+from core.providers.normalize import anormalize_stream, build, normalize, normalize_stream
+
+TEXT = "Euler: \\(e^{i\\pi} + 1 = 0\\)\r\nBlock:\r\\[\\int_0^1 x\\,dx\\]\r\n\\\\(escaped)"
+EXPECTED = "Euler: $e^{i\\pi} + 1 = 0$\nBlock:\n$$\\int_0^1 x\\,dx$$\n\\$escaped)"
+
+
+def test_whole_text():
+    assert normalize(TEXT) == EXPECTED
+    assert normalize(TEXT, "") == TEXT
+
+
+def test_every_two_way_split_matches_the_whole_text():
+    for i in range(len(TEXT) + 1):
+        assert "".join(normalize_stream([TEXT[:i], TEXT[i:]])) == EXPECTED, i
+
+
+def test_single_character_chunks():
+    assert "".join(normalize_stream(TEXT)) == EXPECTED
+
+
+def test_held_suffix_is_flushed_through_later_stages():
+    assert list(normalize_stream(["a\r", "\n", "b\\"])) == ["a", "\n", "b", "\\"]
+    assert list(normalize_stream(["x\\\r"], "latex,newlines")) == ["x\\", "\n"]
+
+
+def test_async_stream():
+    async def chunks():
+        for piece in ["\\", "(x", "\\", ")"]:
+            yield piece
+
+    async def collect():
+        return "".join([c async for c in anormalize_stream(chunks())])
+
+    assert asyncio.run(collect()) == "$x$"
+
+
+def test_unknown_transform():
+    with pytest.raises(ValueError, match="bogus"):
+        build("latex,bogus")
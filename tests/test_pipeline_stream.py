@@ -1,4 +1,6 @@
+import asyncio
 import os
+import threading
 import pytest
 from flask import Flask, g
 from uuid import uuid4
@@ -8,9 +10,13 @@ from typing import Iterator
 os.environ.setdefault("DEEPSEEK_API_KEY", "test")
 os.environ.setdefault("GEMINI_API_KEY", "test")
 
-from core.pipeline import summarize, MODEL_PROVIDERS
-from core.providers.base import LLMProvider
-from core.providers.models import ChatSession, LLMOutput
+from core.pipeline import asummarize, summarize, MODEL_PROVIDERS
+from sqlalchemy import event
+
+from core.providers.base import LLMProvider, persist_output
+from core.providers.history import HISTORY_CACHE, ChatHistory
+from core.providers.models import ChatSession, ChatTurn, LLMOutput
+from core.providers.write_behind import current_batch
 from db import db
 
 
@@ -28,6 +34,7 @@ class DummyProvider(LLMProvider):
         chat_session: int,
         is_summarizing: bool = False,
         system_message: str = "",
+        history: ChatHistory | None = None,
     ) -> Iterator[str]:
         parts: list[str] = []
         for c in self.chunks:
@@ -54,6 +61,7 @@ def app_ctx():
         g.user_id = uuid4()
         yield
         db.drop_all()
+        HISTORY_CACHE.clear()  # session ids restart with every database
 
 
 def test_summarize_yields_chunks_incrementally(app_ctx):
@@ -104,3 +112,494 @@ def test_summarize_yields_chunks_incrementally(app_ctx):
         MODEL_PROVIDERS.clear()
         MODEL_PROVIDERS.update(orig)
 
+
+
+class BarrierProvider(DummyProvider):
+    """Provider that only proceeds once every sibling has started."""
+
+    def __init__(self, name: str, chunks: list[str], barrier: threading.Barrier):
+        super().__init__(name, chunks)
+        self.barrier = barrier
+
+    def query(self, *args, **kwargs) -> Iterator[str]:
+        self.barrier.wait()
+        yield from super().query(*args, **kwargs)
+
+
+@pytest.fixture()
+def file_app_ctx(tmp_path):
+    # Concurrent workers use separate connections, so use an on-disk database
+    app = Flask(__name__)
+    app.config["SQLALCHEMY_DATABASE_URI"] = f"sqlite:///{tmp_path / 'chat.db'}"
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    db.init_app(app)
+    with app.app_context():
+        db.create_all()
+        g.user_id = uuid4()
+        yield
+        db.drop_all()
+        HISTORY_CACHE.clear()  # session ids restart with every database
+
+
+def test_summarize_concurrent_fan_out(file_app_ctx):
+    session = ChatSession(title="chat", user_id=g.user_id)  # type: ignore[arg-type]
+    db.session.add(session)
+    db.session.commit()
+
+    # Neither provider can finish unless both run at the same time
+    barrier = threading.Barrier(2, timeout=5)
+    orig = MODEL_PROVIDERS.copy()
+    MODEL_PROVIDERS.clear()
+    MODEL_PROVIDERS.update(
+        {
+            "one": BarrierProvider("one", ["a", "b"], barrier),
+            "two": BarrierProvider("two", ["c", "d"], barrier),
+            "summary": DummyProvider("summary", ["x"]),
+        }
+    )
+
+    try:
+        gen = summarize(
+            "hello",
+            ["one", "two"],
+            chat_session=session.id,
+            summary_model="summary",
+            concurrent=True,
+        )
+        chunks: list[dict] = []
+        while True:
+            try:
+                chunks.append(next(gen))
+            except StopIteration as stop:
+                final = stop.value
+                break
+
+        by_provider = lambda p: [c["chunk"] for c in chunks if c["provider"] == p]
+        assert by_provider("one") == ["a", "b"]
+        assert by_provider("two") == ["c", "d"]
+        assert chunks[-1] == {"provider": "summarizer", "chunk": "x"}
+        assert final["results"] == {"one": "ab", "two": "cd", "summarizer": "x"}
+
+        outputs = db.session.execute(db.select(LLMOutput)).scalars().all()
+        assert {o.provider for o in outputs} == {"one", "two", "summary"}
+    finally:
+        MODEL_PROVIDERS.clear()
+        MODEL_PROVIDERS.update(orig)
+
+
+class GatedProvider(DummyProvider):
+    """Provider that waits for ``gate`` before streaming."""
+
+    def __init__(self, name: str, chunks: list[str], gate: threading.Event):
+        super().__init__(name, chunks)
+        self.gate = gate
+
+    def query(self, *args, **kwargs) -> Iterator[str]:
+        assert self.gate.wait(timeout=5)
+        yield from super().query(*args, **kwargs)
+
+
+class SignallingProvider(DummyProvider):
+    """Provider that sets ``started`` whenever it is queried."""
+
+    def __init__(self, name: str, chunks: list[str], started: threading.Event):
+        super().__init__(name, chunks)
+        self.started = started
+        self.prompts: list[str] = []
+
+    def query(self, prompt, *args, **kwargs) -> Iterator[str]:
+        self.prompts.append(prompt)
+        self.started.set()
+        yield from super().query(prompt, *args, **kwargs)
+
+
+def test_summarize_progressive_summary(file_app_ctx):
+    session = ChatSession(title="chat", user_id=g.user_id)  # type: ignore[arg-type]
+    db.session.add(session)
+    db.session.commit()
+
+    # The slow provider can only finish after the summarizer has started
+    summary_started = threading.Event()
+    summary = SignallingProvider("summary", ["x"], summary_started)
+    orig = MODEL_PROVIDERS.copy()
+    MODEL_PROVIDERS.clear()
+    MODEL_PROVIDERS.update(
+        {
+            "fast": DummyProvider("fast", ["a"]),
+            "slow": GatedProvider("slow", ["b"], summary_started),
+            "summary": summary,
+        }
+    )
+
+    try:
+        gen = summarize(
+            "hello",
+            ["fast", "slow"],
+            chat_session=session.id,
+            summary_model="summary",
+            summary_after=1,
+        )
+        chunks: list[dict] = []
+        while True:
+            try:
+                chunks.append(next(gen))
+            except StopIteration as stop:
+                final = stop.value
+                break
+
+        assert chunks[0] == {"provider": "fast", "chunk": "a"}
+        assert {"provider": "slow", "chunk": "b"} in chunks
+        assert final["results"]["summarizer"] == "x\n\nx"
+        # Draft only saw the fast response; the addendum covers the slow one
+        assert "LLM 1:\na" in summary.prompts[0] and "LLM 2" not in summary.prompts[0]
+        assert "LLM 2:\nb" in summary.prompts[1]
+
+        rows = (
+            db.session.execute(db.select(LLMOutput).filter_by(provider="summary"))
+            .scalars()
+            .all()
+        )
+        assert [r.content for r in rows] == ["x\n\nx"]
+        assert db.session.get(ChatTurn, final["turn_id"]).completed_at is not None
+    finally:
+        MODEL_PROVIDERS.clear()
+        MODEL_PROVIDERS.update(orig)
+
+
+def test_asummarize_streams_via_aquery(file_app_ctx):
+    session = ChatSession(title="chat", user_id=g.user_id)  # type: ignore[arg-type]
+    db.session.add(session)
+    db.session.commit()
+    session_id = session.id
+
+    barrier = threading.Barrier(2, timeout=5)
+    orig = MODEL_PROVIDERS.copy()
+    MODEL_PROVIDERS.clear()
+    MODEL_PROVIDERS.update(
+        {
+            "one": BarrierProvider("one", ["a", "b"], barrier),
+            "two": BarrierProvider("two", ["c"], barrier),
+            "summary": DummyProvider("summary", ["x"]),
+        }
+    )
+
+    async def collect():
+        return [
+            event
+            async for event in asummarize(
+                "hello", ["one", "two"], chat_session=session_id, summary_model="summary"
+            )
+        ]
+
+    try:
+        events = asyncio.run(collect())
+        final = events.pop()["final"]
+
+        assert [e["chunk"] for e in events if e["provider"] == "one"] == ["a", "b"]
+        assert events[-1] == {"provider": "summarizer", "chunk": "x"}
+        assert final["results"] == {"one": "ab", "two": "c", "summarizer": "x"}
+        assert final["session_id"] == session_id
+
+        outputs = db.session.execute(db.select(LLMOutput)).scalars().all()
+        assert {o.provider for o in outputs} == {"one", "two", "summary"}
+    finally:
+        MODEL_PROVIDERS.clear()
+        MODEL_PROVIDERS.update(orig)
+
+
+class HistoryRecordingProvider(DummyProvider):
+    """Provider that remembers the history snapshot of every call."""
+
+    def __init__(self, name: str, chunks: list[str], seen: list):
+        super().__init__(name, chunks)
+        self.seen = seen
+
+    def query(self, *args, history=None, **kwargs) -> Iterator[str]:
+        self.seen.append(history)
+        yield from super().query(*args, **kwargs)
+
+
+def test_summarize_shares_one_history_snapshot(app_ctx):
+    session = ChatSession(title="chat", user_id=g.user_id)  # type: ignore[arg-type]
+    db.session.add(session)
+    db.session.commit()
+
+    seen: list = []
+    orig = MODEL_PROVIDERS.copy()
+    MODEL_PROVIDERS.clear()
+    MODEL_PROVIDERS.update(
+        {
+            "one": HistoryRecordingProvider("one", ["a"], seen),
+            "two": HistoryRecordingProvider("two", ["b"], seen),
+            "summary": HistoryRecordingProvider("summary", ["x"], seen),
+        }
+    )
+
+    try:
+        for prompt in ("first", "second"):
+            for _ in summarize(
+                prompt, ["one", "two"], chat_session=session.id, summary_model="summary"
+            ):
+                pass
+
+        second = seen[3:]
+        assert len(second) == 3 and all(h is second[0] for h in second)
+        [turn] = second[0].turns
+        assert turn.prompt == "first"
+        assert turn.output("one", False).content == "a"
+        assert turn.output("summary", True).content == "x"
+    finally:
+        MODEL_PROVIDERS.clear()
+        MODEL_PROVIDERS.update(orig)
+
+
+class PersistingProvider(DummyProvider):
+    """Provider that stores its output through ``persist_output``."""
+
+    def query(
+        self,
+        prompt: str,
+        chat_turn: int,
+        chat_session: int,
+        is_summarizing: bool = False,
+        system_message: str = "",
+        history: ChatHistory | None = None,
+    ) -> Iterator[str]:
+        yield from self.chunks
+        persist_output(self.name, chat_turn, prompt, is_summarizing, "".join(self.chunks))
+
+
+def test_write_behind_commits_outputs_once(file_app_ctx):
+    session = ChatSession(title="chat", user_id=g.user_id)  # type: ignore[arg-type]
+    db.session.add(session)
+    db.session.commit()
+
+    orig = MODEL_PROVIDERS.copy()
+    MODEL_PROVIDERS.clear()
+    MODEL_PROVIDERS.update(
+        {
+            "fast": PersistingProvider("fast", ["a"]),
+            "slow": PersistingProvider("slow", ["b"]),
+            "summary": PersistingProvider("summary", ["x"]),
+        }
+    )
+    commits = []
+    record = lambda conn: commits.append(conn)
+    event.listen(db.engine, "commit", record)
+
+    try:
+        gen = summarize(
+            "hello",
+            ["fast", "slow"],
+            chat_session=session.id,
+            summary_model="summary",
+            summary_after=1,
+            write_behind=True,
+        )
+        while True:
+            try:
+                next(gen)
+            except StopIteration as stop:
+                final = stop.value
+                break
+            # Nothing reaches the database while the turn streams
+            assert db.session.query(LLMOutput).count() == 0
+
+        assert len(commits) == 2  # the turn up front, the outputs at the end
+        assert db.session.get(ChatTurn, final["turn_id"]).completed_at is not None
+        rows = db.session.execute(db.select(LLMOutput)).scalars().all()
+        assert sorted((r.provider, r.content) for r in rows) == [
+            ("fast", "a"),
+            ("slow", "b"),
+            ("summary", "x\n\nx"),
+        ]
+        assert final["results"]["summarizer"] == "x\n\nx"
+        assert current_batch() is None
+    finally:
+        event.remove(db.engine, "commit", record)
+        MODEL_PROVIDERS.clear()
+        MODEL_PROVIDERS.update(orig)
+
+
+@pytest.mark.parametrize("use_async", [False, True])
+def test_write_behind_keeps_outputs_when_client_disconnects(file_app_ctx, use_async):
+    session = ChatSession(title="chat", user_id=g.user_id)  # type: ignore[arg-type]
+    db.session.add(session)
+    db.session.commit()
+    session_id = session.id
+
+    orig = MODEL_PROVIDERS.copy()
+    MODEL_PROVIDERS.clear()
+    MODEL_PROVIDERS.update(
+        {
+            "one": PersistingProvider("one", ["a"]),
+            "two": PersistingProvider("two", ["b"]),
+            "summary": PersistingProvider("summary", ["x", "y"]),
+        }
+    )
+    args = ("hello", ["one", "two"])
+    kwargs = dict(chat_session=session_id, summary_model="summary", write_behind=True)
+
+    async def disconnect_async():
+        gen = asummarize(*args, **kwargs)
+        async for event in gen:
+            if event.get("provider") == "summarizer":
+                break
+        await gen.aclose()
+
+    try:
+        if use_async:
+            asyncio.run(disconnect_async())
+        else:
+            gen = summarize(*args, concurrent=False, **kwargs)
+            for event in gen:
+                if event.get("provider") == "summarizer":
+                    break
+            gen.close()
+
+        rows = db.session.execute(db.select(LLMOutput)).scalars().all()
+        assert sorted((r.provider, r.content) for r in rows) == [("one", "a"), ("two", "b")]
+        assert db.session.query(ChatTurn).one().completed_at is None
+        assert current_batch() is None
+    finally:
+        MODEL_PROVIDERS.clear()
+        MODEL_PROVIDERS.update(orig)
+
+
+def test_failed_flush_is_spooled_and_replayed(app_ctx, tmp_path, monkeypatch):
+    from core.providers import write_behind
+
+    monkeypatch.setattr(write_behind, "SPOOL_DIR", str(tmp_path))
+    session = ChatSession(title="chat", user_id=g.user_id)  # type: ignore[arg-type]
+    db.session.add(session)
+    db.session.commit()
+    turn = ChatTurn(session_id=session.id, prompt="hello")  # type: ignore[arg-type]
+    db.session.add(turn)
+    db.session.commit()
+
+    batch = write_behind.OutputBatch()
+    batch.add("one", turn.id, "hello", False, "a")
+    insert = write_behind._insert
+
+    def failing_insert(rows, completed=None):
+        raise RuntimeError("database unavailable")
+
+    monkeypatch.setattr(write_behind, "_insert", failing_insert)
+    write_behind.flush(batch)
+    assert len(list(tmp_path.glob("*.json"))) == 1
+    assert db.session.query(LLMOutput).count() == 0
+
+    monkeypatch.setattr(write_behind, "_insert", insert)
+    assert write_behind.drain_spool() == 1
+    assert list(tmp_path.iterdir()) == []
+    assert db.session.query(LLMOutput).one().content == "a"
+
+
+def test_spool_is_replayed_off_the_flush_path(app_ctx, tmp_path, monkeypatch):
+    from core import pipeline
+    from core.providers import write_behind
+
+    monkeypatch.setattr(write_behind, "SPOOL_DIR", str(tmp_path))
+    session = ChatSession(title="chat", user_id=g.user_id)  # type: ignore[arg-type]
+    db.session.add(session)
+    db.session.commit()
+    turn = ChatTurn(session_id=session.id, prompt="hello")  # type: ignore[arg-type]
+    db.session.add(turn)
+    db.session.commit()
+    row = {"turn_id": turn.id, "provider": "one", "summarizer_prompt": None, "content": "a"}
+    write_behind.spool([row], str(tmp_path))
+
+    inserts, background = [], []
+    insert = write_behind._insert
+
+    def counting_insert(rows, completed=None):
+        inserts.append(rows)
+        insert(rows, completed)
+
+    monkeypatch.setattr(write_behind, "_insert", counting_insert)
+    monkeypatch.setattr(pipeline, "_in_background", lambda fn, *args: background.append(fn))
+    batch = write_behind.OutputBatch()
+    batch.add("two", turn.id, "hello", False, "b")
+    pipeline._flush_batch(batch)
+
+    assert len(inserts) == 1  # only the turn's own rows
+    assert background == [write_behind.replay_spool]
+    assert write_behind.replay_spool() == 1
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_spool_files_claimed_elsewhere_are_skipped_not_hidden(app_ctx, tmp_path):
+    import fcntl
+
+    from core.providers import write_behind
+
+    session = ChatSession(title="chat", user_id=g.user_id)  # type: ignore[arg-type]
+    db.session.add(session)
+    db.session.commit()
+    turn = ChatTurn(session_id=session.id, prompt="hello")  # type: ignore[arg-type]
+    db.session.add(turn)
+    db.session.commit()
+    row = {"turn_id": turn.id, "provider": "one", "summarizer_prompt": None, "content": "a"}
+    path = write_behind.spool([row], str(tmp_path))
+
+    # Another worker holds the claim; if it dies, the claim goes with it
+    with open(path) as other:
+        fcntl.flock(other, fcntl.LOCK_EX)
+        assert write_behind.drain_spool(str(tmp_path)) == 0
+        assert [p.name for p in tmp_path.iterdir()] == [os.path.basename(path)]
+    assert write_behind.drain_spool(str(tmp_path)) == 1
+    assert list(tmp_path.iterdir()) == []
+
+
+class TitledProvider(DummyProvider):
+    """Provider whose chat title is only written once ``gate`` opens."""
+
+    def __init__(self, name: str, chunks: list[str], gate: threading.Event):
+        super().__init__(name, chunks)
+        self.gate = gate
+
+    def create_chat_title(self, prompt: str) -> str:
+        assert self.gate.wait(timeout=5)
+        return "Model title"
+
+
+def test_new_chat_title_does_not_delay_first_chunk(file_app_ctx):
+    gate = threading.Event()
+    orig = MODEL_PROVIDERS.copy()
+    MODEL_PROVIDERS.clear()
+    MODEL_PROVIDERS.update(
+        {
+            "one": DummyProvider("one", ["a", "b"]),
+            "summary": DummyProvider("summary", ["x"]),
+            "titler": TitledProvider("titler", [], gate),
+        }
+    )
+
+    try:
+        gen = summarize(
+            "  What is   the airspeed velocity of an unladen swallow? ",
+            ["one"],
+            summary_model="summary",
+            title_model="titler",
+        )
+        # The first chunk arrives while the title is still being written
+        assert next(gen) == {"provider": "one", "chunk": "a"}
+        session = db.session.execute(db.select(ChatSession)).scalar_one()
+        assert session.title == "What is the airspeed velocity of an unl…"
+        gate.set()
+
+        events = []
+        while True:
+            try:
+                events.append(next(gen))
+            except StopIteration as stop:
+                final = stop.value
+                break
+
+        assert {"title": "Model title", "session_id": final["session_id"]} in events
+        db.session.expire_all()
+        assert db.session.get(ChatSession, final["session_id"]).title == "Model title"
+    finally:
+        gate.set()
+        MODEL_PROVIDERS.clear()
+        MODEL_PROVIDERS.update(orig)
@@ -0,0 +1,155 @@
+from types import SimpleNamespace
+from uuid import uuid4
+
+from prometheus_client import REGISTRY
+import pytest
+
+from core.providers import deepseek, gemini, prompt_cache
+from core.providers.deepseek import DeepSeekProvider
+from core.providers.gemini import GeminiProvider
+from core.providers.history import ChatHistory, HistoryOutput, HistoryTurn
+from core.providers.prompt_cache import GeminiContextCache, PromptCacheStats
+
+
+def turn(turn_id: int, provider: str) -> HistoryTurn:
+    return HistoryTurn(
+        turn_id,
+        f"question {turn_id}",
+        (HistoryOutput(provider, None, f"answer {turn_id}"),),
+    )
+
+
+class FakeCaches:
+    """Stand-in for ``genai.Client.caches``."""
+
+    def __init__(self):
+        self.created: list[list[dict]] = []
+        self.deleted: list[str] = []
+
+    def create(self, *, model, config):
+        self.created.append(config.contents)
+        return SimpleNamespace(name=f"cachedContents/{len(self.created)}")
+
+    def delete(self, *, name):
+        self.deleted.append(name)
+
+
+class FakeGeminiModels:
+    def __init__(self):
+        self.calls: list[dict] = []
+
+    def generate_content_stream(self, *, model, contents, config=None):
+        self.calls.append({"contents": contents, "config": config})
+        cached = 100 if config is not None else 0
+        yield SimpleNamespace(text="ok", usage_metadata=None)
+        yield SimpleNamespace(
+            text="",
+            usage_metadata=SimpleNamespace(
+                prompt_token_count=120, cached_content_token_count=cached
+            ),
+        )
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls: list[dict] = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        delta = SimpleNamespace(content="ok")
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+        usage = SimpleNamespace(prompt_tokens=200, prompt_cache_hit_tokens=192)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+
+@pytest.fixture()
+def no_persist(monkeypatch):
+    monkeypatch.setattr(deepseek, "persist_output", lambda *a: None)
+    monkeypatch.setattr(gemini, "persist_output", lambda *a: None)
+
+
+@pytest.fixture()
+def gemini_provider(monkeypatch):
+    monkeypatch.setenv("GEMINI_API_KEY", "test")
+    provider = GeminiProvider()
+    caches, models = FakeCaches(), FakeGeminiModels()
+    provider.client = SimpleNamespace(caches=caches, models=models)  # type: ignore[assignment]
+    provider.context_cache = GeminiContextCache(provider.client, "m", min_tokens=0)
+    return provider
+
+
+def test_deepseek_prefix_is_stable_and_hits_are_recorded(monkeypatch, no_persist):
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    provider = DeepSeekProvider()
+    completions = FakeCompletions()
+    provider.client = SimpleNamespace(chat=SimpleNamespace(completions=completions))  # type: ignore[assignment]
+    provider.context_tokens = 30
+
+    turns = [turn(i, "deepseek") for i in range(1, 9)]
+    for n in range(1, len(turns) + 1):
+        history = ChatHistory(tuple(turns[:n]))
+        list(provider.query(f"prompt {n}", n + 1, 1, history=history))
+
+    sent = [call["messages"] for call in completions.calls]
+    assert all(call["stream_options"] == {"include_usage": True} for call in completions.calls)
+    # Between overflows each request extends the previous one's prefix
+    extended = sum(prev[:-1] == cur[: len(prev) - 1] for prev, cur in zip(sent, sent[1:]))
+    assert extended >= len(sent) - 3
+    assert provider.cache_stats.snapshot()["cached_tokens"] == 192 * len(sent)
+
+
+def test_gemini_reuses_cached_prefix_until_it_changes(gemini_provider, no_persist, monkeypatch):
+    monkeypatch.setattr(gemini, "stable_prefix_turns", lambda n: n - n % 2)
+    caches = gemini_provider.client.caches
+    models = gemini_provider.client.models
+
+    turns = [turn(i, "gemini") for i in range(1, 6)]
+    for n in (2, 3, 4):
+        history = ChatHistory(tuple(turns[:n]))
+        assert list(gemini_provider.query("next", 10, 1, history=history)) == ["ok"]
+
+    # Turns 2 and 3 share the two-turn prefix; turn 4 replaces it
+    assert len(caches.created) == 2
+    assert caches.deleted == ["cachedContents/1"]
+    assert models.calls[1]["config"].cached_content == "cachedContents/1"
+    assert models.calls[2]["config"].cached_content == "cachedContents/2"
+    # Only the uncached tail is sent alongside the cache
+    assert models.calls[1]["contents"][0]["parts"][0]["text"] == "question 3"
+    assert gemini_provider.cache_stats.snapshot()["cached_tokens"] == 300
+
+
+def test_gemini_falls_back_to_full_contents_when_caching_fails(gemini_provider, no_persist):
+    def fail(**kwargs):
+        raise RuntimeError("caching unavailable")
+
+    gemini_provider.client.caches.create = fail
+    history = ChatHistory(tuple(turn(i, "gemini") for i in range(1, 5)))
+    list(gemini_provider.query("next", 10, 1, history=history))
+
+    call = gemini_provider.client.models.calls[0]
+    assert call["config"] is None
+    assert len(call["contents"]) == 9
+
+
+def test_gemini_skips_small_prefixes(gemini_provider):
+    gemini_provider.context_cache.min_tokens = 10_000
+    prefix = [{"role": "user", "parts": [{"text": "short"}]}]
+    assert gemini_provider.context_cache.lookup((1, False), prefix) is None
+    assert gemini_provider.client.caches.created == []
+
+
+@pytest.mark.parametrize("align, expected", [(4, 4), (1, 7), (0, 7)])
+def test_stable_prefix_turns_alignment(monkeypatch, align, expected):
+    monkeypatch.setattr(prompt_cache, "PREFIX_ALIGN_TURNS", align)
+    assert prompt_cache.stable_prefix_turns(7) == expected
+
+
+def test_prompt_cache_stats_ratio():
+    provider = f"test-{uuid4().hex[:8]}"
+    stats = PromptCacheStats(provider)
+    stats.record(100, 75)
+    stats.record(100, None)
+    assert stats.snapshot()["hit_ratio"] == pytest.approx(0.375)
+    labels = {"provider": provider}
+    assert REGISTRY.get_sample_value("sumlime_prompt_cached_tokens_total", labels) == 75
+    assert REGISTRY.get_sample_value("sumlime_prompt_tokens_total", labels) == 200
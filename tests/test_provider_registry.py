@@ -0,0 +1,63 @@
+from collections import OrderedDict
+import os
+import subprocess
+import sys
+
+import pytest
+
+from core.providers.registry import ProviderRegistry, configured_factories
+
+
+class Counting:
+    built = 0
+
+    def __init__(self):
+        type(self).built += 1
+
+
+def test_providers_are_built_once_on_first_lookup():
+    Counting.built = 0
+    registry = ProviderRegistry({"fake": Counting})
+    assert "fake" in registry and list(registry) == ["fake"] and len(registry) == 1
+    assert Counting.built == 0 and registry.loaded() == []
+
+    assert registry["fake"] is registry["fake"]
+    assert Counting.built == 1 and registry.loaded() == ["fake"]
+    with pytest.raises(KeyError):
+        registry["missing"]
+
+
+def test_swap_and_restore_keeps_unbuilt_providers_lazy():
+    Counting.built = 0
+    registry = ProviderRegistry({"fake": Counting})
+    orig = registry.copy()
+    registry.clear()
+    stub = object()
+    registry.update({"stub": stub})
+    assert dict(registry) == {"stub": stub}
+
+    registry.clear()
+    registry.update(orig)
+    assert list(registry) == ["fake"] and Counting.built == 0
+
+
+def test_config_names_builtins_and_custom_specs():
+    factories = configured_factories("gemini, extra=collections:OrderedDict")
+    assert factories["gemini"] == "core.providers.gemini:GeminiProvider"
+    assert isinstance(ProviderRegistry(factories)["extra"], OrderedDict)
+    with pytest.raises(ValueError, match="nope"):
+        configured_factories("nope")
+
+
+def test_importing_the_app_does_not_load_provider_sdks():
+    env = {
+        "DATABASE_URL": "sqlite://",
+        "SUPABASE_URL": "https://example.supabase.co",
+        "SUPABASE_ANON_KEY": "anon",
+        **os.environ,
+    }
+    code = "import sys, app; print(sorted({'openai', 'google.genai', 'anthropic'} & set(sys.modules)))"
+    out = subprocess.run(
+        [sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True
+    )
+    assert out.stdout.strip() == "[]"
@@ -0,0 +1,228 @@
+import asyncio
+import threading
+import time
+
+from google.genai.errors import ServerError
+import httpx
+from openai import RateLimitError
+import pytest
+import requests
+
+from core.providers.base import llm_retry
+from core.providers.limiter import AIMDLimiter
+from core.providers.resilience import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LatencyTracker,
+    ProviderGuard,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def hedging_guard(delay: float) -> ProviderGuard:
+    latency = LatencyTracker(min_samples=1)
+    latency.add(delay)
+    return ProviderGuard("fake", latency=latency, hedge=True)
+
+
+def test_breaker_opens_fails_fast_and_recovers_through_one_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failures=2, reset_after=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.is_open() and not breaker.allow()
+
+    clock.now = 10
+    assert breaker.allow()  # the probe
+    assert not breaker.allow()
+    breaker.record_failure()  # failed probe re-opens
+    assert breaker.is_open() and breaker.trips == 2
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow()
+    assert breaker.rejected == 2
+
+
+def test_guard_counts_only_upstream_failures():
+    guard = ProviderGuard("fake", breaker=CircuitBreaker(failures=2))
+    calls = []
+
+    def down():
+        calls.append(1)
+        raise requests.ConnectionError("down")
+        yield
+
+    def bad_request():
+        raise ValueError("bad")
+        yield
+
+    with pytest.raises(ValueError):
+        list(guard.stream(bad_request))
+    for _ in range(2):
+        with pytest.raises(requests.ConnectionError):
+            list(guard.stream(down))
+    with pytest.raises(CircuitOpenError):
+        list(guard.stream(down))
+    assert len(calls) == 2
+    snapshot = guard.snapshot()
+    assert (snapshot["failures"], snapshot["breaker_state"]) == (3, "open")
+
+
+def test_gemini_outage_opens_the_breaker():
+    guard = ProviderGuard("gemini-test", breaker=CircuitBreaker(failures=2))
+
+    def unavailable():
+        raise ServerError(503, {"error": {"code": 503, "status": "UNAVAILABLE"}})
+        yield
+
+    for _ in range(2):
+        with pytest.raises(ServerError):
+            list(guard.stream(unavailable))
+    assert guard.breaker.is_open()
+    with pytest.raises(CircuitOpenError):
+        list(guard.stream(unavailable))
+
+
+def test_slow_first_chunk_is_hedged_and_the_loser_closed():
+    guard = hedging_guard(0.05)
+    closed = threading.Event()
+    attempts = []
+
+    def produce():
+        attempts.append(1)
+        slow = len(attempts) == 1
+        try:
+            if slow:
+                time.sleep(0.5)
+            yield "slow" if slow else "fast"
+            yield "!"
+        finally:
+            if slow:
+                closed.set()
+
+    assert list(guard.stream(produce)) == ["fast", "!"]
+    assert closed.wait(2)
+    assert (guard.hedges, guard.hedge_wins) == (1, 1)
+    deadline = time.monotonic() + 2
+    while guard.limiter.inflight and time.monotonic() < deadline:
+        time.sleep(0.01)  # the loser's thread returns its slot after closing
+    assert guard.limiter.inflight == 0
+
+
+def test_no_hedge_without_a_free_limiter_slot():
+    latency = LatencyTracker(min_samples=1)
+    latency.add(0.01)
+    guard = ProviderGuard(
+        "fake", latency=latency, hedge=True, limiter=AIMDLimiter("fake", initial=1)
+    )
+    attempts = []
+
+    def produce():
+        attempts.append(1)
+        time.sleep(0.1)
+        yield "hi"
+
+    assert list(guard.stream(produce)) == ["hi"]
+    assert (len(attempts), guard.hedges, guard.limiter.inflight) == (1, 0, 0)
+
+
+def test_fast_first_chunk_is_not_hedged():
+    guard = hedging_guard(1.0)
+    attempts = []
+
+    def produce():
+        attempts.append(1)
+        yield "hi"
+
+    assert list(guard.stream(produce)) == ["hi"]
+    assert (len(attempts), guard.hedges) == (1, 0)
+
+
+def test_async_hedge_survives_a_failed_attempt():
+    guard = hedging_guard(0.05)
+    attempts = []
+
+    async def produce():
+        attempts.append(1)
+        first = len(attempts) == 1
+        await asyncio.sleep(0.1 if first else 0.2)
+        if first:
+            raise requests.ConnectionError("reset")
+        yield "ok"
+
+    async def collect():
+        return [c async for c in guard.astream(produce)]
+
+    assert asyncio.run(collect()) == ["ok"]
+    assert (guard.hedges, guard.hedge_wins, guard.breaker.state) == (1, 1, "closed")
+    assert guard.limiter.inflight == 0
+
+
+def test_async_hedge_closes_a_loser_that_finished_with_the_winner():
+    guard = hedging_guard(0.05)
+    closed = []
+
+    async def collect():
+        gate = asyncio.Event()
+        attempts = []
+
+        async def produce():
+            attempts.append(1)
+            try:
+                if len(attempts) == 1:
+                    await gate.wait()
+                else:
+                    gate.set()  # both first chunks are ready in the same wakeup
+                yield "ok"
+            finally:
+                closed.append(1)
+
+        chunks = [c async for c in guard.astream(produce)]
+        return chunks, len(closed)
+
+    assert asyncio.run(collect()) == (["ok"], 2)
+    assert (guard.hedges, guard.limiter.inflight) == (1, 0)
+
+
+def test_retries_stop_once_give_up_is_true():
+    calls = []
+
+    @llm_retry(max_attempts=3, initial=0, max_wait=0, give_up=lambda: len(calls) >= 1)
+    def flaky():
+        calls.append(1)
+        raise requests.Timeout("slow")
+
+    with pytest.raises(requests.Timeout):
+        flaky()
+    assert len(calls) == 1
+
+
+def test_retried_overloads_reach_the_limiter():
+    guard = ProviderGuard("fake", limiter=AIMDLimiter("fake", initial=8, decrease_interval=0))
+    calls = []
+
+    request = httpx.Request("POST", "https://example.test")
+    overloaded = RateLimitError(
+        message="slow down", response=httpx.Response(429, request=request), body=None
+    )
+
+    @llm_retry(max_attempts=3, initial=0, max_wait=0, on_retry=guard.limiter.observe)
+    def create():
+        calls.append(1)
+        if len(calls) < 3:
+            raise requests.ConnectionError("reset") if len(calls) == 1 else overloaded
+        return iter(["ok"])
+
+    assert list(guard.stream(create)) == ["ok"]
+    assert guard.limiter.snapshot()["overloads"] == 1
+    assert (guard.limiter.inflight, guard.snapshot()["limiter_limit"]) == (0, 4.25)
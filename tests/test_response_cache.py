@@ -0,0 +1,143 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from core.providers import deepseek, response_cache
+from core.providers.deepseek import DeepSeekProvider
+from core.providers.history import ChatHistory
+from core.providers.response_cache import (
+    MemoryResponseCache,
+    SQLiteResponseCache,
+    acached_stream,
+    cached_stream,
+    response_key,
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def make(**kwargs):
+        if request.param == "memory":
+            return MemoryResponseCache(**kwargs)
+        return SQLiteResponseCache(str(tmp_path / "cache.sqlite3"), **kwargs)
+
+    return make
+
+
+def test_entries_expire(make_cache):
+    clock = Clock()
+    cache = make_cache(ttl=10, clock=clock)
+    cache.set("k", "text")
+    assert cache.get("k") == "text"
+    clock.now += 11
+    assert cache.get("k") is None
+
+
+def test_least_recently_used_entry_is_evicted(make_cache):
+    clock = Clock()
+    cache = make_cache(maxsize=2, clock=clock)
+    cache.set("a", "1")
+    clock.now += 1
+    cache.set("b", "2")
+    clock.now += 1
+    cache.get("a")
+    clock.now += 1
+    cache.set("c", "3")
+    assert cache.get("a") == "1"
+    assert cache.get("b") is None
+    assert cache.get("c") == "3"
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteResponseCache(path).set("k", "shared")
+    assert SQLiteResponseCache(path).get("k") == "shared"
+
+
+def test_key_depends_on_every_input():
+    messages = [{"role": "user", "content": "hi"}]
+    key = response_key("deepseek", "m", False, messages)
+    assert key == response_key("deepseek", "m", False, [dict(messages[0])])
+    assert key != response_key("gemini", "m", False, messages)
+    assert key != response_key("deepseek", "m2", False, messages)
+    assert key != response_key("deepseek", "m", True, messages)
+    assert key != response_key("deepseek", "m", False, messages + messages)
+
+
+def test_cached_stream_replays_hits_and_skips_partial_streams(monkeypatch):
+    cache = MemoryResponseCache()
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE", cache)
+    calls = []
+
+    def produce():
+        calls.append(1)
+        yield from ["a" * 50, "b" * 50]
+
+    # An abandoned stream is not stored
+    stream = cached_stream("k", produce)
+    next(stream)
+    stream.close()
+    assert cache.get("k") is None
+
+    assert "".join(cached_stream("k", produce)) == "a" * 50 + "b" * 50
+    replayed = list(cached_stream("k", produce))
+    assert "".join(replayed) == "a" * 50 + "b" * 50
+    assert len(replayed) == 2  # replayed in REPLAY_CHUNK_CHARS pieces
+    assert len(calls) == 2
+
+
+def test_async_cached_stream_keeps_cache_io_off_the_loop(monkeypatch, tmp_path):
+    cache = SQLiteResponseCache(str(tmp_path / "cache.sqlite3"))
+    threads = []
+    get, set_ = cache.get, cache.set
+    monkeypatch.setattr(cache, "get", lambda key: threads.append(threading.get_ident()) or get(key))
+    monkeypatch.setattr(
+        cache, "set", lambda key, text: threads.append(threading.get_ident()) or set_(key, text)
+    )
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE", cache)
+
+    async def produce():
+        yield "hi"
+
+    async def collect():
+        chunks = [c async for c in acached_stream("k", produce)]
+        chunks += [c async for c in acached_stream("k", produce)]
+        return chunks, threading.get_ident()
+
+    chunks, loop_thread = asyncio.run(collect())
+    assert chunks == ["hi", "hi"]
+    assert len(threads) == 3 and loop_thread not in threads
+
+
+def test_provider_hit_skips_upstream_but_persists(monkeypatch):
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    monkeypatch.setattr(response_cache, "RESPONSE_CACHE", MemoryResponseCache())
+    persisted = []
+    monkeypatch.setattr(deepseek, "persist_output", lambda *a: persisted.append(a))
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        delta = SimpleNamespace(content="answer")
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+    provider = DeepSeekProvider()
+    provider.client = SimpleNamespace(  # type: ignore[assignment]
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+    for turn_id in (1, 2):
+        assert list(provider.query("q", turn_id, 1, history=ChatHistory())) == ["answer"]
+    list(provider.query("q", 3, 1, is_summarizing=True, history=ChatHistory()))
+
+    assert len(calls) == 2  # the summarizing call is a different key
+    assert [p[1] for p in persisted] == [1, 2, 3]
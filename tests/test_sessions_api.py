@@ -0,0 +1,145 @@
+import os
+from datetime import datetime, timedelta, timezone
+from uuid import uuid4
+
+import pytest
+
+os.environ.setdefault("DEEPSEEK_API_KEY", "test")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("SUPABASE_URL", "https://example.supabase.co")
+os.environ.setdefault("SUPABASE_ANON_KEY", "anon")
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+import auth  # noqa: E402
+from app import app  # noqa: E402
+from core.providers.models import ChatSession  # noqa: E402
+from db import db  # noqa: E402
+
+USER = uuid4()
+
+
+@pytest.fixture()
+def client(monkeypatch):
+    monkeypatch.setattr(auth, "authenticate_token", lambda token: USER)
+    monkeypatch.setattr(auth, "ensure_profile_exists", lambda user_id: None)
+    monkeypatch.setattr(auth, "set_rls_claims", lambda user_id: None)
+    with app.app_context():
+        db.create_all()
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        # Two sessions share each timestamp, so paging must break ties by id
+        for i in range(7):
+            db.session.add(
+                ChatSession(
+                    title=f"chat {i}",
+                    user_id=USER,  # type: ignore[arg-type]
+                    last_used=start + timedelta(minutes=i // 2),
+                )
+            )
+        db.session.add(ChatSession(title="someone else", user_id=uuid4()))  # type: ignore[arg-type]
+        db.session.commit()
+        yield app.test_client()
+        db.drop_all()
+
+
+def get(client, query=""):
+    res = client.get(f"/api/sessions{query}", headers={"Authorization": "Bearer t"})
+    return res.status_code, res.get_json()
+
+
+def test_sessions_are_paged_newest_first(client):
+    titles, cursor = [], None
+    pages = 0
+    while True:
+        status, body = get(client, f"?limit=3&cursor={cursor}" if cursor else "?limit=3")
+        assert status == 200
+        assert len(body["sessions"]) <= 3
+        titles += [s["title"] for s in body["sessions"]]
+        pages += 1
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert pages == 3
+    assert titles == [f"chat {i}" for i in (6, 5, 4, 3, 2, 1, 0)]
+
+
+def test_default_page_and_bad_cursor(client):
+    status, body = get(client)
+    assert status == 200
+    assert len(body["sessions"]) == 7 and body["next_cursor"] is None
+    assert get(client, "?cursor=not-a-cursor")[0] == 400
+
+
+def test_transcript_pages_back_from_latest_turn(client):
+    from sqlalchemy import event
+
+    from core.providers.models import ChatTurn, LLMOutput
+
+    with app.app_context():
+        session = ChatSession(title="long", user_id=USER)  # type: ignore[arg-type]
+        db.session.add(session)
+        db.session.flush()
+        start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+        for i in range(5):
+            turn = ChatTurn(
+                session_id=session.id,  # type: ignore[arg-type]
+                prompt=f"q{i}",  # type: ignore[arg-type]
+                created_at=start + timedelta(minutes=i),
+            )
+            db.session.add(turn)
+            db.session.flush()
+            db.session.add_all(
+                [
+                    LLMOutput(turn_id=turn.id, provider="gemini", content=f"a{i}"),  # type: ignore[arg-type]
+                    LLMOutput(
+                        turn_id=turn.id,  # type: ignore[arg-type]
+                        provider="gemini",  # type: ignore[arg-type]
+                        summarizer_prompt="s",  # type: ignore[arg-type]
+                        content=f"s{i}",  # type: ignore[arg-type]
+                    ),
+                ]
+            )
+        db.session.commit()
+        session_id = session.id
+
+    statements = []
+
+    def record(*args):
+        statements.append(args)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        status, body = get_transcript(client, session_id, "?limit=2")
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    assert status == 200
+    assert [t["prompt"] for t in body["turns"]] == ["q3", "q4"]
+    assert body["turns"][0]["responses"] == [
+        {"provider": "summarizer", "content": "s3"},
+        {"provider": "gemini", "content": "a3"},
+    ]
+    assert len(statements) == 3  # session check, turns, outputs
+
+    _, body = get_transcript(client, session_id, f"?limit=2&before={body['next_before']}")
+    assert [t["prompt"] for t in body["turns"]] == ["q1", "q2"]
+    _, body = get_transcript(client, session_id, f"?limit=2&before={body['next_before']}")
+    assert [t["prompt"] for t in body["turns"]] == ["q0"]
+    assert body["next_before"] is None
+
+    assert get_transcript(client, 9999)[0] == 404
+
+
+def get_transcript(client, session_id, query=""):
+    res = client.get(
+        f"/api/sessions/{session_id}{query}", headers={"Authorization": "Bearer t"}
+    )
+    return res.status_code, res.get_json()
+
+
+@pytest.mark.parametrize("summary_after", ["two", 1.5, True, [1]])
+def test_summarize_rejects_a_non_integer_summary_after(client, summary_after):
+    res = client.post(
+        "/api/summarize",
+        json={"prompt": "hi", "models": ["a", "b"], "summary_after": summary_after},
+        headers={"Authorization": "Bearer t"},
+    )
+    assert res.status_code == 400
@@ -0,0 +1,86 @@
+from types import SimpleNamespace
+from uuid import uuid4
+
+from prometheus_client import REGISTRY
+import pytest
+
+from core.providers import deepseek, similarity_cache
+from core.providers.deepseek import DeepSeekProvider
+from core.providers.history import ChatHistory, HistoryOutput, HistoryTurn
+from core.providers.similarity_cache import SimilarityCache, shingles
+
+
+def test_shingles_ignore_case_punctuation_and_order():
+    assert shingles("What is the capital of France?") == shingles(
+        "what is THE capital of france"
+    )
+    assert shingles("France -- capital of: what is the") == shingles(
+        "what is the capital of france"
+    )
+
+
+def test_lookup_serves_rewordings_above_threshold():
+    cache = SimilarityCache(threshold=0.8)
+    cache.add("p", "How do I reverse a list in Python?", "Use reversed().")
+
+    assert cache.lookup("p", "how do i reverse a list in python") == "Use reversed()."
+    assert cache.lookup("p", "In Python, how do I reverse a list") == "Use reversed()."
+    assert cache.lookup("p", "How do I sort a dict in Python?") is None
+    assert cache.lookup("other", "How do I reverse a list in Python?") is None
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+    assert stats["max_lookup_ms"] >= stats["mean_lookup_ms"] > 0
+
+
+def test_lookups_and_closest_similarity_are_exported():
+    ns = f"p-{uuid4().hex[:8]}"
+    cache = SimilarityCache(threshold=0.9)
+    cache.add(ns, "how do i reverse a list in python", "Use reversed().")
+    assert cache.lookup(ns, "how do i reverse a list in python") is not None
+    assert cache.lookup(ns, "how do i reverse a tuple in python") is None
+
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, {"namespace": ns, **labels})
+
+    assert sample("sumlime_similarity_lookup_seconds_count", outcome="hit") == 1
+    assert sample("sumlime_similarity_lookup_seconds_count", outcome="miss") == 1
+    # 1.0 for the exact match, 7/9 for the near miss
+    assert sample("sumlime_similarity_best_score_sum") == pytest.approx(1 + 7 / 9)
+
+
+def test_oldest_entries_are_evicted():
+    cache = SimilarityCache(maxsize=2)
+    for i, topic in enumerate(["apples", "bananas", "cherries"]):
+        cache.add("p", f"tell me about {topic} please", str(i))
+    assert cache.lookup("p", "tell me about apples please") is None
+    assert cache.lookup("p", "tell me about cherries please") == "2"
+    assert cache.stats()["entries"] == 2
+    assert all(len(bucket) <= 2 for bucket in cache._buckets.values())
+
+
+def test_only_first_turn_prompts_use_the_cache(monkeypatch):
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    monkeypatch.setattr(similarity_cache, "SIMILARITY_CACHE", SimilarityCache())
+    monkeypatch.setattr(deepseek, "persist_output", lambda *a: None)
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        delta = SimpleNamespace(content="Paris")
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+
+    provider = DeepSeekProvider()
+    provider.client = SimpleNamespace(  # type: ignore[assignment]
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+    history = ChatHistory(
+        (HistoryTurn(1, "hi", (HistoryOutput("deepseek", None, "hello"),)),)
+    )
+
+    assert list(provider.query("Capital of France?", 1, 1, history=ChatHistory())) == ["Paris"]
+    assert list(provider.query("capital of france", 2, 1, history=ChatHistory())) == ["Paris"]
+    assert len(calls) == 1
+    list(provider.query("capital of france", 3, 1, history=history))
+    list(provider.query("capital of france", 4, 1, is_summarizing=True, history=ChatHistory()))
+    assert len(calls) == 3
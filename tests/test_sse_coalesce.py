@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+from core.sse import acoalesce, coalesce
+
+
+def chunks(provider, *parts):
+    return [{"provider": provider, "chunk": p} for p in parts]
+
+
+def drain(gen):
+    out = []
+    while True:
+        try:
+            out.append(next(gen))
+        except StopIteration as e:
+            return out, e.value
+
+
+def test_chunks_merge_until_size_limit_and_flush_on_provider_switch():
+    def events():
+        yield from chunks("gemini", "ab", "cd", "ef")
+        yield from chunks("deepseek", "x")
+        yield {"title": "T"}
+        yield from chunks("summarizer", "y", "z")
+        return {"done": True}
+
+    out, final = drain(coalesce(events(), max_bytes=4, max_delay_ms=10_000))
+    assert out == [
+        {"provider": "gemini", "chunk": "abcd"},
+        {"provider": "gemini", "chunk": "ef"},
+        {"provider": "deepseek", "chunk": "x"},
+        {"title": "T"},
+        {"provider": "summarizer", "chunk": "yz"},
+    ]
+    assert final == {"done": True}
+
+
+def test_buffer_is_flushed_while_upstream_is_idle():
+    seen = []
+
+    def events():
+        yield from chunks("gemini", "a", "b")
+        time.sleep(0.3)
+        seen.append(len(out))
+        yield from chunks("gemini", "c")
+
+    out = []
+    for event in coalesce(events(), max_bytes=1024, max_delay_ms=20):
+        out.append(event)
+    assert seen == [1]
+    assert out == chunks("gemini", "ab", "c")
+
+
+def test_errors_propagate_after_pending_chunks():
+    def events():
+        yield from chunks("gemini", "a")
+        raise RuntimeError("boom")
+
+    gen = coalesce(events(), max_bytes=1024, max_delay_ms=10_000)
+    assert next(gen) == {"provider": "gemini", "chunk": "a"}
+    try:
+        next(gen)
+    except RuntimeError as e:
+        assert str(e) == "boom"
+    else:
+        raise AssertionError("expected RuntimeError")
+
+
+def test_closing_waits_for_upstream_to_close():
+    closed = []
+
+    def events():
+        try:
+            yield from chunks("gemini", "a")
+            time.sleep(0.2)  # the reader is blocked here when the consumer leaves
+            yield from chunks("gemini", "b")
+        finally:
+            closed.append(True)
+
+    gen = coalesce(events(), max_bytes=1, max_delay_ms=10_000)
+    assert next(gen) == {"provider": "gemini", "chunk": "a"}
+    gen.close()
+    assert closed == [True]
+
+
+def test_async_closing_closes_upstream():
+    closed = []
+
+    async def events():
+        try:
+            for event in chunks("gemini", "a", "b"):
+                yield event
+                await asyncio.sleep(0)
+        finally:
+            closed.append(True)
+
+    async def first():
+        gen = acoalesce(events(), max_bytes=1, max_delay_ms=10_000)
+        event = await gen.__anext__()
+        await gen.aclose()
+        assert closed == [True]
+        return event
+
+    assert asyncio.run(first()) == {"provider": "gemini", "chunk": "a"}
+
+
+def test_async_coalescing():
+    async def events():
+        for event in chunks("gemini", "a", "b"):
+            yield event
+        await asyncio.sleep(0.3)
+        for event in chunks("gemini", "c") + chunks("deepseek", "d"):
+            yield event
+        yield {"final": {}}
+
+    async def collect():
+        return [e async for e in acoalesce(events(), max_bytes=1024, max_delay_ms=20)]
+
+    assert asyncio.run(collect()) == (
+        chunks("gemini", "ab", "c") + chunks("deepseek", "d") + [{"final": {}}]
+    )
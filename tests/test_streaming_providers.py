@@ -0,0 +1,85 @@
+import asyncio
+from types import SimpleNamespace
+
+from core.providers import chatgpt, claude
+from core.providers.chatgpt import ChatGPTProvider
+from core.providers.claude import ClaudeProvider
+from core.providers.history import ChatHistory, HistoryOutput, HistoryTurn
+
+HISTORY = ChatHistory(
+    (
+        HistoryTurn(1, "hi", (HistoryOutput("claude", None, "hello"),)),
+        HistoryTurn(2, "unanswered", ()),
+    )
+)
+
+
+def claude_events(*texts):
+    usage = SimpleNamespace(input_tokens=10, cache_read_input_tokens=30)
+    yield SimpleNamespace(type="message_start", message=SimpleNamespace(usage=usage))
+    for text in texts:
+        delta = SimpleNamespace(type="text_delta", text=text)
+        yield SimpleNamespace(type="content_block_delta", delta=delta)
+    yield SimpleNamespace(type="message_stop")
+
+
+def openai_events(*texts):
+    for text in texts:
+        yield SimpleNamespace(type="response.output_text.delta", delta=text)
+    details = SimpleNamespace(cached_tokens=0)
+    usage = SimpleNamespace(input_tokens=12, input_tokens_details=details)
+    yield SimpleNamespace(type="response.completed", response=SimpleNamespace(usage=usage))
+
+
+def test_claude_streams_deltas_with_alternating_history(monkeypatch):
+    monkeypatch.setenv("CLAUDE_API_KEY", "test")
+    saved = []
+    monkeypatch.setattr(claude, "persist_output", lambda *a: saved.append(a))
+    calls = []
+
+    def create(**kwargs):
+        calls.append(kwargs)
+        return claude_events("Bon", "jour")
+
+    provider = ClaudeProvider()
+    provider.client = SimpleNamespace(messages=SimpleNamespace(create=create))  # type: ignore
+
+    chunks = list(provider.query("and now?", 3, 1, system_message="Be brief", history=HISTORY))
+    assert chunks == ["Bon", "jour"]
+    assert calls[0]["stream"] is True and calls[0]["system"] == "Be brief"
+    assert [m["role"] for m in calls[0]["messages"]] == ["user", "assistant", "user"]
+    assert calls[0]["messages"][-1]["content"] == "unanswered\n\nand now?"
+    assert saved == [("claude", 3, "and now?", False, "Bonjour")]
+    assert provider.cache_stats.snapshot()["cached_tokens"] == 30
+
+
+def test_chatgpt_streams_deltas_async(monkeypatch):
+    monkeypatch.setenv("CHATGPT_API_KEY", "test")
+    saved = []
+    monkeypatch.setattr(chatgpt, "persist_output", lambda *a: saved.append(a))
+
+    async def run_in_session(fn, *args):
+        return fn(*args)
+
+    monkeypatch.setattr(chatgpt, "run_in_session", run_in_session)
+    calls = []
+
+    async def create(**kwargs):
+        calls.append(kwargs)
+
+        async def events():
+            for event in openai_events("4", "2"):
+                yield event
+
+        return events()
+
+    provider = ChatGPTProvider()
+    provider.aclient = SimpleNamespace(responses=SimpleNamespace(create=create))  # type: ignore
+
+    async def collect():
+        return [c async for c in provider.aquery("6 * 7?", 3, 1, history=HISTORY)]
+
+    assert asyncio.run(collect()) == ["4", "2"]
+    assert calls[0]["stream"] is True
+    assert [m["content"] for m in calls[0]["input"]] == ["hi", "unanswered", "6 * 7?"]
+    assert saved == [("chatgpt", 3, "6 * 7?", False, "42")]
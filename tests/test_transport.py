@@ -0,0 +1,50 @@
+import asyncio
+
+import httpx
+
+from core.providers import transport
+from core.providers.deepseek import DeepSeekProvider
+
+
+def test_provider_clients_share_one_pool(monkeypatch):
+    monkeypatch.setenv("DEEPSEEK_API_KEY", "test")
+    first, second = DeepSeekProvider(), DeepSeekProvider()
+    assert first.client._client._transport is transport.sync_transport()
+    assert second.client._client._transport is transport.sync_transport()
+    assert first.aclient._client._transport is transport.async_transport()
+    assert first.client.timeout.connect == transport.HTTP_CONNECT_TIMEOUT
+
+
+def test_closing_a_client_keeps_the_shared_pool_open(monkeypatch):
+    pool = httpx.MockTransport(lambda request: httpx.Response(200))
+    monkeypatch.setattr(transport, "_sync", transport._Shared(pool))
+    with transport.http_client() as client:
+        client.get("https://example.test")
+    with transport.http_client() as client:
+        assert client.get("https://example.test").status_code == 200
+
+
+def test_warm_up_contacts_each_origin_and_tolerates_failures(monkeypatch):
+    seen = []
+
+    def handler(request):
+        seen.append((request.method, request.url.host))
+        if request.url.host == "down.test":
+            raise httpx.ConnectError("refused", request=request)
+        return httpx.Response(200)
+
+    monkeypatch.setattr(transport, "_sync", transport._Shared(httpx.MockTransport(handler)))
+    monkeypatch.setattr(
+        transport, "_async", transport._AsyncShared(httpx.MockTransport(handler))
+    )
+    origins = ["https://up.test", "https://down.test"]
+
+    transport.warm_up(origins)
+    asyncio.run(transport.awarm_up(origins))
+    assert sorted(seen) == sorted([("HEAD", "up.test"), ("HEAD", "down.test")] * 2)
+
+
+def test_http2_needs_h2(monkeypatch):
+    monkeypatch.setattr(transport, "HTTP2", True)
+    monkeypatch.setattr(transport.importlib.util, "find_spec", lambda name: None)
+    assert transport.http2_enabled() is False